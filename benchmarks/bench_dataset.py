@@ -0,0 +1,70 @@
+"""
+Benchmark of loading the analysis table for the plots: pd.read_csv of the whole file, as the plot scripts did,
+against dataset.load_prs of only the columns plots/render.py needs, on a synthetic table with comment text
+the size of the real one. Reports load time, the frame's memory and the time to split the PRs by change type
+(str.contains on the strings against comparing Change Type).
+
+Run from the repository root:
+    python -m benchmarks.bench_dataset --prs 20000 --comment-chars 6000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataset import ChangeType, load_prs
+from pr_stats import COLUMNS as STATS_COLUMNS
+
+PLOT_COLUMNS = ['State', 'Change Type', 'Created At', 'Decision Time', 'Files Changed', 'Total Comments', 'LOC Changed']
+CHANGE_TYPES = ['New integration (thank you!)', 'New feature (which adds functionality to an existing integration)']
+
+
+def synthetic_table(n: int, comment_chars: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    created = pd.Timestamp('2021-01-01', tz='UTC') + pd.to_timedelta(rng.integers(0, 1400 * 24, n), unit='h')
+    decision_time = rng.lognormal(2, 1.2, n).astype(int)
+    return pd.DataFrame({
+        'PR Number': np.arange(n), 'Title': [f"Add support for device {i}" for i in range(n)],
+        'Author': rng.choice([f"user{i}" for i in range(2000)], n), 'Integration': rng.choice([f"integration{i}" for i in range(900)], n),
+        'Created At': created, 'Updated At': created + pd.to_timedelta(decision_time, unit='D'), 'State': rng.choice(['merged', 'closed'], n),
+        'Files Changed': rng.integers(1, 60, n), 'Decision Time': decision_time, 'Closed Date': created + pd.to_timedelta(decision_time, unit='D'),
+        'URL': [f"https://github.com/home-assistant/core/pull/{i}" for i in range(n)], 'Type of Change': rng.choice(CHANGE_TYPES, n),
+        'LOC Changed': rng.integers(1, 5000, n), 'Total Comments': rng.poisson(12, n),
+        'Formatted Comments': ["reviewer: please add tests. " * (comment_chars // 28)] * n,
+    })
+
+def timed(function, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prs', type=int, default=20000)
+    parser.add_argument('--comment-chars', type=int, default=6000, help="length of each PR's formatted comments")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pull_requests_filtered.csv")
+        synthetic_table(args.prs, args.comment_chars).to_csv(path, index=False)
+        print(f"{args.prs} PRs, {os.path.getsize(path) / 1024 ** 2:.0f} MB of CSV")
+
+        raw_time, raw = timed(lambda: pd.read_csv(path), args.repeat)
+        typed_time, typed = timed(lambda: load_prs(PLOT_COLUMNS + STATS_COLUMNS, path), args.repeat)
+
+    split_raw, _ = timed(lambda: [raw[raw['Type of Change'].str.contains(name)] for name in ('New integration', 'New feature')], args.repeat)
+    split_typed, _ = timed(lambda: [typed[typed['Change Type'] == change_type] for change_type in (ChangeType.NEW_INTEGRATION, ChangeType.NEW_FEATURE)], args.repeat)
+
+    raw_memory, typed_memory = raw.memory_usage(deep=True).sum(), typed.memory_usage(deep=True).sum()
+    print(f"{'':<32} {'load':>8} {'memory':>10} {'split by change type':>22}")
+    print(f"{'pd.read_csv, every column':<32} {raw_time:7.2f}s {raw_memory / 1024 ** 2:8.1f}MB {split_raw * 1000:20.1f}ms")
+    print(f"{'load_prs, the plots columns':<32} {typed_time:7.2f}s {typed_memory / 1024 ** 2:8.1f}MB {split_typed * 1000:20.1f}ms")
@@ -0,0 +1,109 @@
+"""
+End-to-end benchmark of the scraping stages against github_replay's mock GitHub, without network access or tokens.
+
+Each stage runs as its own process, the way it's run for real, in a fresh directory holding only its input
+(pull_requests_all.csv for the checkbox scraper, pull_requests_filtered.csv for the rest, nothing for the
+metadata crawl), with GITHUB_API_URL and GITHUB_HTML_URL pointing at the replay server and the response cache
+off. For each stage it reports PRs per second, requests per PR and the requests refused by the mock's rate
+limits. The PRs come from a synthetic cassette, or from a recorded one with --cassette.
+
+Run from the repository root:
+    python -m benchmarks.bench_pipeline --prs 200 --latency 0.05
+    python -m benchmarks.bench_pipeline --stages comments comments-async --latency 0.2 --throttle-every 50
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from github_api import PER_PAGE
+from github_replay import Cassette, ReplayServer, synthetic_cassette
+from token_pool import RESERVE
+from type_of_change import extract_type_of_change
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = {  # name: (command, input file)
+    "metadata": (["scrape_all_prs.py"], None),
+    "checkbox": (["scrape_pr_checkbox_data.py"], "data/pull_requests_all.csv"),
+    "comments": (["scrape_pr_comment_data.py"], "data/pull_requests_filtered.csv"),
+    "comments-async": (["scrape_pr_comment_data.py", "--async"], "data/pull_requests_filtered.csv"),
+    "loc": (["scrape_pr_file_data.py"], "data/pull_requests_filtered.csv"),
+    "authors": (["update_filtered_prs.py"], "data/pull_requests_filtered.csv"),
+}
+# Token pool reserve of the stages that don't use token_pool's default; scrape_all_prs only hands out a token
+# that can finish a whole page of PRs
+STAGE_RESERVES = {"metadata": PER_PAGE + 1}
+
+
+# The PRs of a cassette as the rows of pull_requests_all.csv (filter_prs keeps the same columns)
+def input_table(cassette: Cassette, base_url: str) -> pd.DataFrame:
+    rows = []
+    for pr in cassette.pull_requests():
+        if pr["created_at"] < "2021":    # only there to end the metadata crawl
+            continue
+        rows.append({
+            "PR Number": pr["number"], "Title": pr["title"], "Author": pr["user"]["login"],
+            "Integration": next((label["name"].split(": ")[-1] for label in pr["labels"] if "integration:" in label["name"]), ""),
+            "Created At": pr["created_at"], "Updated At": pr["updated_at"], "State": "merged" if pr.get("merged") else "closed",
+            "Files Changed": pr.get("changed_files"), "Decision Time": None, "Closed Date": pr["closed_at"],
+            "URL": pr["html_url"].replace("{base}", base_url), "Type of Change": extract_type_of_change(pr["body"]),
+        })
+    return pd.DataFrame(rows)
+
+def run_stage(name: str, server: ReplayServer, table: pd.DataFrame, tokens: int) -> dict:
+    command, input_file = STAGES[name]
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "data"))
+        if input_file:
+            table.to_csv(os.path.join(workdir, input_file), index=False)
+        env = {
+            **os.environ, "GITHUB_API_URL": server.base_url, "GITHUB_HTML_URL": server.base_url, "GITHUB_CACHE": "0",
+            "GITHUB_PATS": ",".join(f"bench-token-{i}" for i in range(tokens)), "PYTHONPATH": REPO_ROOT,
+        }
+
+        server.reset_counters()
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, os.path.join(REPO_ROOT, command[0]), *command[1:]], cwd=workdir, env=env, capture_output=True, text=True)
+        seconds = time.perf_counter() - start
+        if result.returncode != 0:
+            print(result.stdout[-2000:], result.stderr[-2000:])
+            raise RuntimeError(f"{name} failed with exit code {result.returncode}")
+
+    refused = sum(count for status, count in server.statuses.items() if status in (403, 429))
+    return {"stage": name, "prs": len(table), "seconds": seconds, "prs_per_second": len(table) / seconds,
+            "requests": server.requests, "requests_per_pr": server.requests / len(table), "refused": refused}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prs', type=int, default=200, help="PRs in the synthetic cassette")
+    parser.add_argument('--cassette', help="replay a recorded cassette instead of a synthetic one")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds added to every response")
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, help="requests per token per window before a 403")
+    parser.add_argument('--window', type=float, default=5, help="seconds in a rate limit window")
+    parser.add_argument('--throttle-every', type=int, default=0, help="answer every Nth request with a 429")
+    parser.add_argument('--tokens', type=int, default=2, help="tokens in GITHUB_PATS")
+    args = parser.parse_args()
+    reserve = max(STAGE_RESERVES.get(stage, RESERVE) for stage in args.stages)
+    if args.rate_limit is not None and args.rate_limit <= reserve:
+        parser.error(f"--rate-limit has to be above the largest token pool reserve of the stages, {reserve} requests")
+
+    cassette = Cassette.load(args.cassette) if args.cassette else synthetic_cassette(args.prs)
+    server = ReplayServer(cassette, port=0, latency=args.latency, jitter=args.jitter, rate_limit=args.rate_limit,
+                          window=args.window, throttle_every=args.throttle_every)
+    server.start()
+    table = input_table(cassette, server.base_url)
+
+    print(f"{len(table)} PRs, {args.latency * 1000:.0f}ms latency, {args.tokens} tokens")
+    print(f"{'stage':<16} {'seconds':>8} {'PRs/s':>8} {'requests':>9} {'req/PR':>7} {'refused':>8}")
+    for name in args.stages:
+        stats = run_stage(name, server, table, args.tokens)
+        print(f"{name:<16} {stats['seconds']:8.2f} {stats['prs_per_second']:8.1f} {stats['requests']:>9} {stats['requests_per_pr']:7.2f} {stats['refused']:>8}")
+    server.shutdown()
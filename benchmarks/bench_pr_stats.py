@@ -0,0 +1,99 @@
+"""
+Benchmark of the plots' summary statistics as PRs are appended to a synthetic dataset in batches.
+
+After each batch, the statistics every figure of plots/render.py needs are recomputed from the full frame, the
+way the plot scripts did (percentile cutoffs of concatenated groups, histograms per state and change type,
+binned decision times), and compared with pr_stats: adding the new PRs to the stored sketches and answering
+the same queries from them. Also reports the sketches' largest error on the percentiles against np.percentile.
+
+Run from the repository root:
+    python -m benchmarks.bench_pr_stats --prs 200000 --batch 5000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from pr_stats import CHARACTERISTICS, PRStats, update_stats
+
+PERCENTILES = (50, 95, 98)
+CHANGE_TYPES = ['New integration (thank you!)', 'New feature (which adds functionality to an existing integration)']
+
+
+def synthetic_prs(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'PR Number': np.arange(n),
+        'State': rng.choice(['merged', 'closed'], n, p=[0.7, 0.3]),
+        'Type of Change': rng.choice(CHANGE_TYPES, n),
+        'Decision Time': rng.lognormal(2, 1.2, n).astype(int),
+        'Files Changed': rng.lognormal(1.5, 1, n).astype(int) + 1,
+        'Total Comments': rng.poisson(12, n),
+        'LOC Changed': rng.lognormal(5, 1.5, n).astype(int) + 1,
+    }).astype({'State': 'category', 'Type of Change': 'category'})    # as dataset.load_prs gives them
+
+def recompute(df: pd.DataFrame) -> None:
+    for grouping, groups in (('State', ['merged', 'closed']), ('Type of Change', CHANGE_TYPES)):
+        first, second = (df[df[grouping] == group] for group in groups)
+        for characteristic in CHARACTERISTICS:
+            upper = np.percentile(pd.concat([first[characteristic], second[characteristic]]), 98)
+            bins = np.linspace(0, upper, 20)
+            np.histogram(first[characteristic], bins)
+            np.histogram(second[characteristic], bins)
+
+    merged, closed = df[df['State'] == 'merged'], df[df['State'] == 'closed']
+    for secondary in ('Files Changed', 'LOC Changed', 'Total Comments'):
+        bins = [0, 3, 7, 30, np.percentile(df['Decision Time'], 98)]
+        np.histogram(merged['Decision Time'], bins)
+        np.histogram(closed['Decision Time'], bins)
+        np.percentile(df[secondary], 98)
+
+def query(stats: PRStats) -> None:
+    for keyword, groups in (('state', ['merged', 'closed']), ('change_type', CHANGE_TYPES)):
+        for characteristic in CHARACTERISTICS:
+            bins = np.linspace(0, stats.percentile(characteristic, 98, **{keyword: groups}), 20)
+            for group in groups:
+                stats.histogram(characteristic, bins, **{keyword: group})
+
+    for secondary in ('Files Changed', 'LOC Changed', 'Total Comments'):
+        bins = [0, 3, 7, 30, stats.percentile('Decision Time', 98)]
+        stats.histogram('Decision Time', bins, state='merged')
+        stats.histogram('Decision Time', bins, state='closed')
+        stats.percentile(secondary, 98)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--prs', type=int, default=200000, help="number of synthetic PRs")
+    parser.add_argument('--batch', type=int, default=5000, help="PRs appended per update")
+    args = parser.parse_args()
+
+    df = synthetic_prs(args.prs)
+    recompute_time = incremental_time = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "pr_stats.pkl")
+        for end in range(args.batch, args.prs + 1, args.batch):
+            frame = df.iloc[:end]
+
+            start = time.perf_counter()
+            recompute(frame)
+            recompute_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            stats = update_stats(frame, path)
+            query(stats)
+            incremental_time += time.perf_counter() - start
+
+    print(f"{args.prs // args.batch} updates of {args.batch} PRs")
+    print(f"{'recompute from the frame':<28} {recompute_time:8.2f}s")
+    print(f"{'pr_stats, incremental':<28} {incremental_time:8.2f}s {recompute_time / incremental_time:6.1f}x")
+
+    errors = [
+        abs(stats.percentile(characteristic, p) - np.percentile(df[characteristic], p)) / max(np.percentile(df[characteristic], p), 1)
+        for characteristic in CHARACTERISTICS for p in PERCENTILES
+    ]
+    print(f"largest relative error over p{', p'.join(map(str, PERCENTILES))}: {max(errors):.2%}")
@@ -0,0 +1,115 @@
+"""
+Benchmark of review-thread assembly on synthetic PRs the size of our largest integration PRs.
+
+Compares the one-pass order_comments engine with the original recursive builder (kept here as the
+baseline) and the iterative per-thread reply-map path, and checks all of them give the same threads.
+A single long reply chain is included too: the recursive builder can't handle it at all.
+
+Run from the repository root:
+    python -m benchmarks.bench_reply_threads --comments 10000 20000 50000
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import random
+import time
+
+from comment_threads import order_comments, order_comments_from_reply_map
+
+START = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+# A PR with n review comments (a fifth of them starting threads, the rest replying to an earlier comment) and n / 10 issue comments
+def synthetic_pr(n_comments: int, seed: int = 0):
+    rng = random.Random(seed)
+    review_comments = []
+    for i in range(n_comments):
+        comment = {
+            'id': i,
+            'created_at': (START + timedelta(minutes=rng.randint(0, 60 * 24 * 90))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            'body': f"review comment {i}",
+            'is_from_author': rng.random() < 0.5,
+            'diff_hunk': "@@ -1,3 +1,4 @@\n+line",
+        }
+        if i > 0 and rng.random() >= 0.2:
+            comment['in_reply_to_id'] = rng.randrange(i)
+        review_comments.append(comment)
+
+    issue_comments = [
+        {'id': n_comments + i, 'created_at': (START + timedelta(minutes=rng.randint(0, 60 * 24 * 90))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+         'body': f"issue comment {i}", 'is_from_author': rng.random() < 0.5}
+        for i in range(n_comments // 10)
+    ]
+    return issue_comments, review_comments
+
+# One thread where every comment replies to the previous one
+def reply_chain(n_comments: int):
+    return [], [
+        {'id': i, 'created_at': (START + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ"), 'body': f"reply {i}",
+         'is_from_author': i % 2 == 0, 'diff_hunk': "@@ -1 +1 @@", **({'in_reply_to_id': i - 1} if i else {})}
+        for i in range(n_comments)
+    ]
+
+
+# The builder as it was before comment_threads: recursive, re-sorting and copying dicts per thread
+def recursive_build_reply_thread(comment, reply_map):
+    thread = {'type': 'review', 'diff_hunk': comment['diff_hunk'], 'comment': {k: v for k, v in comment.items() if k not in ['diff_hunk', 'type']}, 'replies': []}
+    if comment['id'] in reply_map:
+        for reply in sorted(reply_map[comment['id']], key=lambda comment: comment['timestamp']):
+            thread['replies'].append({k: v for k, v in reply.items() if k not in ['diff_hunk', 'type']})
+            if reply['id'] in reply_map:
+                thread['replies'].extend(recursive_build_reply_thread(reply, reply_map)['replies'])
+    return thread
+
+def recursive_order_comments(issue_comments, review_comments):
+    reply_map = defaultdict(list)
+    top_level_comments = []
+    for comment in review_comments:
+        record = {'id': comment['id'], 'type': 'review', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author'], 'diff_hunk': comment['diff_hunk']}
+        if 'in_reply_to_id' in comment:
+            reply_map[comment['in_reply_to_id']].append(record)
+        else:
+            top_level_comments.append(record)
+    for comment in issue_comments:
+        top_level_comments.append({'id': comment['id'], 'type': 'issue', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author']})
+
+    top_level_comments.sort(key=lambda comment: comment['timestamp'])
+    return [recursive_build_reply_thread(comment, reply_map) if comment['type'] == 'review' else {'type': 'issue', 'comment': comment} for comment in top_level_comments]
+
+
+def best_of(repeats: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--comments', type=int, nargs='+', default=[1000, 10000, 50000], help="review comments per synthetic PR")
+    parser.add_argument('--chain', type=int, default=5000, help="length of the single reply chain case")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'case':>16} {'recursive (s)':>14} {'reply map (s)':>14} {'one pass (s)':>13} {'speedup':>8}")
+    cases = [(f"{n} comments", synthetic_pr(n)) for n in args.comments]
+    cases.append((f"{args.chain} chain", reply_chain(args.chain)))
+    for name, (issue_comments, review_comments) in cases:
+        threads = order_comments(issue_comments, review_comments)
+        assert threads == order_comments_from_reply_map(issue_comments, review_comments)
+
+        try:
+            assert threads == recursive_order_comments(issue_comments, review_comments)
+            recursive_time = best_of(args.repeats, recursive_order_comments, issue_comments, review_comments)
+        except RecursionError:
+            recursive_time = None
+
+        reply_map_time = best_of(args.repeats, order_comments_from_reply_map, issue_comments, review_comments)
+        one_pass_time = best_of(args.repeats, order_comments, issue_comments, review_comments)
+        if recursive_time is None:
+            print(f"{name:>16} {'RecursionError':>14} {reply_map_time:>14.4f} {one_pass_time:>13.4f} {'-':>8}")
+        else:
+            print(f"{name:>16} {recursive_time:>14.4f} {reply_map_time:>14.4f} {one_pass_time:>13.4f} {recursive_time / one_pass_time:>7.1f}x")
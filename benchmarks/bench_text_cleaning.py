@@ -0,0 +1,76 @@
+"""
+Benchmark of the clustering notebooks' text cleaning on a few hundred thousand synthetic review threads,
+mixing many identical short replies with longer comments holding quotes, code blocks and links.
+
+Compares the original per-document four-pass clean_text with text_cleaning.clean_text (compiled, one
+pass fewer, memoized) and the batched clean_texts, and checks they all give the same output.
+
+Run from the repository root:
+    python -m benchmarks.bench_text_cleaning --threads 300000
+"""
+
+import argparse
+import random
+import time
+
+from text_cleaning import clean_text, clean_text_uncompiled, clean_texts
+
+SHORT_REPLIES = ["Done", "Done.", "Same here", "Thanks!", "Fixed 👍", "Same as above", "Good catch, thanks", "Removed"]
+WORDS = (
+    "entity coordinator config entry unique id should be moved to the constructor please use async "
+    "the library must handle this we don't need this check sensor platform translation key device class"
+).split()
+
+
+def synthetic_thread(rng: random.Random) -> str:
+    if rng.random() < 0.4:
+        return rng.choice(SHORT_REPLIES)
+
+    parts = [" ".join(rng.choices(WORDS, k=rng.randint(5, 40)))]
+    if rng.random() < 0.3:
+        parts.insert(0, "> " + " ".join(rng.choices(WORDS, k=12)))
+    if rng.random() < 0.3:
+        parts.append("```python\n" + "\n".join(f"    self._attr_{word} = {i}" for i, word in enumerate(rng.choices(WORDS, k=6))) + "\n```")
+    if rng.random() < 0.2:
+        parts.append(f"See https://developers.home-assistant.io/docs/{rng.choice(WORDS)}#section-{rng.randint(1, 9)}")
+    parts.extend(rng.choices(SHORT_REPLIES, k=rng.randint(0, 3)))
+    return "\n".join(parts)
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=300000, help="number of synthetic review threads")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes for clean_texts (default: all cores)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    threads = [synthetic_thread(rng) for _ in range(args.threads)]
+    print(f"{len(threads)} threads, {len(set(threads))} distinct")
+
+    expected, original_time = timed(lambda: [clean_text_uncompiled(thread) for thread in threads])
+    print(f"{'original, four passes':<34} {original_time:8.2f}s")
+
+    clean_text.cache_clear()
+    result, compiled_time = timed(lambda: [clean_text.__wrapped__(thread) for thread in threads])
+    assert result == expected
+    print(f"{'compiled, three passes':<34} {compiled_time:8.2f}s {original_time / compiled_time:6.1f}x")
+
+    clean_text.cache_clear()
+    result, memoized_time = timed(lambda: [clean_text(thread) for thread in threads])
+    assert result == expected
+    print(f"{'compiled + memoized':<34} {memoized_time:8.2f}s {original_time / memoized_time:6.1f}x")
+
+    clean_text.cache_clear()
+    result, serial_time = timed(clean_texts, threads, 1)
+    assert result == expected
+    print(f"{'clean_texts, 1 process':<34} {serial_time:8.2f}s {original_time / serial_time:6.1f}x")
+
+    clean_text.cache_clear()
+    result, parallel_time = timed(clean_texts, threads, args.workers)
+    assert result == expected
+    print(f"{'clean_texts, process pool':<34} {parallel_time:8.2f}s {original_time / parallel_time:6.1f}x")
@@ -8,44 +8,84 @@ This script first produces a set of formatted comments for each PR in a datafram
 ...
 and subsequently uses the OpenAI API to categories the challenges in each PR *individually* based on these
 
+Run as a script, it categorizes the whole filtered dataset with a bounded number of concurrent requests, retrying
+rate-limited (429) and failed (5xx) calls with backoff. Each conversation is compressed to a token budget
+first (see prompt_compression). Results are cached in data/completion_cache.sqlite by
+(compressed conversation hash, model, prompt version) and appended to the output every BATCH_SIZE PRs, so an interrupted run
+picks up where it left off.
+
 The identified categories can then be used as a basis for developing a taxonomy to be applied to all PRs as a whole.
 """
 
-from openai import OpenAI
+import argparse
+import asyncio
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+import openai
+from openai import AsyncOpenAI, OpenAI
 from dotenv import load_dotenv
 from os import environ
 from pydantic import BaseModel
 import pandas as pd
 
+from completion_cache import CompletionCache
+from format_comment_data import FORMATTED_PATH
+from progress_ledger import ProgressLedger
+from prompt_compression import TOKEN_BUDGET, CompressionResult, compress_conversation
+
 load_dotenv()
 GITHUB_API_KEY = environ.get("GITHUB_PAT")
-client = OpenAI()   # by default gets api key from env under OPENAI_API_KEY
+_client: Optional[OpenAI] = None
+
+MODEL = environ.get("OPENAI_MODEL", "gpt-4o-mini")
+PROMPT_VERSION = 2  # bump whenever build_messages changes, so cached categories from the old prompt aren't reused
+OUTPUT_PATH = 'data/pull_requests_filtered_issues_categorized.csv'
+STAGE = "categorize"   # progress ledger stage name
+MAX_CONCURRENT_REQUESTS = 8
+WORKERS_PER_REQUEST = 2     # PRs being compressed or backing off for each request in flight
+MAX_RETRIES = 6
+BATCH_SIZE = 50  # Append to the output every x PRs
 
 class CommentCategoriesExtraction(BaseModel):
     categories: list[str]
 
 
+# Made on first use, so importing this module doesn't need an API key; by default gets the api key from env
+# under OPENAI_API_KEY, and OPENAI_BASE_URL if set
+def get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI()
+    return _client
+
+# The conversation is sent once, already compressed by prompt_compression
+def build_messages(conversation: str) -> List[Dict]:
+    return [
+        {"role": "system", "content": (
+            "You are a helpful assistant that analyzes pull request comments "
+            "within the Home Assistant repository to categorize challenges faced when developing device integrations, "
+            "and returns a list of them, e.g. categories=['Testing Issues', 'Naming/ID Issues', 'Code Structure Issues', "
+            "'Communication Issues', 'Review Process Issues', 'Other']. Make sure any Home Assistant/Smart home-specific concepts are captured. "
+            "If not categorizable, use 'Other'. If you can see that there's a long gap before or between a comment, "
+            "and it's likely that the gap is simply due to delay in a reviewer commenting, use 'Reviewer Delay' rather than inventing categories." 
+        )},
+        {"role": "user", "content": f"Analyze the following conversation:\n{conversation}"}
+    ]
+
+# Empty conversations are read back from the CSV as NaN
+def has_comments(comment_string) -> bool:
+    return isinstance(comment_string, str) and comment_string != ""
+
 def gpt_categorize_challenges(comment_string: str) -> list[str]:
-    if comment_string == "":
+    if not has_comments(comment_string):
         return []
 
     try:
-        chat_completion = client.beta.chat.completions.parse(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": (
-                    "You are a helpful assistant that analyzes pull request comments "
-                    "within the Home Assistant repository to categorize challenges faced when developing device integrations, "
-                    "and returns a list of them. If not categorizable, use 'Other'. If you can see that there's a long gap before or between a comment, "
-                    "and it's likely that the gap is simply due to delay in a reviewer commenting, use 'Reviewer Delay' rather than inventing categories." 
-                )},
-                {"role": "user", "content": f"Analyze the following conversation:\n{comment_string}"},
-                {"role": "assistant", "content": (
-                    "categories=['Testing Issues', 'Naming/ID Issues', 'Code Structure Issues', "
-                    "'Communication Issues', 'Review Process Issues', 'Other']"
-                )},
-                {"role": "user", "content": f"Can you make sure any Home Assistant/Smart home-specific concepts are captured:\n{comment_string}"}
-            ],
+        chat_completion = get_client().beta.chat.completions.parse(
+            model=MODEL,
+            messages=build_messages(compress_conversation(comment_string, MODEL).text),
             response_format=CommentCategoriesExtraction
         )
     except Exception as e: 
@@ -57,10 +97,133 @@ def gpt_categorize_challenges(comment_string: str) -> list[str]:
     return categories
 
 
-if __name__ == "__main__":
-    df = pd.read_csv('data/pull_requests_filtered.csv').head(50)
+# Rate limits, server errors and dropped connections are worth retrying, anything else (bad request, auth) isn't
+def is_retryable(error: Exception) -> bool:
+    return isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError))
+
+# Honour Retry-After when the server sends one, otherwise exponential backoff with jitter
+def retry_delay(error: Exception, attempt: int) -> float:
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after is not None:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(60, 2 ** attempt) + random.uniform(0, 1)
+
+# Takes the compressed conversation, which is also what the cache is keyed on, along with the tokenizer that compressed it
+async def gpt_categorize_challenges_async(async_client: AsyncOpenAI, semaphore: asyncio.Semaphore, cache: CompletionCache, conversation: str, model: str = MODEL,
+                                          tokenizer: str = "") -> list[str]:
+    if conversation == "":
+        return []
 
-    df['Categorized Challenges'] = df['Formatted Comments'].apply(gpt_categorize_challenges)
-    df.to_csv('data/pull_requests_filtered_issues_categorized.csv', index=False)
+    cached = cache.get(conversation, model, PROMPT_VERSION, tokenizer)
+    if cached is not None:
+        return cached
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with semaphore:
+                chat_completion = await async_client.beta.chat.completions.parse(
+                    model=model,
+                    messages=build_messages(conversation),
+                    response_format=CommentCategoriesExtraction
+                )
+            break
+        except Exception as e:
+            if not is_retryable(e) or attempt == MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            print(f"{type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{MAX_RETRIES})")
+            await asyncio.sleep(delay)  # outside the semaphore, so other requests keep going
+
+    categories = chat_completion.choices[0].message.parsed.categories
+    cache.put(conversation, model, PROMPT_VERSION, categories, tokenizer)
+    return categories
+
+
+def save_categorized(df: pd.DataFrame, results: List[Tuple[int, list, CompressionResult]], ledger: ProgressLedger, output_path: str) -> None:
+    rows = df.loc[[index for index, _, _ in results]].copy()
+    rows['Categorized Challenges'] = [categories for _, categories, _ in results]
+    rows['Prompt Tokens'] = [compression.tokens for _, _, compression in results]
+    # against the previous prompt, which sent the uncompressed conversation twice
+    rows['Tokens Saved'] = [2 * compression.original_tokens - compression.tokens for _, _, compression in results]
+    rows.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
+    ledger.mark_done(STAGE, rows['PR Number'])     # only marked once they're on disk
+    results.clear()
+
+# Categorize every PR not yet in the output, appending results as they complete. Returns the failures as {PR number: error}.
+# A fixed set of workers takes the PRs one at a time, compressing each in a thread so tokenizing stays off the
+# event loop, and only PRs being worked on are compressed and held in memory
+async def categorize_df(df: pd.DataFrame, model: str = MODEL, concurrency: int = MAX_CONCURRENT_REQUESTS, base_url: Optional[str] = None,
+                        retry_failed: bool = False, output_path: str = OUTPUT_PATH, budget: int = TOKEN_BUDGET,
+                        async_client: Optional[AsyncOpenAI] = None, cache: Optional[CompletionCache] = None,
+                        ledger: Optional[ProgressLedger] = None) -> Dict[int, str]:
+    ledger = ledger or ProgressLedger()
+    done = ledger.done(STAGE)
+    failed = set(ledger.failed(STAGE))
+    # Skip PRs we've already categorized, or everything but the failed ones when retrying
+    todo = df[~df['PR Number'].isin(done)]
+    if retry_failed:
+        todo = todo[todo['PR Number'].isin(failed)]
+    print(f"Categorizing {len(todo)} PRs ({len(df) - len(todo)} skipped).")
+
+    own_client, own_cache = async_client is None, cache is None     # only close what's opened here
+    async_client = async_client or AsyncOpenAI(base_url=base_url, max_retries=0)    # retries are handled in gpt_categorize_challenges_async
+    semaphore = asyncio.Semaphore(concurrency)
+    cache = cache or CompletionCache()
+
+    rows = iter(zip(todo.index, todo['Formatted Comments']))  # shared by the workers, each takes the next PR when it's free
+    results = []
+    failures = {}
+    completed = 0
+
+    async def worker():
+        nonlocal completed
+        for index, comment_string in rows:
+            try:
+                compression = await asyncio.to_thread(compress_conversation, comment_string if has_comments(comment_string) else "", model, budget)
+                categories = await gpt_categorize_challenges_async(async_client, semaphore, cache, compression.text, model, compression.tokenizer)
+            except Exception as e:
+                pr_number = df.at[index, 'PR Number']
+                print(f"Failed to categorize PR {pr_number}: {e}")
+                ledger.mark_failed(STAGE, pr_number, e)
+                failures[pr_number] = str(e)
+                continue
+
+            results.append((index, categories, compression))
+            completed += 1
+            if len(results) >= BATCH_SIZE:
+                save_categorized(df, results, ledger, output_path)
+                print(f"{completed}/{len(todo)} PRs categorized.")
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(WORKERS_PER_REQUEST * concurrency)))
+    finally:
+        if results:
+            save_categorized(df, results, ledger, output_path)     # keep whatever finished, even on a crash
+        if own_client:
+            await async_client.close()
+        if own_cache:
+            cache.close()
+
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=MODEL)
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENT_REQUESTS, help="number of completion requests in flight")
+    parser.add_argument('--base-url', default=None, help="chat completions endpoint, e.g. a local stub (defaults to OPENAI_BASE_URL or the OpenAI API)")
+    parser.add_argument('--budget', type=int, default=TOKEN_BUDGET, help="maximum tokens per PR conversation in the prompt")
+    parser.add_argument('--limit', type=int, default=None, help="only categorize the first N PRs")
+    parser.add_argument('--retry-failed', action='store_true', help="only re-categorize PRs recorded as failed in the progress ledger")
+    args = parser.parse_args()
 
+    df = pd.read_csv(FORMATTED_PATH).drop_duplicates('PR Number', keep='last')    # a PR reformatted after it changed is appended again
+    if args.limit is not None:
+        df = df.head(args.limit)
 
+    failures = asyncio.run(categorize_df(df, args.model, args.concurrency, args.base_url, args.retry_failed, budget=args.budget))
+    print(f"Categorized challenges saved to {OUTPUT_PATH} ({len(failures)} PRs failed, rerun with --retry-failed).")
@@ -0,0 +1,143 @@
+"""
+Index of home-assistant/core's CODEOWNERS file (data/CODEOWNERS.txt) with GitHub's matching rules: gitignore-style
+glob paths (anchored with a leading /, *, ** and ?, directories matching everything under them but dir/*
+only the files directly inside), and the last matching rule wins. An integration's owners are whoever owns its code under homeassistant/components/<name>/
+together with whoever owns its tests under tests/components/<name>/.
+
+The parsed index is pickled next to the file, keyed by the file's hash, and kept in memory, so scripts don't
+re-parse it. "Author is Codeowner" is a single merge against the (integration, owner) pairs:
+
+    df["Author is Codeowner"] = author_is_codeowner(df, load_index())
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+import hashlib
+import os
+import pickle
+import re
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import pandas as pd
+
+CODEOWNERS_PATH = "data/CODEOWNERS.txt"
+INDEX_VERSION = 2   # bump when the matching rules change, so indexes pickled by an older version are re-parsed
+INTEGRATION_PATHS = ("homeassistant/components/{}/", "tests/components/{}/")
+INTEGRATION = re.compile(r"^/?(?:homeassistant|tests)/components/([^/*?\[]+)/")
+
+
+@dataclass(frozen=True)
+class Rule:
+    pattern: str
+    owners: Tuple[str, ...]
+    regex: re.Pattern
+
+# Translate a CODEOWNERS path pattern to a regex over repository-relative paths
+def pattern_to_regex(pattern: str) -> re.Pattern:
+    anchored = pattern.startswith("/") or "/" in pattern.rstrip("/")   # a slash anywhere but the end anchors to the root
+    # a directory (a trailing slash, or a last segment without wildcards) matches everything beneath it, dir/* doesn't
+    descendants = pattern.endswith("/") or not any(wildcard in pattern.rstrip("/").rsplit("/", 1)[-1] for wildcard in "*?")
+    pattern = pattern.strip("/") if pattern != "/" else ""
+
+    regex = ""
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+
+    return re.compile(("^" if anchored else "^(?:.*/)?") + regex + ("(?:/.*)?$" if descendants else "$"))
+
+def parse_codeowners(text: str) -> List[Rule]:
+    rules = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line:
+            continue
+        pattern, *owners = line.split()
+        rules.append(Rule(pattern, tuple(owner.lstrip("@") for owner in owners), pattern_to_regex(pattern)))
+    return rules
+
+
+class CodeownersIndex:
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self._integration_owners: Optional[pd.DataFrame] = None
+        self._owners: Dict[str, FrozenSet[str]] = {}   # memo of owners(), kept with the index rather than in a global cache
+
+    # Owners of a repository-relative path: the last matching rule wins, even when it lists no owners
+    def owners(self, path: str) -> FrozenSet[str]:
+        if path not in self._owners:
+            relative = path.lstrip("/")
+            self._owners[path] = next((frozenset(rule.owners) for rule in reversed(self.rules) if rule.regex.match(relative)), frozenset())
+        return self._owners[path]
+
+    def integrations(self) -> List[str]:
+        return sorted({match.group(1) for rule in self.rules if (match := INTEGRATION.match(rule.pattern))})
+
+    # One row per (Integration, Owner), from the owners of the integration's code and tests directories
+    def integration_owners(self) -> pd.DataFrame:
+        if self._integration_owners is None:
+            rows = [
+                (integration, owner)
+                for integration in self.integrations()
+                for owner in sorted(set().union(*(self.owners(path.format(integration)) for path in INTEGRATION_PATHS)))
+            ]
+            self._integration_owners = pd.DataFrame(rows, columns=["Integration", "Owner"])
+        return self._integration_owners
+
+    def all_owners(self) -> FrozenSet[str]:
+        return frozenset(owner for rule in self.rules for owner in rule.owners)
+
+    def __getstate__(self) -> Dict:
+        return {"rules": self.rules, "_integration_owners": self.integration_owners()}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.rules = state["rules"]
+        self._integration_owners = state["_integration_owners"]
+        self._owners = {}
+
+
+# Parsed index for a CODEOWNERS file, from memory, then the pickle beside it if the file hasn't changed, then parsing it
+@lru_cache(maxsize=None)
+def _load_index(path: str, digest: str) -> CodeownersIndex:
+    cache_path = f"{path}.index.pkl"
+    if os.path.exists(cache_path):
+        with open(cache_path, "rb") as f:
+            cached_digest, index = pickle.load(f)
+        if cached_digest == digest:
+            return index
+
+    with open(path, encoding="utf-8") as f:
+        index = CodeownersIndex(parse_codeowners(f.read()))
+    with open(cache_path, "wb") as f:
+        pickle.dump((digest, index), f)
+    return index
+
+def load_index(path: str = CODEOWNERS_PATH) -> CodeownersIndex:
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return _load_index(path, f"{digest}-v{INDEX_VERSION}")
+
+
+# Whether each PR's author owns the PR's integration, as a boolean Series aligned with df
+def author_is_codeowner(df: pd.DataFrame, index: CodeownersIndex) -> pd.Series:
+    owners = index.integration_owners().rename(columns={"Owner": "Author"}).assign(is_owner=True)
+    merged = df[["Integration", "Author"]].merge(owners, on=["Integration", "Author"], how="left")   # a left merge keeps df's row order
+    return pd.Series(merged["is_owner"].fillna(False).astype(bool).to_numpy(), index=df.index)
+
+# Whether each PR's author owns anything in the repository
+def author_is_any_codeowner(df: pd.DataFrame, index: CodeownersIndex) -> pd.Series:
+    return df["Author"].isin(index.all_owners())
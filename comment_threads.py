@@ -0,0 +1,137 @@
+"""
+Assembles a PR's issue comments and review comments into the ordered list of threads stored in the
+comments dataset:
+
+    {'type': 'review', 'diff_hunk': ..., 'comment': {...}, 'replies': [{...}, ...]}
+    {'type': 'issue', 'comment': {...}}
+
+order_comments builds every thread in one pass: review comments are sorted once, replies are attached
+to their parents in that order, and each thread is walked iteratively, so there's no per-thread
+re-sorting and no recursion limit on long reply chains. Comments are held in compact __slots__
+records until the output dicts are produced.
+
+organize_review_comments / organize_issue_comments / build_reply_thread are the original per-thread
+building blocks, kept for callers that work with a reply map directly.
+"""
+
+from collections import defaultdict
+from heapq import merge
+from operator import attrgetter
+from typing import Dict, List, Optional, TypedDict
+
+
+class Comment(TypedDict):
+    id: int
+    type: str
+    timestamp: str
+    body: str
+    is_from_author: bool
+    diff_hunk: str
+
+
+class CommentRecord:
+    __slots__ = ('id', 'type', 'timestamp', 'body', 'is_from_author', 'diff_hunk', 'parent_id', 'replies')
+
+    def __init__(self, comment: Dict, type: str):
+        self.id = comment['id']
+        self.type = type
+        self.timestamp = comment['created_at']
+        self.body = comment['body']
+        self.is_from_author = comment['is_from_author']
+        self.diff_hunk = comment.get('diff_hunk')
+        self.parent_id: Optional[int] = comment.get('in_reply_to_id')
+        self.replies: List["CommentRecord"] = []
+
+    def as_dict(self) -> Dict:
+        return {'id': self.id, 'timestamp': self.timestamp, 'body': self.body, 'is_from_author': self.is_from_author}
+
+
+by_timestamp = attrgetter('timestamp')
+
+def thread_from_record(record: CommentRecord) -> Dict:
+    replies = []
+    stack = record.replies[::-1]
+    while stack:    # depth-first, earliest reply first, same order as build_reply_thread
+        reply = stack.pop()
+        replies.append(reply.as_dict())
+        stack.extend(reply.replies[::-1])
+
+    return {'type': 'review', 'diff_hunk': record.diff_hunk, 'comment': record.as_dict(), 'replies': replies}
+
+# Produce the ordered list of issue comments and review threads for a single PR
+def order_comments(issue_comments: List[Dict], review_comments: List[Dict]) -> List[Dict]:
+    reviews = sorted((CommentRecord(comment, 'review') for comment in review_comments), key=by_timestamp)    # the one global sort
+    by_id = {record.id: record for record in reviews}
+
+    top_level_reviews = []
+    for record in reviews:
+        if record.parent_id is None:
+            top_level_reviews.append(record)
+        elif record.parent_id in by_id:     # replies to deleted/bot comments are dropped, as before
+            by_id[record.parent_id].replies.append(record)   # appended in timestamp order, so already sorted
+
+    issues = sorted((CommentRecord(comment, 'issue') for comment in issue_comments), key=by_timestamp)
+
+    ordered_comments = []
+    for record in merge(top_level_reviews, issues, key=by_timestamp):   # review comments first on equal timestamps, as before
+        if record.type == 'review':
+            ordered_comments.append(thread_from_record(record))
+        else:
+            ordered_comments.append({'type': 'issue', 'comment': {'id': record.id, 'type': 'issue', 'timestamp': record.timestamp, 'body': record.body, 'is_from_author': record.is_from_author}})
+    return ordered_comments
+
+
+def organize_review_comments(review_comments: List[Dict], reply_map: Dict[int, List[Comment]], top_level_comments: List[Dict]):
+    for comment in review_comments:
+        if 'in_reply_to_id' in comment:
+            parent_id = comment['in_reply_to_id']
+            reply_map[parent_id].append(
+                {'id': comment['id'], 'type': 'review', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author'], 'diff_hunk': comment['diff_hunk']}
+            )
+        else:
+            top_level_comments.append(
+                {'id': comment['id'], 'type': 'review', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author'], 'diff_hunk': comment['diff_hunk']}
+            )
+
+def organize_issue_comments(issue_comments: List[Dict], top_level_comments: List[Comment]):
+    for comment in issue_comments:
+        top_level_comments.append(
+            {'id': comment['id'], 'type': 'issue', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author']}
+        )
+
+def strip_comment(comment: Comment) -> Dict:
+    return {'id': comment['id'], 'timestamp': comment['timestamp'], 'body': comment['body'], 'is_from_author': comment['is_from_author']}
+
+def build_reply_thread(comment: Comment, reply_map: Dict[int, List[Comment]]) -> Dict:
+    thread = {
+        'type': 'review',
+        'diff_hunk': comment['diff_hunk'],
+        'comment': strip_comment(comment),
+        'replies': []
+    }
+
+    stack = sorted(reply_map.get(comment['id'], []), key=lambda comment: comment['timestamp'])[::-1]
+    while stack:    # iterative depth-first walk, earliest reply first
+        reply = stack.pop()
+        thread['replies'].append(strip_comment(reply))
+        stack.extend(sorted(reply_map.get(reply['id'], []), key=lambda comment: comment['timestamp'])[::-1])
+
+    return thread
+
+# Same as order_comments, built from a reply map one thread at a time
+def order_comments_from_reply_map(issue_comments: List[Dict], review_comments: List[Dict]) -> List[Dict]:
+    reply_map: Dict[int, List[Comment]] = defaultdict(list)
+    top_level_comments: List[Comment] = []
+
+    organize_review_comments(review_comments, reply_map, top_level_comments)
+    organize_issue_comments(issue_comments, top_level_comments)
+
+    top_level_comments.sort(key=lambda comment: comment['timestamp'])
+
+    ordered_comments = []
+    for comment in top_level_comments:
+        if comment['type'] == 'review':
+            ordered_comments.append(build_reply_thread(comment, reply_map))
+        else:
+            ordered_comments.append({'type': 'issue', 'comment': comment})
+    return ordered_comments
@@ -0,0 +1,137 @@
+"""
+Columnar (Parquet) storage for the filtered PRs and their ordered comment threads.
+
+Rather than writing the nested threads into a CSV as a Python repr that has to be parsed back with
+ast.literal_eval row by row, the `comments` column is stored as a native list-of-struct column, and
+the dataset is partitioned by the year the PR was created. Reading is a memory-mapped, zero-parse
+load, and callers can project just the columns they need, e.g.
+
+    df = read_comments_dataset(columns=['PR Number', 'comments'])
+
+PRs that change after they were written (the webhook receiver) are added as revision files next to the
+partitions instead of rewriting them. Readers skip every row of a PR but its latest revision, and a revision
+with Removed set takes the PR out; compact_comments_dataset folds the revisions back into the partitions.
+"""
+
+import os
+import shutil
+import time
+from typing import Dict, Iterator, List, Optional, Set
+import uuid
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+DATASET_PATH = "data/pull_requests_filtered_comments"
+
+COMMENT_TYPE = pa.struct([
+    ("id", pa.int64()),
+    ("timestamp", pa.string()),
+    ("body", pa.string()),
+    ("is_from_author", pa.bool_()),
+])
+# Issue comments are stored as threads with no diff hunk and no replies
+THREAD_TYPE = pa.struct([
+    ("type", pa.string()),
+    ("diff_hunk", pa.string()),
+    ("comment", COMMENT_TYPE),
+    ("replies", pa.list_(COMMENT_TYPE)),
+])
+COMMENTS_TYPE = pa.list_(THREAD_TYPE)
+
+PARTITIONING = ds.partitioning(pa.schema([("Year", pa.int16())]), flavor="hive")
+REVISION_PREFIX = "revision-"
+REMOVED = "Removed"     # set on a revision that takes its PR out of the dataset
+
+
+def to_table(df: pd.DataFrame) -> pa.Table:
+    df = df.rename(columns={'Comments': 'comments'})
+    comments = pa.array(df['comments'].tolist(), type=COMMENTS_TYPE)
+
+    table = pa.Table.from_pandas(df.drop(columns=['comments']), preserve_index=False)
+    table = table.append_column("comments", comments)
+    return table.append_column("Year", pa.array(pd.to_datetime(df['Created At'], utc=True).dt.year, type=pa.int16()))
+
+# Write a dataframe with a 'comments' (or 'Comments') column of ordered threads, replacing any years it covers
+def write_comments_dataset(df: pd.DataFrame, path: str = DATASET_PATH) -> None:
+    ds.write_dataset(
+        to_table(df), path, format="parquet", partitioning=PARTITIONING,
+        existing_data_behavior="delete_matching"    # rewriting a year replaces it rather than duplicating rows
+    )
+
+# Add a batch of PRs as new files alongside what's already there, e.g. for checkpoints while scraping
+def append_comments_dataset(df: pd.DataFrame, path: str = DATASET_PATH) -> None:
+    ds.write_dataset(
+        to_table(df), path, format="parquet", partitioning=PARTITIONING,
+        basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore"
+    )
+
+# Add newer rows of PRs that may already be in the dataset, replacing their older rows for readers. Revision
+# files are named by the time they were written, so the latest of several revisions of a PR wins
+def append_revisions(df: pd.DataFrame, path: str = DATASET_PATH) -> None:
+    ds.write_dataset(
+        to_table(df), path, format="parquet", partitioning=PARTITIONING,
+        basename_template=f"{REVISION_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore"
+    )
+
+def is_revision(fragment: ds.Fragment) -> bool:
+    return os.path.basename(fragment.path).startswith(REVISION_PREFIX)
+
+# The raw dataset, every revision of a PR included
+def open_comments_dataset(path: str = DATASET_PATH) -> ds.Dataset:
+    filesystem = fs.LocalFileSystem(use_mmap=True)
+    dataset = ds.dataset(path, format="parquet", partitioning=PARTITIONING, filesystem=filesystem)
+
+    # Appended batches can infer slightly different types (e.g. an all-empty column), so read them under one unified schema
+    schema = pa.unify_schemas([fragment.physical_schema for fragment in dataset.get_fragments()], promote_options="permissive")
+    return ds.dataset(path, schema=schema.append(pa.field("Year", pa.int16())), format="parquet", partitioning=PARTITIONING, filesystem=filesystem)
+
+# PR numbers to skip in each file of the dataset, because a later revision replaced them. Only the revision
+# files are read, and only their PR Number column
+def superseded(dataset: ds.Dataset) -> Dict[str, Set[int]]:
+    fragments = list(dataset.get_fragments())
+    revisions = sorted((fragment for fragment in fragments if is_revision(fragment)), key=lambda fragment: os.path.basename(fragment.path))
+    stale, later = {}, set()
+    for fragment in reversed(revisions):
+        stale[fragment.path] = set(later)
+        later |= set(fragment.to_table(columns=["PR Number"]).column("PR Number").to_pylist())
+    for fragment in fragments:
+        stale.setdefault(fragment.path, later)
+    return stale
+
+# Scan the latest row of each PR, one file at a time; batches only hold the requested columns
+def iter_comment_batches(path: str = DATASET_PATH, columns: Optional[List[str]] = None, filter: Optional[ds.Expression] = None,
+                         batch_size: int = 131_072) -> Iterator[pa.RecordBatch]:
+    dataset = open_comments_dataset(path)
+    stale = superseded(dataset)
+    columns = columns or [name for name in dataset.schema.names if name != REMOVED]
+    for fragment in dataset.get_fragments(filter=filter):
+        expression = ~ds.field("PR Number").isin(sorted(stale[fragment.path]))
+        if REMOVED in dataset.schema.names:
+            expression &= ds.field(REMOVED).is_null()
+        if filter is not None:
+            expression &= filter
+        yield from ds.Scanner.from_fragment(fragment, schema=dataset.schema, columns=columns, filter=expression, batch_size=batch_size).to_batches()
+
+# Load (a projection of) the dataset into pandas; `comments` comes back as arrays of thread dicts
+def read_comments_dataset(path: str = DATASET_PATH, columns: Optional[List[str]] = None, filter: Optional[ds.Expression] = None) -> pd.DataFrame:
+    dataset = open_comments_dataset(path)
+    schema = pa.schema([dataset.schema.field(name) for name in (columns or dataset.schema.names) if name != REMOVED])
+    return pa.Table.from_batches(list(iter_comment_batches(path, columns, filter)), schema).to_pandas()
+
+# Rewrite the partitions that have revisions with each PR's latest row, and drop the revision files; returns
+# whether there was anything to fold in (at least min_revisions files)
+def compact_comments_dataset(path: str = DATASET_PATH, min_revisions: int = 1) -> bool:
+    revisions = [fragment for fragment in open_comments_dataset(path).get_fragments() if is_revision(fragment)]
+    if len(revisions) < min_revisions:
+        return False
+    years = sorted({int(os.path.basename(os.path.dirname(fragment.path)).split("=")[1]) for fragment in revisions})
+    df = read_comments_dataset(path, filter=ds.field("Year").isin(years))
+    if not df.empty:
+        write_comments_dataset(df.drop(columns=["Year"]), path)    # replaces these years, revision files included
+    for year in set(years) - set(df["Year"].tolist()):     # every PR of the year was removed
+        shutil.rmtree(os.path.join(path, f"Year={year}"))
+    return True
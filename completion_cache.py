@@ -0,0 +1,60 @@
+"""
+On-disk cache of chat-completion results, used by categorize_issues_gpt.
+
+Results are stored in SQLite keyed by (hash of the prompt input and the tokenizer that compressed it, model,
+prompt version), so rerunning a categorization - after a crash, or over a dataset that grew - only pays for
+conversations it hasn't seen with that model and prompt. Bumping the prompt version invalidates every earlier
+result.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+CACHE_PATH = "data/completion_cache.sqlite"
+
+
+def content_hash(text: str, tokenizer: str = "") -> str:
+    return hashlib.sha256(f"{tokenizer}\0{text}".encode() if tokenizer else text.encode()).hexdigest()
+
+
+class CompletionCache:
+    def __init__(self, path: str = CACHE_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                input_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (input_hash, model, prompt_version)
+            )
+        """)
+
+    def get(self, text: str, model: str, prompt_version: int, tokenizer: str = "") -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM completions WHERE input_hash = ? AND model = ? AND prompt_version = ?",
+                (content_hash(text, tokenizer), model, prompt_version)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, text: str, model: str, prompt_version: int, result: Any, tokenizer: str = "") -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (input_hash, model, prompt_version, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (content_hash(text, tokenizer), model, prompt_version, json.dumps(result), time.time())
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
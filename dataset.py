@@ -0,0 +1,89 @@
+"""
+Typed loader for the analysis table, data/pull_requests_filtered.csv (and the other tables with its columns).
+
+pd.read_csv on its own parses every column, the long text ones included, and infers their types: counts come
+back as int64 (float64 once one is missing), timestamps as strings, and State, Integration, Author and Type of
+Change as object strings that every filter scans again. load_prs reads only the columns asked for, with the
+types declared here: categoricals for the repeated strings, int32 for the counts (float64 while some are
+missing, e.g. PRs without a LOC Changed yet) and UTC datetimes. Change Type, a ChangeType per PR, is worked
+out once per distinct Type of Change rather than per row, so filters compare categorical codes instead of
+searching strings:
+
+    df = load_prs(['Change Type', 'Decision Time'])
+    integrations = df[df['Change Type'] == ChangeType.NEW_INTEGRATION]
+"""
+
+from enum import Enum
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+DATA_PATH = "data/pull_requests_filtered.csv"
+
+CATEGORIES = ['State', 'Integration', 'Author', 'Type of Change']
+COUNTS = ['PR Number', 'Files Changed', 'Decision Time', 'Total Comments', 'LOC Changed']
+DATETIMES = ['Created At', 'Updated At', 'Closed Date']
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class ChangeType(str, Enum):
+    NEW_INTEGRATION = 'New integration'
+    NEW_FEATURE = 'New feature'
+    OTHER = 'Other'
+
+    # The kind of change checked in a PR's Type of Change boxes; new integration wins when both are checked
+    @classmethod
+    def of(cls, type_of_change: Optional[str]) -> "ChangeType":
+        if not isinstance(type_of_change, str):
+            return cls.OTHER
+        return next((change_type for change_type in (cls.NEW_INTEGRATION, cls.NEW_FEATURE) if change_type.value in type_of_change), cls.OTHER)
+
+CHANGE_TYPE = pd.CategoricalDtype([change_type.value for change_type in ChangeType])
+
+
+# ChangeType of every row, classifying each distinct Type of Change once
+def change_types(types_of_change: pd.Series) -> pd.Series:
+    types_of_change = types_of_change.astype('category')
+    categories = list(types_of_change.cat.categories) + [None]  # code -1 is a missing value
+    codes = np.array([CHANGE_TYPE.categories.get_loc(ChangeType.of(category).value) for category in categories], dtype=np.int8)
+    change_type = pd.Categorical.from_codes(codes[types_of_change.cat.codes.to_numpy()], dtype=CHANGE_TYPE)
+    return pd.Series(change_type, index=types_of_change.index, name='Change Type')
+
+# int32 when every value is there, float64 otherwise, so a missing count stays NaN
+def narrow_counts(values: pd.Series) -> pd.Series:
+    values = pd.to_numeric(values)
+    if values.isna().any() or values.abs().max() > INT32_MAX:
+        return values.astype(np.float64)
+    return values.astype(np.int32)
+
+# Cast whichever of the declared columns df has, e.g. after joining sidecars onto a table
+def with_schema(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy(deep=False)
+    for column in df.columns:
+        if column in CATEGORIES and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+        elif column in COUNTS:
+            df[column] = narrow_counts(df[column])
+        elif column in DATETIMES:
+            df[column] = pd.to_datetime(df[column], utc=True, format='ISO8601')
+    return df
+
+# The given columns of a PR table (all of them when None, plus Change Type), typed; columns it doesn't have are left out
+def load_prs(columns: Optional[Sequence[str]] = None, path: str = DATA_PATH) -> pd.DataFrame:
+    header = list(pd.read_csv(path, nrows=0).columns)
+    wanted: List[str] = header + ['Change Type'] if columns is None else list(dict.fromkeys(columns))
+    read = [column for column in header if column in wanted or (column == 'Type of Change' and 'Change Type' in wanted)]
+
+    dtype = {column: 'category' for column in read if column in CATEGORIES}
+    dtype.update({column: np.float64 for column in read if column in COUNTS})  # skips inference, narrowed below
+    df = with_schema(pd.read_csv(path, usecols=read, dtype=dtype))
+    if 'Change Type' in wanted and 'Type of Change' in df.columns:
+        df['Change Type'] = change_types(df['Type of Change'])
+    return df[[column for column in wanted if column in df.columns]]
+
+
+if __name__ == "__main__":
+    df = load_prs()
+    df.info(memory_usage='deep')
+    print(df['Change Type'].value_counts())
@@ -0,0 +1,130 @@
+"""
+Persistent store of document embeddings for the BERTopic notebooks, so parameter sweeps (min_topic_size,
+UMAP settings, ...) don't re-embed the whole corpus every run.
+
+Vectors are kept per embedding model under data/embeddings/<model id>/: an append-only float32 file read
+back as a memory-mapped array, and a list of the sha256 of each embedded text giving its row. Only texts
+the store hasn't seen with that model are embedded, e.g.
+
+    embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+    embeddings = EmbeddingStore("all-MiniLM-L6-v2").embed(threads, embedding_model)
+    topics, probs = BERTopic(embedding_model=embedding_model).fit_transform(threads, embeddings)
+
+HashingEmbedder is a deterministic stand-in with the same encode() interface, for using the store offline
+(tests, benchmarks) without downloading a model.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+STORE_DIR = "data/embeddings"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"    # BERTopic's default English model
+BATCH_SIZE = 256
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, model_id: str, path: str = STORE_DIR):
+        self.model_id = model_id
+        self.path = os.path.join(path, re.sub(r"[^\w.-]+", "_", model_id))
+        os.makedirs(self.path, exist_ok=True)
+        self._vectors_path = os.path.join(self.path, "vectors.f32")
+        self._keys_path = os.path.join(self.path, "keys.txt")
+        self._meta_path = os.path.join(self.path, "meta.json")
+
+        self.dim: Optional[int] = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                self.dim = json.load(f)["dim"]
+
+        keys = []
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path) as f:
+                keys = f.read().split()
+        self._repair(keys)
+        self._rows: Dict[str, int] = {key: row for row, key in enumerate(keys)}
+        self._vectors: Optional[np.memmap] = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, text: str) -> bool:
+        return content_hash(text) in self._rows
+
+    # Vectors are written before their keys, so a run killed mid-write can leave vectors (or a partial one)
+    # without a key, or in the worst case keys without vectors: cut both back to the rows they agree on
+    def _repair(self, keys: List[str]) -> None:
+        vector_bytes = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = min(len(keys), vector_bytes // (4 * self.dim)) if self.dim else 0
+
+        if vector_bytes != rows * 4 * (self.dim or 0):
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(rows * 4 * self.dim if self.dim else 0)
+        if len(keys) != rows:
+            del keys[rows:]
+            with open(self._keys_path, "w") as f:
+                f.writelines(f"{key}\n" for key in keys)
+
+    # Memory-mapped view of every stored vector, reopened after appends
+    def vectors(self) -> np.ndarray:
+        if not self._rows:
+            return np.empty((0, self.dim or 0), dtype=np.float32)
+        if self._vectors is None or self._vectors.shape[0] != len(self._rows):
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self.dim))
+        return self._vectors
+
+    def _append(self, hashes: List[str], embeddings: np.ndarray) -> None:
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.dim is None:
+            self.dim = embeddings.shape[1]
+            with open(self._meta_path, "w") as f:
+                json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+        elif embeddings.shape[1] != self.dim:
+            raise ValueError(f"{self.model_id} embeddings have {self.dim} dimensions, got {embeddings.shape[1]}")
+
+        with open(self._vectors_path, "ab") as f:
+            f.write(embeddings.tobytes())
+        with open(self._keys_path, "a") as f:
+            f.writelines(f"{key}\n" for key in hashes)
+        for key in hashes:
+            self._rows[key] = len(self._rows)
+
+    # Embeddings for texts (in order, one row each), embedding and storing only the ones not seen before
+    def embed(self, texts: Sequence[str], embedder, batch_size: int = BATCH_SIZE, show_progress_bar: bool = False) -> np.ndarray:
+        hashes = [content_hash(text) for text in texts]
+        missing = {key: text for key, text in zip(hashes, texts) if key not in self._rows}
+        if missing:
+            print(f"Embedding {len(missing)} new texts ({len(set(hashes)) - len(missing)} already stored) with {self.model_id}.")
+            keys = list(missing)
+            for start in range(0, len(keys), batch_size):
+                batch = keys[start:start + batch_size]
+                self._append(batch, embedder.encode([missing[key] for key in batch], show_progress_bar=show_progress_bar))
+
+        return np.asarray(self.vectors()[[self._rows[key] for key in hashes]])
+
+
+# Deterministic stand-in for a sentence embedding model: hashed word unigrams and bigrams, L2-normalised
+class HashingEmbedder:
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts: Sequence[str], **kwargs) -> np.ndarray:
+        return np.stack([self._vector(text) for text in texts]) if len(texts) else np.empty((0, self.dim), dtype=np.float32)
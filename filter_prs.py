@@ -1,7 +1,12 @@
 import pandas as pd
 
+from dataset import ChangeType, change_types, with_schema
+from sidecars import join_sidecars
 
-df = pd.read_csv("data/pull_requests_all_with_checkbox_data.csv")
+
+# Join the enrichment stages' sidecars into the metadata. scrape_all_prs now collects Type of Change itself;
+# older metadata files get it from the separate checkbox pass's sidecar
+df = with_schema(join_sidecars(pd.read_csv("data/pull_requests_all.csv")))
 df = df[df['Type of Change'].isin(['New feature (which adds functionality to an existing integration)', 'New integration (thank you!)'])]
 df = df.drop_duplicates()
 df = df.reset_index(drop=True)
@@ -10,8 +15,9 @@ df.to_csv("data/pull_requests_filtered.csv", index=False)
 
 # Get 'complex' pull requests for new integrations and new features, and shuffle entries
 complex_prs = df[df['Decision Time'] >= 7]
-complex_prs_integration = complex_prs[complex_prs['Type of Change'].str.contains('New integration')].sample(frac=1)
-complex_prs_feature = complex_prs[complex_prs['Type of Change'].str.contains('New feature')].sample(frac=1)
+change_type = change_types(complex_prs['Type of Change'])
+complex_prs_integration = complex_prs[change_type == ChangeType.NEW_INTEGRATION].sample(frac=1)
+complex_prs_feature = complex_prs[change_type == ChangeType.NEW_FEATURE].sample(frac=1)
 
 complex_prs_integration.to_csv("data/pull_requests_complex_integrations.csv", index=False)
 complex_prs_feature.to_csv("data/pull_requests_complex_features.csv", index=False)
@@ -1,15 +1,26 @@
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import ast
+import os
+from typing import Iterator
+
+from comments_store import DATASET_PATH, iter_comment_batches
+from progress_ledger import ProgressLedger
+
+FORMATTED_PATH = 'data/pull_requests_filtered_formatted.csv'
+CHUNK_SIZE = 500  # PRs per chunk handed to a worker
+STAGE = "format"   # progress ledger stage name
 
 def createThreadStr(comments_sequence):
     formatted = "---BEGIN THREAD---\n"
     formatted += f"Diff Hunk:\n{comments_sequence['diff_hunk']}\n\n"
 
-    comments = comments_sequence['replies']
-    comments.insert(0, comments_sequence['comment'])
+    comments = [comments_sequence['comment'], *comments_sequence['replies']]
 
     formatted_comments = [
-        f"(from {'author' if comment['is_from_author'] else 'reviewer'}) [{comment['timestamp']}] {comment['body']}" 
+        f"(from {'author' if comment['is_from_author'] else 'reviewer'}) [{comment['timestamp']}] {comment['body']}"
         for comment in comments
     ]
     formatted += "\n".join(formatted_comments)
@@ -22,25 +33,72 @@ def createSingleStr(comments_sequence):
     return f"(from {'author' if comment['is_from_author'] else 'reviewer'}) [{comment['timestamp']}] {comment['body']}"
 
 def safe_literal_eval(val):
-    if pd.isna(val):  
-        return []     
+    if pd.isna(val):
+        return []
     try:
         return ast.literal_eval(val)
     except (ValueError, SyntaxError):
-        return [] 
+        return []
 
-if __name__ == "__main__":
-    df = pd.read_csv('data/pull_requests_filtered.csv')
-    df['temp'] = df['comments'].apply(safe_literal_eval)
+def format_pr_comments(pr_comments) -> str:
+    comments_array = [createThreadStr(comments_sequence) if comments_sequence['type'] == "review" else createSingleStr(comments_sequence) for comments_sequence in pr_comments]
+    return "\n\n".join(comments_array)
+
+# Runs in a worker process: format one chunk of PRs, parsing the repr strings (or NaN) of older CSVs first
+def format_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    comments = [safe_literal_eval(value) if isinstance(value, (str, float)) else value for value in df['comments']]
+    df['Formatted Comments'] = [format_pr_comments(pr_comments if pr_comments is not None else []) for pr_comments in comments]
+    return df.drop(['comments', 'Year'], axis=1, errors='ignore')
+
+# Read the comments a chunk at a time, from the Parquet dataset written by scrape_pr_comment_data, or from older CSVs holding repr strings
+def iter_comment_chunks(chunk_size: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    if os.path.isdir(DATASET_PATH):
+        for batch in iter_comment_batches(batch_size=chunk_size):    # the latest row of PRs the webhook receiver revised
+            if batch.num_rows:
+                yield batch.to_pandas()
+    else:
+        yield from pd.read_csv('data/pull_requests_filtered.csv', chunksize=chunk_size)
+
+
+def save_formatted(df: pd.DataFrame, ledger: ProgressLedger, output_path: str) -> None:
+    df.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
+    ledger.mark_done(STAGE, df['PR Number'])     # only marked once they're on disk
 
-    formatted_comments = []
+# Format every PR not yet in the output across a process pool, appending chunks in order as they finish.
+# At most two chunks per worker are in memory at once.
+def format_comments(workers: int = os.cpu_count(), chunk_size: int = CHUNK_SIZE, output_path: str = FORMATTED_PATH) -> int:
+    ledger = ProgressLedger()
+    done = ledger.done(STAGE)
+    if done and not os.path.exists(output_path):
+        done = set()    # the output was removed, so start it over
 
-    for pr_comments in df['temp']:
-        comments_array = [createThreadStr(comments_sequence) if comments_sequence['type'] == "review" else createSingleStr(comments_sequence) for comments_sequence in pr_comments]
-        formatted_comments.append("\n\n".join(comments_array))
-        
-    df['Formatted Comments'] = formatted_comments
-    df = df.drop('temp', axis=1)
-    df = df.drop('comments', axis=1)
+    formatted = 0
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in iter_comment_chunks(chunk_size):
+            chunk = chunk[~chunk['PR Number'].isin(done)]    # skip PRs we've already formatted
+            if chunk.empty:
+                continue
+
+            pending.append(executor.submit(format_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                result = pending.popleft().result()
+                save_formatted(result, ledger, output_path)
+                formatted += len(result)
+                print(f"{formatted} PRs formatted.")
+
+        while pending:
+            result = pending.popleft().result()
+            save_formatted(result, ledger, output_path)
+            formatted += len(result)
+
+    return formatted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="PRs per chunk")
+    args = parser.parse_args()
 
-    df.to_csv('data/pull_requests_filtered.csv', index=False)
+    formatted = format_comments(args.workers, args.chunk_size)
+    print(f"{formatted} PRs formatted, saved to {FORMATTED_PATH}")
@@ -0,0 +1,181 @@
+"""
+Small wrapper around the GitHub REST API shared by the scrapers.
+
+All requests go through the shared TokenPool, so rate limit headers from every response are
+recorded and a rate limited request is simply retried with whichever token has the most headroom.
+Responses are also kept in the on-disk ResponseCache and revalidated with If-None-Match, so reruns
+over the same closed PRs mostly get free 304s (set GITHUB_CACHE=0 to turn this off, or GITHUB_CACHE_SHARED=1
+to let tokens revalidate each other's entries). Every request's latency, size, cache result and retries
+are recorded in pipeline_metrics.
+
+The pool and the cache are only made on first use, from GITHUB_PATS and GITHUB_CACHE_PATH, so importing this
+module touches nothing on disk; tests and benchmarks can swap in their own with set_pool and set_cache.
+"""
+
+import asyncio
+import threading
+import time
+from os import environ
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+import httpx
+import requests
+
+from http_cache import CACHE_PATH, MAX_BYTES, CachedResponse, ResponseCache, token_scope
+from pipeline_metrics import metrics
+from token_pool import TokenPool
+
+load_dotenv()
+
+API_URL = environ.get("GITHUB_API_URL", "https://api.github.com")   # override to point at a local stub server
+HTML_URL = environ.get("GITHUB_HTML_URL", "https://github.com")     # PR pages, likewise
+REPO = "home-assistant/core"
+PER_PAGE = 100  # maximum page size allowed by the GitHub REST API
+
+_pool: Optional[TokenPool] = None
+_cache: Optional[ResponseCache] = None
+_cache_opened = False   # the cache can also be None because it's turned off
+_init_lock = threading.Lock()
+
+
+# The shared pool, made from GITHUB_PATS the first time a request needs a token
+def get_pool() -> TokenPool:
+    with _init_lock:
+        if _pool is None:
+            set_pool(TokenPool.from_env())
+        return _pool
+
+def set_pool(token_pool: TokenPool) -> None:
+    global _pool
+    _pool = token_pool
+    metrics.watch_pool("rest", token_pool)
+
+# The response cache, opened the first time a request looks something up; None when GITHUB_CACHE=0
+def get_cache() -> Optional[ResponseCache]:
+    with _init_lock:
+        if not _cache_opened:
+            set_cache(ResponseCache(
+                environ.get("GITHUB_CACHE_PATH", CACHE_PATH),
+                int(environ.get("GITHUB_CACHE_MAX_MB", MAX_BYTES // 1024 ** 2)) * 1024 ** 2,
+                share_across_tokens=environ.get("GITHUB_CACHE_SHARED", "0") == "1"
+            ) if environ.get("GITHUB_CACHE", "1") != "0" else None)
+        return _cache
+
+def set_cache(response_cache: Optional[ResponseCache]) -> None:
+    global _cache, _cache_opened
+    _cache, _cache_opened = response_cache, True
+
+
+def auth_headers(token: str) -> Dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+# Headers for a request, adding If-None-Match when there's a cached copy of url
+def request_headers(token: str, url: str) -> Tuple[Dict[str, str], Optional[CachedResponse]]:
+    headers = auth_headers(token)
+    cache = get_cache()
+    cached = cache.lookup(url, token_scope(token)) if cache else None
+    if cached:
+        headers["If-None-Match"] = cached.etag
+    return headers, cached
+
+def cache_response(token: str, url: str, response) -> None:
+    cache = get_cache()
+    if cache and response.status_code == 200 and response.headers.get("ETag"):
+        cache.store(url, token_scope(token), response.headers["ETag"], response.content, response.headers.get("Link"))
+
+# Turn a 304 into the cached 200 it stands for
+def from_cache(response: requests.Response, cached: CachedResponse) -> requests.Response:
+    response.status_code = 200
+    response._content = cached.body
+    if cached.link:
+        response.headers["Link"] = cached.link
+    return response
+
+# Record a response in the pipeline metrics; a 304 revalidating a cached copy counts as a cache hit
+def observe(url: str, response, started: float, cached: Optional[CachedResponse]) -> None:
+    cache_hit = (response.status_code == 304) if cached else (False if get_cache() else None)
+    metrics.observe_request(url, response.status_code, time.perf_counter() - started, len(response.content), cache_hit)
+    if is_rate_limited(response):
+        metrics.observe_retry(url, "rate_limited")
+
+def is_rate_limited(response) -> bool:
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and (response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers)
+
+# GET a url, retrying with another token whenever the response is rate limited
+def get(url: str, params: Optional[Dict] = None) -> requests.Response:
+    url = requests.Request("GET", url, params=params).prepare().url     # cache key includes the query string
+    pool = get_pool()
+    while True:
+        token = pool.acquire()
+        headers, cached = request_headers(token, url)
+        started = time.perf_counter()
+        response = requests.get(url, headers=headers)
+        observe(url, response, started, cached)
+        pool.update(token, response.headers)
+        if response.status_code == 304 and cached:
+            return from_cache(response, cached)
+        if not is_rate_limited(response):
+            cache_response(token, url, response)
+            return response
+        pool.mark_exhausted(token, response.headers)
+
+# Yield each page of a listing in turn, following the Link: next header
+def iter_pages(url: str, params: Optional[Dict] = None) -> Iterator[List[Dict]]:
+    params = {"per_page": PER_PAGE, **(params or {})}
+    while url:
+        response = get(url, params=params)
+        if response.status_code != 200:
+            raise RuntimeError(f"Failed to fetch {url}. Status code: {response.status_code}")
+
+        yield response.json()
+        url = response.links.get('next', {}).get('url')
+        params = None   # next url already carries the query string
+
+# Follow the Link: next header so listings with more than one page aren't cut off
+def get_all_pages(url: str, params: Optional[Dict] = None) -> Optional[List[Dict]]:
+    results = []
+    try:
+        for page in iter_pages(url, params):
+            results.extend(page)
+    except RuntimeError as e:
+        print(e)
+        return None
+    return results
+
+async def get_async(client: httpx.AsyncClient, url: str, params: Optional[Dict] = None) -> httpx.Response:
+    url = str(httpx.URL(url, params=params))
+    pool = get_pool()
+    while True:
+        token = await pool.acquire_async()
+        headers, cached = request_headers(token, url)
+        started = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        observe(url, response, started, cached)
+        pool.update(token, response.headers)
+        if response.status_code == 304 and cached:
+            headers = {"Content-Type": "application/json"}
+            if cached.link:
+                headers["Link"] = cached.link
+            return httpx.Response(200, headers=headers, content=cached.body, request=response.request)
+        if not is_rate_limited(response):
+            cache_response(token, url, response)
+            return response
+        pool.mark_exhausted(token, response.headers)
+
+async def get_all_pages_async(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str, params: Optional[Dict] = None) -> Optional[List[Dict]]:
+    results = []
+    params = {"per_page": PER_PAGE, **(params or {})}
+    while url:
+        async with semaphore:   # bound the number of requests in flight across all callers
+            response = await get_async(client, url, params=params)
+        if response.status_code != 200:
+            print(f"Failed to fetch {url}. Status code: {response.status_code}")
+            return None
+
+        results.extend(response.json())
+        url = response.links.get('next', {}).get('url')
+        params = None
+    return results
@@ -0,0 +1,481 @@
+"""
+Offline stand-in for GitHub, so the scraping stages can be run and timed without network access or tokens.
+
+Record: run a proxy in front of GitHub and point the stages at it; every API, GraphQL and PR page response
+passing through is saved to a cassette (JSON lines). Pages of a listing are merged into one entry, so they can
+be served again at any page size:
+
+    python github_replay.py record data/cassettes/sample.jsonl
+    GITHUB_API_URL=http://127.0.0.1:8800 GITHUB_HTML_URL=http://127.0.0.1:8800 python scrape_pr_file_data.py
+
+Replay: serve a cassette as a mock GitHub with configurable latency, page size, per-token rate limits (a 403
+with X-RateLimit-Remaining: 0 once a token's window is used up) and secondary rate limits (a 429 with
+Retry-After every so many requests). Responses carry ETags and honour If-None-Match, so the response cache
+works against it too:
+
+    python github_replay.py replay data/cassettes/sample.jsonl --latency 0.05 --rate-limit 500 --window 10
+
+GraphQL queries the cassette has no recording of are answered from its PR objects, for the queries
+graphql_backend makes: aliased pullRequest batches with their first page of labels, and a PR's further label
+pages. Over a token's rate limit they get GitHub's RATE_LIMITED error, and batches of more than
+--max-graphql-batch PRs get MAX_NODE_LIMIT_EXCEEDED, so the backend can be tested without GitHub too.
+
+`python github_replay.py synthesize data/cassettes/synthetic.jsonl --prs 500` writes a cassette of made-up
+PRs instead, with their listing, details, files, comments and pages; benchmarks/bench_pipeline.py replays it
+through every stage.
+
+Urls of GitHub in recorded bodies and headers are stored as {base} and served as the replay server's own
+address, so PyGithub's follow-up requests and the PR page urls come back to it.
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from github_api import REPO
+
+UPSTREAM_API = "https://api.github.com"
+UPSTREAM_HTML = "https://github.com"
+API_PREFIXES = ("/repos/", "/search/", "/graphql", "/rate_limit", "/user")   # paths served by the API, everything else is a page
+PAGE_PARAMS = ("page", "per_page")
+BASE = "{base}"
+PORT = 8800
+DEFAULT_LIMIT = 5000
+GRAPHQL_ALIAS = re.compile(r"(\w+): pullRequest\(number: (\d+)\)")
+GRAPHQL_LABELS = re.compile(r"labels\(first: (\d+)")
+
+
+# Cassette key of a request: pages of the same listing share one
+def request_key(method: str, path: str, query: str, body: bytes = b"") -> str:
+    params = sorted((key, value) for key, value in parse_qsl(query) if key not in PAGE_PARAMS)
+    key = f"{method} {path}?{urlencode(params)}"
+    if method == "POST":
+        key += " " + hashlib.sha256(body).hexdigest()[:16]     # GraphQL queries all go to the same path
+    return key
+
+def to_placeholder(text: str) -> str:
+    return text.replace(UPSTREAM_API, BASE).replace(UPSTREAM_HTML, BASE)
+
+def page_params(query: str) -> Tuple[int, Optional[int]]:
+    params = dict(parse_qsl(query))
+    return int(params.get("page", 1)), int(params["per_page"]) if "per_page" in params else None
+
+
+class Cassette:
+    def __init__(self, entries: Optional[Dict[str, Dict]] = None):
+        self.entries = entries or {}
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with open(path, encoding="utf-8") as f:
+            return cls({entry["key"]: entry for entry in map(json.loads, f)})
+
+    def save(self, path: str) -> None:
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry) + "\n")
+        os.replace(f"{path}.tmp", path)
+
+    def add(self, key: str, status: int, body: str, content_type: str = "application/json", listing: bool = False) -> None:
+        self.entries[key] = {"key": key, "status": status, "body": body, "headers": {"Content-Type": content_type}, "listing": listing}
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        return self.entries.get(key)
+
+    def pull_request(self, number: int) -> Optional[Dict]:
+        entry = self.lookup(request_key("GET", f"/repos/{REPO}/pulls/{number}", ""))
+        return json.loads(entry["body"]) if entry and entry["status"] == 200 else None
+
+    # The recorded PR objects (GET /repos/{REPO}/pulls/{number}), to build a stage's input from
+    def pull_requests(self) -> List[Dict]:
+        pattern = re.compile(rf"^GET /repos/{re.escape(REPO)}/pulls/\d+\?$")
+        return [json.loads(entry["body"]) for key, entry in self.entries.items() if pattern.match(key) and entry["status"] == 200]
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, cassette: Cassette, host: str = "127.0.0.1", port: int = PORT, latency: float = 0.0, jitter: float = 0.0,
+                 max_per_page: int = 100, rate_limit: Optional[int] = None, window: float = 3600, throttle_every: int = 0, retry_after: int = 1,
+                 max_graphql_batch: Optional[int] = None):
+        super().__init__((host, port), ReplayHandler)
+        self.cassette = cassette
+        self.latency = latency
+        self.jitter = jitter
+        self.max_per_page = max_per_page
+        self.rate_limit = rate_limit
+        self.window = window
+        self.throttle_every = throttle_every
+        self.retry_after = retry_after
+        self.max_graphql_batch = max_graphql_batch
+        self.lock = threading.Lock()
+        self.windows: Dict[str, Tuple[float, int]] = {}     # token: (window start, requests in it)
+        self.reset_counters()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_counters(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.statuses: Dict[int, int] = {}
+            self.bytes = 0
+
+    def count(self, status: int, size: int) -> None:
+        with self.lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes += size
+
+    # Rate limit headers for a token's request, and the status to refuse it with (403 over its limit, 429 throttled), if any
+    def take(self, token: str) -> Tuple[Dict[str, str], Optional[int]]:
+        limit = self.rate_limit or DEFAULT_LIMIT
+        with self.lock:
+            self.requests += 1
+            now = time.time()
+            start, used = self.windows.get(token, (now, 0))
+            if now >= start + self.window:
+                start, used = now, 0
+            over = self.rate_limit is not None and used >= limit
+            used = min(used + 1, limit)
+            self.windows[token] = (start, used)
+            throttled = self.throttle_every and self.requests % self.throttle_every == 0
+        headers = {"X-RateLimit-Limit": str(limit), "X-RateLimit-Remaining": str(limit - used), "X-RateLimit-Reset": str(int(start + self.window) + 1)}
+        return headers, 403 if over else 429 if throttled else None
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server: ReplayServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.replay("GET")
+
+    def do_POST(self):
+        self.replay("POST")
+
+    def replay(self, method: str) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        server = self.server
+        if server.latency or server.jitter:
+            time.sleep(max(server.latency + random.uniform(-server.jitter, server.jitter), 0))
+
+        token = self.headers.get("Authorization", "anonymous")
+        headers, refused = server.take(token)
+        url = urlsplit(self.path)
+        if refused == 429:
+            return self.respond(429, b'{"message": "You have exceeded a secondary rate limit."}', {"Retry-After": str(server.retry_after)})
+        if refused == 403 and url.path == "/graphql":  # GraphQL reports its rate limit as an error of a 200
+            errors = [{"type": "RATE_LIMITED", "message": "API rate limit exceeded."}]
+            return self.respond(200, json.dumps({"errors": errors}).encode(), {**headers, "X-RateLimit-Remaining": "0"})
+        if refused == 403:
+            return self.respond(403, b'{"message": "API rate limit exceeded."}', {**headers, "X-RateLimit-Remaining": "0"})
+
+        if url.path == "/rate_limit":
+            core = {"limit": int(headers["X-RateLimit-Limit"]), "remaining": int(headers["X-RateLimit-Remaining"]), "reset": int(headers["X-RateLimit-Reset"])}
+            return self.respond(200, json.dumps({"resources": {"core": core, "search": core}, "rate": core}).encode(), headers)
+
+        entry = server.cassette.lookup(request_key(method, url.path, url.query, body))
+        if entry is None and url.path == "/graphql" and method == "POST":
+            return self.respond(200, json.dumps(self.graphql(json.loads(body), headers)).encode(), headers)
+        if entry is None:
+            return self.respond(404, b'{"message": "Not Found"}', headers)
+
+        content = entry["body"].replace(BASE, server.base_url)
+        if entry["listing"]:
+            content, link = self.paginate(json.loads(content), url.path, url.query)
+            if link:
+                headers["Link"] = link
+
+        data = content.encode()
+        etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.respond(304, b"", {**headers, "ETag": etag})
+        self.respond(entry["status"], data, {**headers, **entry["headers"], "ETag": etag})
+
+    # A GraphQL response built from the cassette's PR objects: an aliased pullRequest per PR of a batch, or one
+    # PR's labels after a cursor (cursors are label offsets). rateLimit's cost is roughly GitHub's, a point per
+    # ten PRs
+    def graphql(self, request: Dict, headers: Dict[str, str]) -> Dict:
+        query, variables = request["query"], request.get("variables") or {}
+        labels = GRAPHQL_LABELS.search(query)
+        labels_first = int(labels.group(1)) if labels else 100
+        aliases = GRAPHQL_ALIAS.findall(query)
+        limit = self.server.max_graphql_batch
+        if limit is not None and len(aliases) > limit:
+            return {"errors": [{"type": "MAX_NODE_LIMIT_EXCEEDED", "message": f"This query requests {len(aliases)} pull requests, the limit is {limit}."}]}
+
+        if aliases:
+            repository, errors = {}, []
+            for alias, number in aliases:
+                pr = self.server.cassette.pull_request(int(number))
+                repository[alias] = graphql_pull_request(pr, self.server.base_url, labels_first) if pr else None
+                if pr is None:
+                    errors.append({"type": "NOT_FOUND", "path": ["repository", alias], "message": f"Could not resolve to a PullRequest with the number of {number}."})
+        else:
+            pr = self.server.cassette.pull_request(int(variables["number"]))
+            repository = {"pullRequest": {"labels": label_page(pr, labels_first, variables.get("after"))} if pr else None}
+            errors = []
+
+        reset = datetime.fromtimestamp(int(headers["X-RateLimit-Reset"]), timezone.utc)
+        rate_limit = {"cost": max(len(aliases) // 10, 1), "remaining": int(headers["X-RateLimit-Remaining"]),
+                      "resetAt": iso(reset), "limit": int(headers["X-RateLimit-Limit"])}
+        response = {"data": {"rateLimit": rate_limit, "repository": repository}}
+        if errors:
+            response["errors"] = errors
+        return response
+
+    # One page of a merged listing, with the Link header GitHub would give it
+    def paginate(self, items: List, path: str, query: str) -> Tuple[str, Optional[str]]:
+        page, per_page = page_params(query)
+        per_page = min(per_page or 30, self.server.max_per_page)
+        last = max((len(items) + per_page - 1) // per_page, 1)
+        params = [(key, value) for key, value in parse_qsl(query) if key not in PAGE_PARAMS]
+
+        def page_url(number: int) -> str:
+            return f"{self.server.base_url}{path}?{urlencode(params + [('per_page', per_page), ('page', number)])}"
+
+        links = []
+        if page < last:
+            links += [f'<{page_url(page + 1)}>; rel="next"', f'<{page_url(last)}>; rel="last"']
+        if page > 1:
+            links += [f'<{page_url(1)}>; rel="first"', f'<{page_url(page - 1)}>; rel="prev"']
+        return json.dumps(items[(page - 1) * per_page:page * per_page]), ", ".join(links) or None
+
+    def respond(self, status: int, data: bytes, headers: Dict[str, str]) -> None:
+        self.server.count(status, len(data))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if "Content-Type" not in headers:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RecordingProxy(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, host: str = "127.0.0.1", port: int = PORT):
+        super().__init__((host, port), RecordingHandler)
+        self.path = path
+        self.cassette = Cassette()
+        self.pages: Dict[str, Dict[int, List]] = {}     # listing key: {page number: items}
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, key: str, query: str, response: requests.Response) -> None:
+        content_type = response.headers.get("Content-Type", "application/json")
+        body = to_placeholder(response.text)
+        with self.lock:
+            if content_type.startswith("application/json") and body.startswith("[") and not key.startswith("POST"):
+                self.pages.setdefault(key, {})[page_params(query)[0]] = json.loads(body)
+            else:
+                self.cassette.add(key, response.status_code, body, content_type)
+
+    # Merge the recorded pages of each listing and write the cassette
+    def save(self) -> int:
+        with self.lock:
+            for key, pages in self.pages.items():
+                items = [item for page in sorted(pages) for item in pages[page]]
+                self.cassette.add(key, 200, json.dumps(items), listing=True)
+            self.cassette.save(self.path)
+            return len(self.cassette.entries)
+
+
+class RecordingHandler(BaseHTTPRequestHandler):
+    server: RecordingProxy
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.forward("GET")
+
+    def do_POST(self):
+        self.forward("POST")
+
+    def forward(self, method: str) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        url = urlsplit(self.path)
+        upstream = UPSTREAM_API if url.path.startswith(API_PREFIXES) else UPSTREAM_HTML
+        headers = {name: value for name, value in self.headers.items() if name in ("Authorization", "Accept", "Content-Type")}  # no If-None-Match, always record a full body
+        response = self.server.session.request(method, f"{upstream}{self.path}", headers=headers, data=body or None)
+
+        if response.status_code in (200, 404):     # rate limited and failed responses are passed on, not recorded
+            self.server.record(request_key(method, url.path, url.query, body), url.query, response)
+
+        data = to_placeholder(response.text).replace(BASE, self.server.base_url).encode()
+        self.send_response(response.status_code)
+        for name, value in response.headers.items():
+            if name.startswith("X-RateLimit") or name in ("Content-Type", "Retry-After", "ETag"):
+                self.send_header(name, value)
+        if "Link" in response.headers:
+            self.send_header("Link", to_placeholder(response.headers["Link"]).replace(BASE, self.server.base_url))
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def iso(timestamp: datetime) -> str:
+    return timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+# A page of first labels of a PR from the cursor after (an offset), as a GraphQL connection
+def label_page(pr: Dict, first: int, after: Optional[str] = None) -> Dict:
+    start = int(after or 0)
+    labels = pr.get("labels") or []
+    end = min(start + first, len(labels))
+    return {"nodes": [{"name": label["name"]} for label in labels[start:end]],
+            "pageInfo": {"hasNextPage": end < len(labels), "endCursor": str(end)}}
+
+# A REST PR object as the pr fragment of graphql_backend's queries. GraphQL gives a bot's login without the [bot]
+# suffix, and a deleted account as a null author
+def graphql_pull_request(pr: Dict, base_url: str, labels_first: int) -> Dict:
+    user = pr.get("user")
+    author = {"__typename": "Bot" if user["type"] == "Bot" else "User", "login": user["login"].removesuffix("[bot]")} if user else None
+    merged_at = pr.get("merged_at") or (pr["closed_at"] if pr.get("merged") else None)
+    return {
+        "number": pr["number"], "title": pr["title"], "url": pr["html_url"].replace(BASE, base_url),
+        "createdAt": pr["created_at"], "updatedAt": pr["updated_at"], "closedAt": pr.get("closed_at"), "mergedAt": merged_at,
+        "additions": pr.get("additions", 0), "deletions": pr.get("deletions", 0), "changedFiles": pr.get("changed_files"),
+        "body": pr.get("body"), "author": author, "labels": label_page(pr, labels_first),
+    }
+
+CHANGE_TYPES = ["Bugfix (non-breaking change which fixes an issue)", "New integration (thank you!)",
+                "New feature (which adds functionality to an existing integration)", "Code quality improvements to existing code or addition of tests"]
+INTEGRATIONS = ["hue", "zha", "mqtt", "shelly", "esphome", "tado", "sonos", "matter"]
+
+def synthetic_pr(number: int, rng: random.Random, created_at: datetime) -> Tuple[Dict, str]:
+    checked = rng.randrange(len(CHANGE_TYPES))
+    body = "## Type of change\n" + "\n".join(f"- [{'x' if i == checked else ' '}] {change}" for i, change in enumerate(CHANGE_TYPES))
+    closed_at = created_at + timedelta(hours=rng.randint(1, 24 * 60))
+    pr = {
+        "number": number, "title": f"Synthetic PR {number}", "state": "closed", "body": body,
+        "url": f"{BASE}/repos/{REPO}/pulls/{number}", "html_url": f"{BASE}/{REPO}/pull/{number}",
+        "user": {"login": f"user{rng.randrange(200)}", "type": "User"},
+        "labels": [{"name": f"integration: {rng.choice(INTEGRATIONS)}"}, {"name": "cla-signed"}],
+        "created_at": iso(created_at), "updated_at": iso(closed_at), "closed_at": iso(closed_at),
+    }
+    page = ('<html><body><ul class="contains-task-list">'
+            + "".join(f'<li class="task-list-item"><input type="checkbox"{" checked" if i == checked else ""} disabled> {change}</li>' for i, change in enumerate(CHANGE_TYPES))
+            + "</ul></body></html>")
+    return pr, page
+
+def synthetic_comments(number: int, rng: random.Random, created_at: datetime, author: str, count: int, review: bool) -> List[Dict]:
+    comments = []
+    for i in range(count):
+        comment = {
+            "id": number * 1000 + i + (500 if review else 0), "body": f"comment {i} on {number}",
+            "created_at": iso(created_at + timedelta(minutes=10 * (i + 1))),
+            "user": {"login": author if rng.random() < 0.3 else f"reviewer{rng.randrange(20)}", "type": "Bot" if rng.random() < 0.05 else "User"},
+        }
+        if review:
+            comment["diff_hunk"] = "@@ -1,3 +1,4 @@\n+line"
+            if i and rng.random() < 0.6:
+                comment["in_reply_to_id"] = comments[rng.randrange(i)]["id"]
+        comments.append(comment)
+    return comments
+
+# A cassette of made-up PRs closed within scrape_all_prs' collection window, with one older PR that ends its crawl
+def synthetic_cassette(prs: int, seed: int = 0, comments: int = 12, files: int = 4) -> Cassette:
+    rng = random.Random(seed)
+    cassette = Cassette()
+    repo = {"id": 1, "name": REPO.split("/")[1], "full_name": REPO, "url": f"{BASE}/repos/{REPO}", "owner": {"login": REPO.split("/")[0]}}
+    cassette.add(request_key("GET", f"/repos/{REPO}", ""), 200, json.dumps(repo))
+
+    listing = []
+    for i in range(prs + 1):
+        number = 100000 - i
+        created_at = datetime(2024, 6, 1, tzinfo=timezone.utc) - timedelta(hours=4 * i) if i < prs else datetime(2020, 12, 1, tzinfo=timezone.utc)
+        pr, page = synthetic_pr(number, rng, created_at)
+        listing.append(pr)
+        details = {**pr, "merged": rng.random() < 0.7, "changed_files": files, "additions": 0, "deletions": 0}
+        cassette.add(request_key("GET", f"/repos/{REPO}/pulls/{number}", ""), 200, json.dumps(details))
+        cassette.add(request_key("GET", f"/{REPO}/pull/{number}", ""), 200, page, "text/html; charset=utf-8")
+
+        changes = [{"filename": f"homeassistant/components/file{j}.py", "changes": rng.randint(1, 200)} for j in range(files)]
+        cassette.add(request_key("GET", f"/repos/{REPO}/pulls/{number}/files", ""), 200, json.dumps(changes), listing=True)
+        author = pr["user"]["login"]
+        issue_comments = synthetic_comments(number, rng, created_at, author, rng.randint(0, comments), review=False)
+        review_comments = synthetic_comments(number, rng, created_at, author, rng.randint(0, 2 * comments), review=True)
+        cassette.add(request_key("GET", f"/repos/{REPO}/issues/{number}/comments", ""), 200, json.dumps(issue_comments), listing=True)
+        cassette.add(request_key("GET", f"/repos/{REPO}/pulls/{number}/comments", ""), 200, json.dumps(review_comments), listing=True)
+
+    listing_key = request_key("GET", f"/repos/{REPO}/pulls", urlencode({"direction": "desc", "sort": "created", "state": "closed"}))
+    cassette.add(listing_key, 200, json.dumps(listing), listing=True)
+    return cassette
+
+
+def serve(server) -> None:
+    print(f"Serving on {server.base_url}, stop with Ctrl-C.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="proxy to GitHub, saving every response to a cassette")
+    record.add_argument("cassette")
+    record.add_argument("--port", type=int, default=PORT)
+
+    replay = commands.add_parser("replay", help="serve a cassette as a mock GitHub")
+    replay.add_argument("cassette")
+    replay.add_argument("--port", type=int, default=PORT)
+    replay.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    replay.add_argument("--jitter", type=float, default=0.0, help="latency varies by up to this many seconds either way")
+    replay.add_argument("--max-per-page", type=int, default=100, help="largest page size served for listings")
+    replay.add_argument("--rate-limit", type=int, help="requests per token per window before a 403")
+    replay.add_argument("--window", type=float, default=3600, help="seconds in a rate limit window")
+    replay.add_argument("--throttle-every", type=int, default=0, help="answer every Nth request with a 429 and Retry-After")
+    replay.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds of a 429")
+    replay.add_argument("--max-graphql-batch", type=int, help="GraphQL queries for more PRs than this fail as too expensive")
+
+    synthesize = commands.add_parser("synthesize", help="write a cassette of made-up PRs")
+    synthesize.add_argument("cassette")
+    synthesize.add_argument("--prs", type=int, default=500)
+    synthesize.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        proxy = RecordingProxy(args.cassette, port=args.port)
+        serve(proxy)
+        print(f"{proxy.save()} responses saved to {args.cassette}")
+    elif args.command == "replay":
+        serve(ReplayServer(Cassette.load(args.cassette), port=args.port, latency=args.latency, jitter=args.jitter, max_per_page=args.max_per_page,
+                           rate_limit=args.rate_limit, window=args.window, throttle_every=args.throttle_every, retry_after=args.retry_after,
+                           max_graphql_batch=args.max_graphql_batch))
+    else:
+        cassette = synthetic_cassette(args.prs, args.seed)
+        cassette.save(args.cassette)
+        print(f"{len(cassette.entries)} responses for {args.prs} PRs saved to {args.cassette}")
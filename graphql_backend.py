@@ -0,0 +1,255 @@
+"""
+Hydrates PRs through the GitHub GraphQL API, BATCH_SIZE PRs per query, instead of the separate REST calls (and
+HTML page) per PR of the enrichment stages: update_filtered_prs fetches each PR again for its author and
+integration label, scrape_pr_file_data lists its files to sum their changes, and scrape_pr_checkbox_data
+downloads its page.
+
+Each query asks for the author, labels, additions and deletions, changedFiles, body and timestamps of a batch
+of PRs under aliases (pr1234: pullRequest(number: 1234)), and turns them into the same columns the REST
+scrapers produce: LOC Changed is additions + deletions (the sum of the files' changes), Type of Change is read
+from the body, and the metadata columns match scrape_all_prs. Labels beyond the first page are followed by
+cursor.
+
+GraphQL has its own rate limit, counted in points per query rather than requests, so it gets its own
+TokenPool: each query asks for rateLimit { cost remaining resetAt }, which is fed back into the pool, and the
+pool only hands out a token with room for the last query's cost. A batch GitHub rejects as too expensive (or
+times out on) is halved and retried.
+
+GITHUB_GRAPHQL_URL points it at another endpoint, e.g. a local stand-in. Run as a script to fill the loc,
+authors and checkbox sidecars for every PR not done yet:
+
+    python graphql_backend.py [--stages loc authors checkbox] [--batch-size 50] [--retry-failed]
+"""
+
+import argparse
+from datetime import datetime
+from os import environ
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import requests
+
+from github_api import REPO, auth_headers, is_rate_limited
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from sidecars import append_sidecar
+from token_pool import TokenPool
+from type_of_change import extract_type_of_change
+
+GRAPHQL_URL = environ.get("GITHUB_GRAPHQL_URL", "https://api.github.com/graphql")
+OWNER, NAME = REPO.split("/")
+BATCH_SIZE = 50     # PRs per query
+MAX_BATCH_SIZE = 100
+LABELS_PER_PAGE = 20
+TIMEOUT = 60
+RETRY_STATUSES = (502, 504)     # GitHub gives up on queries it can't finish in time
+TOO_EXPENSIVE = ("MAX_NODE_LIMIT_EXCEEDED", "RESOURCE_LIMITS_EXCEEDED")
+
+COLUMNS = ["PR Number", "Title", "Author", "Integration", "Created At", "Updated At", "State",
+           "Files Changed", "Decision Time", "Closed Date", "URL", "Type of Change", "LOC Changed"]
+STAGE_COLUMNS = {   # the columns each enrichment stage's sidecar holds
+    "loc": ["PR Number", "LOC Changed"],
+    "authors": ["PR Number", "Integration", "Author"],
+    "checkbox": ["PR Number", "Type of Change"],
+}
+
+RATE_LIMIT = "rateLimit { cost remaining resetAt limit }"
+PR_FRAGMENT = f"""
+fragment pr on PullRequest {{
+  number title url createdAt updatedAt closedAt mergedAt
+  additions deletions changedFiles body
+  author {{ __typename login }}
+  labels(first: {LABELS_PER_PAGE}) {{ nodes {{ name }} pageInfo {{ hasNextPage endCursor }} }}
+}}"""
+LABELS_QUERY = f"""
+query($owner: String!, $name: String!, $number: Int!, $after: String!) {{
+  {RATE_LIMIT}
+  repository(owner: $owner, name: $name) {{
+    pullRequest(number: $number) {{ labels(first: 100, after: $after) {{ nodes {{ name }} pageInfo {{ hasNextPage endCursor }} }} }}
+  }}
+}}"""
+
+_pool: Optional[TokenPool] = None
+
+
+# Separate from github_api's, the GraphQL point budget is separate from the REST one; made on first use
+def get_pool() -> TokenPool:
+    global _pool
+    if _pool is None:
+        _pool = TokenPool.from_env()
+        metrics.watch_pool("graphql", _pool)
+    return _pool
+
+
+class QueryTooExpensive(Exception):
+    pass
+
+
+def batch_query(pr_numbers: Sequence[int]) -> str:
+    aliases = "\n    ".join(f"pr{pr_number}: pullRequest(number: {pr_number}) {{ ...pr }}" for pr_number in pr_numbers)
+    return f"""
+query($owner: String!, $name: String!) {{
+  {RATE_LIMIT}
+  repository(owner: $owner, name: $name) {{
+    {aliases}
+  }}
+}}{PR_FRAGMENT}"""
+
+def parse_time(timestamp: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")) if timestamp else None
+
+
+class GraphQLClient:
+    def __init__(self, url: str = GRAPHQL_URL, token_pool: Optional[TokenPool] = None):
+        self.url = url
+        self.pool = token_pool if token_pool is not None else get_pool()
+        self.session = requests.Session()
+        self.last_cost = 1
+
+    # POST a query, retrying with another token whenever it's rate limited; returns its data and any errors
+    def query(self, query: str, variables: Dict) -> Tuple[Dict, List[Dict]]:
+        while True:
+            token = self.pool.acquire(self.last_cost)
+            started = time.perf_counter()
+            try:
+                response = self.session.post(self.url, json={"query": query, "variables": variables}, headers=auth_headers(token), timeout=TIMEOUT)
+            except requests.Timeout as e:
+                metrics.observe_retry(self.url, "too_expensive")
+                raise QueryTooExpensive(f"timed out after {TIMEOUT}s") from e
+            metrics.observe_request(self.url, response.status_code, time.perf_counter() - started, len(response.content))
+            self.pool.update(token, response.headers)
+
+            if is_rate_limited(response):
+                metrics.observe_retry(self.url, "rate_limited")
+                self.pool.mark_exhausted(token, response.headers)
+                continue
+            if response.status_code in RETRY_STATUSES:
+                metrics.observe_retry(self.url, "too_expensive")
+                raise QueryTooExpensive(f"status code {response.status_code}")
+            if response.status_code != 200:
+                raise RuntimeError(f"GraphQL query failed. Status code: {response.status_code}")
+
+            payload = response.json()
+            errors = payload.get("errors") or []
+            if any(error.get("type") == "RATE_LIMITED" for error in errors):
+                metrics.observe_retry(self.url, "rate_limited")
+                self.pool.mark_exhausted(token, response.headers)
+                continue
+            if any(error.get("type") in TOO_EXPENSIVE for error in errors):
+                metrics.observe_retry(self.url, "too_expensive")
+                raise QueryTooExpensive("; ".join(error.get("message", "") for error in errors))
+
+            data = payload.get("data") or {}
+            rate_limit = data.get("rateLimit")
+            if rate_limit:
+                self.last_cost = max(int(rate_limit["cost"]), 1)
+                self.pool.update_counts(token, int(rate_limit["remaining"]), parse_time(rate_limit["resetAt"]).timestamp(), rate_limit.get("limit"))
+            return data, errors
+
+    # Names of all of a PR's labels, following the labels connection by cursor past the first page
+    def labels(self, pr: Dict) -> List[str]:
+        names = [label["name"] for label in pr["labels"]["nodes"]]
+        page_info = pr["labels"]["pageInfo"]
+        while page_info["hasNextPage"]:
+            data, _ = self.query(LABELS_QUERY, {"owner": OWNER, "name": NAME, "number": pr["number"], "after": page_info["endCursor"]})
+            labels = data["repository"]["pullRequest"]["labels"]
+            names += [label["name"] for label in labels["nodes"]]
+            page_info = labels["pageInfo"]
+        return names
+
+    # One row of COLUMNS for a PR, as the REST scrapers would have written it
+    def pr_row(self, pr: Dict) -> Dict:
+        created_at, closed_at = parse_time(pr["createdAt"]), parse_time(pr["closedAt"])
+        author = pr["author"]
+        if author is None:
+            login = "ghost"     # deleted accounts, as the REST API reports them
+        else:
+            login = f"{author['login']}[bot]" if author["__typename"] == "Bot" else author["login"]
+
+        return {
+            "PR Number": pr["number"],
+            "Title": pr["title"],
+            "Author": login,
+            "Integration": next((name.split(": ")[-1] for name in self.labels(pr) if "integration:" in name), ""),
+            "Created At": created_at,
+            "Updated At": parse_time(pr["updatedAt"]),
+            "State": "merged" if pr["mergedAt"] else "closed" if closed_at else "open",
+            "Files Changed": pr["changedFiles"],
+            "Decision Time": (closed_at - created_at).days if closed_at else None,
+            "Closed Date": closed_at,
+            "URL": pr["url"],
+            "Type of Change": extract_type_of_change(pr["body"]),
+            "LOC Changed": pr["additions"] + pr["deletions"],
+        }
+
+    # Rows for PRs batch_size at a time, with the PRs of each batch that couldn't be fetched as {PR number: error};
+    # batches that are too expensive for GitHub are halved until they go through
+    def hydrate(self, pr_numbers: Sequence[int], batch_size: int = BATCH_SIZE) -> Iterator[Tuple[pd.DataFrame, Dict[int, str]]]:
+        pending = list(pr_numbers)
+        batch_size = min(batch_size, MAX_BATCH_SIZE)
+        while pending:
+            batch = pending[:batch_size]
+            try:
+                data, errors = self.query(batch_query(batch), {"owner": OWNER, "name": NAME})
+            except QueryTooExpensive as e:
+                if batch_size > 1:
+                    batch_size //= 2
+                    print(f"Query too expensive ({e}), retrying with {batch_size} PRs per query.")
+                    continue
+                data, errors = {"repository": {}}, [{"path": ["repository", f"pr{batch[0]}"], "message": str(e)}]
+
+            messages = {error["path"][-1]: error.get("message", "") for error in errors if error.get("path")}
+            repository = data.get("repository") or {}
+            rows, failures = [], {}
+            for pr_number in batch:
+                pr = repository.get(f"pr{pr_number}")
+                if pr is None:
+                    failures[pr_number] = messages.get(f"pr{pr_number}", "not returned")
+                    continue
+                try:
+                    rows.append(self.pr_row(pr))
+                except Exception as e:
+                    failures[pr_number] = str(e)
+
+            yield pd.DataFrame(rows, columns=COLUMNS), failures
+            pending = pending[len(batch):]
+
+
+# Fill the given stages' sidecars for every PR in df not done in all of them yet (or failed in any, when retrying)
+def hydrate_stages(df: pd.DataFrame, stages: Sequence[str] = tuple(STAGE_COLUMNS), batch_size: int = BATCH_SIZE, retry_failed: bool = False,
+                   client: Optional[GraphQLClient] = None) -> int:
+    client = client or GraphQLClient()
+    ledger = ProgressLedger()
+    if retry_failed:
+        wanted = set().union(*(ledger.failed(stage) for stage in stages))
+    else:
+        done = set.intersection(*(set(ledger.done(stage)) for stage in stages))
+        wanted = set(df['PR Number']) - done
+    pr_numbers = [pr_number for pr_number in df['PR Number'] if pr_number in wanted]
+    print(f"{len(pr_numbers)} PRs to hydrate, {batch_size} per query.")
+    for stage in stages:
+        metrics.start_stage(stage, len(pr_numbers))
+
+    hydrated = 0
+    for rows, failures in client.hydrate(pr_numbers, batch_size):
+        for stage in stages:
+            append_sidecar(stage, rows[STAGE_COLUMNS[stage]], ledger)    # only marked done once they're on disk
+            for pr_number, error in failures.items():
+                ledger.mark_failed(stage, pr_number, error)
+        hydrated += len(rows)
+        print(f"{metrics.progress(stages[0])}, {sum(client.pool.headroom().values())} points left.")
+    return hydrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stages', nargs='+', choices=list(STAGE_COLUMNS), default=list(STAGE_COLUMNS), help="sidecars to fill")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f"PRs per query (at most {MAX_BATCH_SIZE})")
+    parser.add_argument('--retry-failed', action='store_true', help="only re-fetch PRs recorded as failed in the progress ledger")
+    parser.add_argument('--input', default='data/pull_requests_filtered.csv', help="CSV of the PRs to hydrate")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input, usecols=['PR Number'])
+    hydrated = hydrate_stages(df, args.stages, args.batch_size, args.retry_failed)
+    print(f"{hydrated} PRs hydrated, run `python sidecars.py` to join them into data/pull_requests_filtered.csv")
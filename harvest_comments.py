@@ -0,0 +1,71 @@
+"""
+Bulk alternative to scrape_pr_comment_data: rather than two requests per PR, page once through the
+repository-wide comment listings
+
+    /repos/home-assistant/core/issues/comments
+    /repos/home-assistant/core/pulls/comments
+
+from the start of the collection window, bucketing each comment by the PR it belongs to (from its
+issue_url / pull_request_url). Only PRs in pull_requests_filtered.csv are kept, and their threads are
+ordered exactly as scrape_pr_comment_data does. Requests scale with total comments / 100 rather than
+with the number of PRs.
+"""
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Set
+
+import pandas as pd
+
+from comment_threads import order_comments
+from comments_store import DATASET_PATH, write_comments_dataset
+from github_api import API_URL, REPO, iter_pages
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from scrape_pr_comment_data import STAGE, count_comments, without_bots
+from sidecars import append_sidecar
+
+SINCE = "2021-01-01T00:00:00Z"  # start of the collection window in scrape_all_prs
+KEPT_FIELDS = ['id', 'created_at', 'body', 'user', 'in_reply_to_id', 'diff_hunk']  # all the thread builder needs
+
+
+def pr_number_from_url(url: str) -> int:
+    return int(url.rstrip('/').rsplit('/', 1)[1])
+
+# Stream one listing, keeping the comments of wanted PRs grouped by PR number
+def harvest(url: str, url_key: str, wanted: Set[int]) -> Dict[int, List[Dict]]:
+    buckets = defaultdict(list)
+    pages = 0
+    for page in iter_pages(url, {"since": SINCE, "sort": "created", "direction": "asc"}):
+        for comment in page:
+            pr_number = pr_number_from_url(comment[url_key])
+            if pr_number in wanted:
+                buckets[pr_number].append({key: comment[key] for key in KEPT_FIELDS if key in comment})
+
+        pages += 1
+        if pages % 100 == 0:
+            print(f"{url}: {pages} pages harvested, {metrics.requests_per_second():.1f} requests/s.")
+    return buckets
+
+def harvest_comments(df: pd.DataFrame) -> None:
+    wanted = set(df['PR Number'])
+    metrics.start_stage(STAGE, len(wanted))
+
+    # the two listings are independent, so stream them side by side
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        issue_future = executor.submit(harvest, f"{API_URL}/repos/{REPO}/issues/comments", 'issue_url', wanted)
+        review_future = executor.submit(harvest, f"{API_URL}/repos/{REPO}/pulls/comments", 'pull_request_url', wanted)
+        issue_buckets, review_buckets = issue_future.result(), review_future.result()
+
+    df['Comments'] = [
+        order_comments(without_bots(issue_buckets.get(pr_number, []), author), without_bots(review_buckets.get(pr_number, []), author))
+        for pr_number, author in zip(df['PR Number'], df['Author'])
+    ]
+
+if __name__ == "__main__":
+    df = pd.read_csv('data/pull_requests_filtered.csv')
+    harvest_comments(df)
+    write_comments_dataset(df)
+    counts = pd.DataFrame({'PR Number': df['PR Number'], 'Total Comments': df['Comments'].map(count_comments)})
+    append_sidecar(STAGE, counts, ProgressLedger())
+    print(f"Comments saved to {DATASET_PATH}/")
@@ -0,0 +1,109 @@
+"""
+Persistent on-disk cache of GitHub API responses, used by github_api for every GET.
+
+Each 200 response that carries an ETag is stored (compressed) in SQLite, keyed by URL and token scope.
+Later requests for the same URL send If-None-Match, and a 304 Not Modified - which GitHub doesn't count
+against the rate limit - is answered from the cache. The cache is bounded in size, evicting the least
+recently used responses first.
+
+Entries are only reused by the token that stored them, since what a response contains can depend on
+who asked (private repositories, permissions). With share_across_tokens a token with no entry of its
+own falls back to another token's - if GitHub still answers 304 to that ETag the representation hasn't
+changed - which saves requests when every token in the pool sees the same public data.
+"""
+
+from dataclasses import dataclass
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+import zlib
+
+CACHE_PATH = "data/http_cache.sqlite"
+MAX_BYTES = 2 * 1024 ** 3   # 2 GB
+
+
+@dataclass
+class CachedResponse:
+    etag: str
+    body: bytes
+    link: Optional[str]     # Link header, so pagination still works from a cached page
+
+
+# Tokens are never stored, only a short hash of which one made the request
+def token_scope(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = MAX_BYTES, share_across_tokens: bool = False):
+        self.max_bytes = max_bytes
+        self.share_across_tokens = share_across_tokens
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                etag TEXT NOT NULL,
+                body BLOB NOT NULL,
+                link TEXT,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (url, scope)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    # The entry made with the same token, or with share_across_tokens the most recently used one of any token
+    def lookup(self, url: str, scope: str) -> Optional[CachedResponse]:
+        with self._lock:
+            if self.share_across_tokens:
+                row = self._conn.execute(
+                    "SELECT scope, etag, body, link FROM responses WHERE url = ? ORDER BY scope = ? DESC, last_used DESC LIMIT 1",
+                    (url, scope)
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT scope, etag, body, link FROM responses WHERE url = ? AND scope = ?", (url, scope)
+                ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE url = ? AND scope = ?", (time.time(), url, row[0]))
+            self._conn.commit()
+        return CachedResponse(etag=row[1], body=zlib.decompress(row[2]), link=row[3])
+
+    def store(self, url: str, scope: str, etag: str, body: bytes, link: Optional[str] = None) -> None:
+        compressed = zlib.compress(body)
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE url = ? AND scope = ?", (url, scope)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, scope, etag, body, link, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, scope, etag, compressed, link, len(compressed), time.time())
+            )
+            self._total_bytes += len(compressed) - (previous[0] if previous else 0)
+            self._evict()
+            self._conn.commit()
+
+    # Drop least recently used responses until the cache fits in max_bytes again
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute("SELECT url, scope, size FROM responses ORDER BY last_used LIMIT 100").fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+            for url, scope, size in rows:
+                self._conn.execute("DELETE FROM responses WHERE url = ? AND scope = ?", (url, scope))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,297 @@
+"""
+Metrics for the scraping stages, so a run that takes hours shows where the hours go.
+
+Every request made through github_api (and the GraphQL backend, PyGithub page fetches and PR page downloads)
+is recorded per endpoint, with PR numbers folded out of the path (pulls/{n}/files): request counts by status,
+a latency histogram, bytes received, cache hits against the ResponseCache and retries after rate limiting.
+Rate limit headroom is read from each TokenPool registered with watch_pool, with tokens identified by their
+hash. Stages report progress through the ProgressLedger, so PRs done and failed are counted as they are marked,
+and a stage that calls start_stage with its number of PRs to do also gets PRs remaining, a rate and an ETA.
+
+The metrics of a run are written every EXPORT_INTERVAL seconds and when it exits to
+data/metrics/<script>.json and data/metrics/<script>.prom (a Prometheus textfile collector file), so they can
+be watched while a stage runs and compared between runs, e.g. with different concurrency. PIPELINE_METRICS_DIR
+moves them elsewhere (the tests and benchmarks point it at a temporary directory). Run as a script to
+summarize the latest snapshots:
+
+    python pipeline_metrics.py
+"""
+
+import atexit
+from collections import defaultdict, deque
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from http_cache import token_scope
+
+METRICS_DIR = os.environ.get("PIPELINE_METRICS_DIR", "data/metrics")
+EXPORT_INTERVAL = 15    # seconds between snapshots while a stage runs
+RATE_WINDOW = 60    # seconds of recent requests that requests per second is measured over
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)    # seconds, upper bounds
+
+
+# Endpoint label for a url: its path without the repository prefix, and with numbers folded into {n}
+def endpoint(url: str) -> str:
+    path = urlparse(url).path
+    path = re.sub(r"^/(repos/)?[^/]+/[^/]+/", "", path) if path.count("/") > 2 else path.lstrip("/")
+    return re.sub(r"(^|/)\d+(?=/|$)", r"\1{n}", path)
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))] += 1
+        self.sum += seconds
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    # Cumulative counts per upper bound, as Prometheus histograms report them
+    def cumulative(self) -> Dict[str, int]:
+        total, result = 0, {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            result[bound] = total
+        return result
+
+
+class StageProgress:
+    def __init__(self, total: Optional[int] = None):
+        self.total = total
+        self.started = time.time()
+        self.done = 0
+        self.failed = 0
+
+    @property
+    def processed(self) -> int:
+        return self.done + self.failed
+
+    @property
+    def remaining(self) -> Optional[int]:
+        return max(self.total - self.processed, 0) if self.total is not None else None
+
+    def rate(self) -> float:
+        return self.processed / max(time.time() - self.started, 1e-9)
+
+    def eta(self) -> Optional[float]:
+        if self.remaining is None or not self.processed:
+            return None
+        return self.remaining / self.rate()
+
+
+class PipelineMetrics:
+    def __init__(self, path: Optional[str] = None, job: Optional[str] = None):
+        self.path = path    # read from PIPELINE_METRICS_DIR when the first snapshot is written, unless given
+        self.job = job or os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "pipeline"
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._last_export = time.time()
+        self._requests = defaultdict(int)   # (endpoint, status): count
+        self._latency = defaultdict(LatencyHistogram)
+        self._bytes = defaultdict(int)
+        self._retries = defaultdict(int)    # (endpoint, reason): count
+        self._cache = {"hit": 0, "miss": 0}
+        self._recent = deque()  # times of requests within RATE_WINDOW
+        self._stages: Dict[str, StageProgress] = {}
+        self._pools = {}
+
+    # Reset a stage's progress at the start of a run; total is the number of PRs it has to do, when known
+    def start_stage(self, stage: str, total: Optional[int] = None) -> None:
+        with self._lock:
+            self._stages[stage] = StageProgress(total)
+
+    def watch_pool(self, name: str, token_pool) -> None:
+        self._pools[name] = token_pool
+
+    def observe_request(self, url: str, status: int, seconds: float, size: int = 0, cache_hit: Optional[bool] = None) -> None:
+        name = endpoint(url)
+        now = time.time()
+        with self._lock:
+            self._requests[name, status] += 1
+            self._latency[name].observe(seconds)
+            self._bytes[name] += size
+            if cache_hit is not None:
+                self._cache["hit" if cache_hit else "miss"] += 1
+            self._recent.append(now)
+        self._maybe_export(now)
+
+    def observe_retry(self, url: str, reason: str) -> None:
+        with self._lock:
+            self._retries[endpoint(url), reason] += 1
+
+    # Called by the ProgressLedger as PRs are marked
+    def observe_progress(self, stage: str, status: str, count: int) -> None:
+        with self._lock:
+            progress = self._stages.setdefault(stage, StageProgress())
+            if status == "done":
+                progress.done += count
+            else:
+                progress.failed += count
+        self._maybe_export(time.time())
+
+    def requests_per_second(self) -> float:
+        now = time.time()
+        with self._lock:
+            while self._recent and self._recent[0] < now - RATE_WINDOW:
+                self._recent.popleft()
+            return len(self._recent) / max(min(now - self.started, RATE_WINDOW), 1e-9)
+
+    def cache_hit_ratio(self) -> Optional[float]:
+        lookups = self._cache["hit"] + self._cache["miss"]
+        return self._cache["hit"] / lookups if lookups else None
+
+    # One line on how a stage is going, for the stages' checkpoint prints
+    def progress(self, stage: str) -> str:
+        progress = self._stages.get(stage) or StageProgress()
+        of_total = f"/{progress.total}" if progress.total is not None else ""
+        line = f"{stage}: {progress.processed}{of_total} PRs ({progress.failed} failed), {progress.rate():.2f} PRs/s"
+        if progress.total is not None:
+            line += f", ETA {format_duration(progress.eta())}"
+        line += f", {self.requests_per_second():.1f} requests/s"
+        ratio = self.cache_hit_ratio()
+        if ratio is not None:
+            line += f", {ratio:.0%} cache hits"
+        return line
+
+    def snapshot(self) -> Dict:
+        requests_per_second = self.requests_per_second()
+        with self._lock:
+            endpoints = {}
+            for (name, status), count in self._requests.items():
+                entry = endpoints.setdefault(name, {"requests": {}, "bytes": self._bytes[name], "retries": {}})
+                entry["requests"][str(status)] = count
+            for name, entry in endpoints.items():
+                histogram = self._latency[name]
+                entry["latency"] = {"count": histogram.count, "sum": histogram.sum, "buckets": histogram.cumulative()}
+            for (name, reason), count in self._retries.items():
+                endpoints.setdefault(name, {"requests": {}, "bytes": 0, "retries": {}})["retries"][reason] = count
+
+            return {
+                "job": self.job,
+                "time": time.time(),
+                "uptime": time.time() - self.started,
+                "requests_per_second": requests_per_second,
+                "requests": sum(self._requests.values()),
+                "bytes": sum(self._bytes.values()),
+                "retries": sum(self._retries.values()),
+                "cache": {**self._cache, "hit_ratio": self.cache_hit_ratio()},
+                "endpoints": endpoints,
+                "rate_limit": {
+                    name: {token_scope(token)[:8]: remaining for token, remaining in token_pool.headroom().items()}
+                    for name, token_pool in self._pools.items()
+                },
+                "stages": {
+                    stage: {"total": progress.total, "done": progress.done, "failed": progress.failed, "remaining": progress.remaining,
+                            "prs_per_second": progress.rate(), "eta_seconds": progress.eta()}
+                    for stage, progress in self._stages.items()
+                },
+            }
+
+    def export(self) -> None:
+        snapshot = self.snapshot()
+        path = self.path or os.environ.get("PIPELINE_METRICS_DIR", METRICS_DIR)
+        os.makedirs(path, exist_ok=True)
+        for extension, text in (("json", json.dumps(snapshot, indent=2)), ("prom", prometheus_text(snapshot))):
+            output_path = os.path.join(path, f"{self.job}.{extension}")
+            with open(f"{output_path}.tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(f"{output_path}.tmp", output_path)     # textfile collectors must never see a partial file
+
+    def _maybe_export(self, now: float) -> None:
+        if now - self._last_export < EXPORT_INTERVAL:
+            return
+        self._last_export = now
+        self.export()
+
+
+def labels(**values) -> str:
+    return "{" + ",".join(f'{key}="{value}"' for key, value in values.items()) + "}"
+
+# A snapshot in the Prometheus text exposition format
+def prometheus_text(snapshot: Dict) -> str:
+    job = snapshot["job"]
+    lines = []
+
+    def metric(name: str, kind: str, help_text: str, samples: List) -> None:
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+        lines.extend(f"{sample_name}{labels(job=job, **sample_labels)} {value}" for sample_name, sample_labels, value in samples)
+
+    endpoints = snapshot["endpoints"]
+    metric("github_requests_total", "counter", "Requests by endpoint and status code.",
+           [("github_requests_total", {"endpoint": name, "status": status}, count)
+            for name, entry in endpoints.items() for status, count in entry["requests"].items()])
+    metric("github_request_duration_seconds", "histogram", "Request latency by endpoint.",
+           [sample for name, entry in endpoints.items() if "latency" in entry for sample in [
+               *(("github_request_duration_seconds_bucket", {"endpoint": name, "le": bound}, count) for bound, count in entry["latency"]["buckets"].items()),
+               ("github_request_duration_seconds_sum", {"endpoint": name}, entry["latency"]["sum"]),
+               ("github_request_duration_seconds_count", {"endpoint": name}, entry["latency"]["count"]),
+           ]])
+    metric("github_response_bytes_total", "counter", "Bytes received by endpoint.",
+           [("github_response_bytes_total", {"endpoint": name}, entry["bytes"]) for name, entry in endpoints.items()])
+    metric("github_retries_total", "counter", "Requests retried, by endpoint and reason.",
+           [("github_retries_total", {"endpoint": name, "reason": reason}, count)
+            for name, entry in endpoints.items() for reason, count in entry["retries"].items()])
+    metric("github_requests_per_second", "gauge", f"Requests per second over the last {RATE_WINDOW} seconds.",
+           [("github_requests_per_second", {}, snapshot["requests_per_second"])])
+    metric("github_cache_lookups_total", "counter", "Response cache lookups by result.",
+           [("github_cache_lookups_total", {"result": result}, snapshot["cache"][result]) for result in ("hit", "miss")])
+    metric("github_rate_limit_remaining", "gauge", "Rate limit remaining per token (identified by hash).",
+           [("github_rate_limit_remaining", {"pool": name, "token": token}, remaining)
+            for name, tokens in snapshot["rate_limit"].items() for token, remaining in tokens.items()])
+
+    stages = snapshot["stages"]
+    metric("pipeline_prs_processed_total", "counter", "PRs processed by stage and result.",
+           [("pipeline_prs_processed_total", {"stage": stage, "status": status}, progress[status])
+            for stage, progress in stages.items() for status in ("done", "failed")])
+    metric("pipeline_prs_remaining", "gauge", "PRs left to process by stage.",
+           [("pipeline_prs_remaining", {"stage": stage}, progress["remaining"]) for stage, progress in stages.items() if progress["remaining"] is not None])
+    metric("pipeline_eta_seconds", "gauge", "Estimated seconds until the stage is finished.",
+           [("pipeline_eta_seconds", {"stage": stage}, progress["eta_seconds"]) for stage, progress in stages.items() if progress["eta_seconds"] is not None])
+    return "\n".join(lines) + "\n"
+
+
+metrics = PipelineMetrics()
+
+# Final snapshot when a script exits, for runs that recorded anything
+@atexit.register
+def export_on_exit() -> None:
+    if metrics._requests or metrics._stages:
+        metrics.export()
+
+
+if __name__ == "__main__":
+    for path in sorted(glob.glob(os.path.join(METRICS_DIR, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        age = format_duration(time.time() - snapshot["time"])
+        print(f"{snapshot['job']} ({age} ago, ran {format_duration(snapshot['uptime'])}): {snapshot['requests']} requests, "
+              f"{snapshot['bytes'] / 1024 ** 2:.1f} MB, {snapshot['retries']} retries, cache hit ratio {snapshot['cache']['hit_ratio']}")
+        for stage, progress in snapshot["stages"].items():
+            of_total = f"/{progress['done'] + progress['failed'] + progress['remaining']}" if progress["remaining"] is not None else ""
+            print(f"  {stage}: {progress['done'] + progress['failed']}{of_total} PRs ({progress['failed']} failed), "
+                  f"{progress['prs_per_second']:.2f} PRs/s, ETA {format_duration(progress['eta_seconds'])}")
+        for name, entry in sorted(snapshot["endpoints"].items(), key=lambda item: -item[1].get("latency", {}).get("sum", 0)):
+            latency = entry.get("latency", {"count": 0, "sum": 0})
+            mean = latency["sum"] / latency["count"] if latency["count"] else 0
+            print(f"  {name:<40} {latency['count']:>8} requests {latency['sum']:>9.1f}s total {mean * 1000:>7.0f}ms mean")
+        for name, tokens in snapshot["rate_limit"].items():
+            print(f"  rate limit remaining ({name}): {', '.join(f'{token} {remaining}' for token, remaining in tokens.items())}")
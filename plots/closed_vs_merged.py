@@ -1,37 +1,45 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 import numpy as np
+from typing import Optional
 
-df = pd.read_csv("data/pull_requests_filtered.csv")
+from dataset import load_prs
+from pr_stats import COLUMNS as STATS_COLUMNS, PRStats, update_stats
 
-merged_prs = df[df['State'] == 'merged']
-closed_prs = df[df['State'] == 'closed']
+COLUMNS = ['State', 'Files Changed', 'Decision Time', 'Total Comments', 'LOC Changed']
 
-fig, axes = plt.subplots(2, 2, figsize=(9, 9))
-axes = axes.ravel()
-fig.suptitle('Distributions of Integration-Related PR Characteristics')
+def plot(df: pd.DataFrame, stats: Optional[PRStats] = None) -> plt.Figure:
+    if stats is None:
+        stats = PRStats.from_frame(df)
 
-for i, col_name in enumerate(['Files Changed', 'Decision Time', 'Total Comments', 'LOC Changed']):
+    fig, axes = plt.subplots(2, 2, figsize=(9, 9))
+    axes = axes.ravel()
+    fig.suptitle('Distributions of Integration-Related PR Characteristics')
 
-    # Take 98th percentile as upper limit to avoid extreme outliers making the scale unreasonable
-    upper_limit = np.percentile(
-        pd.concat([merged_prs[col_name], closed_prs[col_name]]), 
-        98 
-    )
-    bins = np.linspace(0, upper_limit, 20)
+    for i, col_name in enumerate(['Files Changed', 'Decision Time', 'Total Comments', 'LOC Changed']):
 
-    axes[i].hist(merged_prs[col_name], bins=bins, color='skyblue', edgecolor='black', alpha=0.5, label='Merged PRs')
-    axes[i].hist(closed_prs[col_name], bins=bins, color='salmon', edgecolor='black', alpha=0.5, label='Closed PRs')
+        # Take 98th percentile as upper limit to avoid extreme outliers making the scale unreasonable
+        upper_limit = stats.percentile(col_name, 98, state=['merged', 'closed'])
+        bins = np.linspace(0, upper_limit, 20)
 
-    axes[i].set_title(col_name)
-    axes[i].set_xlabel(col_name)
-    axes[i].set_ylabel('Frequency')
-    axes[i].set_xlim()
-    axes[i].grid(visible=True, linestyle='--', alpha=0.5)
+        # counts per bin come from the summary statistics, drawn as one weighted value per bin
+        axes[i].hist(bins[:-1], bins=bins, weights=stats.histogram(col_name, bins, state='merged'), color='skyblue', edgecolor='black', alpha=0.5, label='Merged PRs')
+        axes[i].hist(bins[:-1], bins=bins, weights=stats.histogram(col_name, bins, state='closed'), color='salmon', edgecolor='black', alpha=0.5, label='Closed PRs')
 
-handles, labels = axes[0].get_legend_handles_labels()
-labels[0] = f"Merged PRs ({len(merged_prs)} data points)"
-labels[1] = f"Closed PRs ({len(closed_prs)} data points)"
-fig.legend(handles, labels, loc='upper left')
-plt.tight_layout(pad=2)
-plt.show()
+        axes[i].set_title(col_name)
+        axes[i].set_xlabel(col_name)
+        axes[i].set_ylabel('Frequency')
+        axes[i].set_xlim()
+        axes[i].grid(visible=True, linestyle='--', alpha=0.5)
+
+    handles, labels = axes[0].get_legend_handles_labels()
+    labels[0] = f"Merged PRs ({stats.count(state='merged')} data points)"
+    labels[1] = f"Closed PRs ({stats.count(state='closed')} data points)"
+    fig.legend(handles, labels, loc='upper left')
+    plt.tight_layout(pad=2)
+    return fig
+
+if __name__ == "__main__":
+    df = load_prs(COLUMNS + STATS_COLUMNS)
+    plot(df, update_stats(df))
+    plt.show()
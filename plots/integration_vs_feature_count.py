@@ -1,28 +1,32 @@
 import matplotlib.pyplot as plt
 import pandas as pd
 
-df = pd.read_csv("data/pull_requests_filtered.csv")
+from dataset import ChangeType, load_prs
 
-# Filter rows based on "Type of Change"
-new_integration_prs = df[df['Type of Change'].str.contains('New integration')]
-new_feature_prs = df[df['Type of Change'].str.contains('New feature')]
+COLUMNS = ['Change Type', 'Created At']
 
-# Extract the year from the "Created At" column
-new_integration_prs['Year'] = pd.to_datetime(new_integration_prs['Created At']).dt.year
-new_feature_prs['Year'] = pd.to_datetime(new_feature_prs['Created At']).dt.year
+def plot(df: pd.DataFrame) -> plt.Figure:
+    # Filter rows based on "Change Type", and extract the year from the "Created At" column
+    years = df['Created At'].dt.year
+    new_integration_years = years[df['Change Type'] == ChangeType.NEW_INTEGRATION]
+    new_feature_years = years[df['Change Type'] == ChangeType.NEW_FEATURE]
 
-# Count the number of rows per year for each type
-integrations_per_year = new_integration_prs['Year'].value_counts().sort_index()
-features_per_year = new_feature_prs['Year'].value_counts().sort_index()
+    # Count the number of rows per year for each type
+    integrations_per_year = new_integration_years.value_counts().sort_index()
+    features_per_year = new_feature_years.value_counts().sort_index()
 
-# Plotting the counts as a bar graph
-plt.figure(figsize=(10, 6))
-plt.bar(integrations_per_year.index - 0.2, integrations_per_year.values, width=0.4, edgecolor='black', label='New Integration')
-plt.bar(features_per_year.index + 0.2, features_per_year.values, width=0.4, edgecolor='black', label='New Feature')
-plt.xlabel('Year')
-plt.ylabel('Number of Rows')
-plt.title('Number of New Integrations and New Features by Year')
-plt.xticks(sorted(set(integrations_per_year.index).union(set(features_per_year.index))))
-plt.legend()
-plt.grid(visible=True, linestyle='--', alpha=0.5)
-plt.show()
+    # Plotting the counts as a bar graph
+    fig = plt.figure(figsize=(10, 6))
+    plt.bar(integrations_per_year.index - 0.2, integrations_per_year.values, width=0.4, edgecolor='black', label='New Integration')
+    plt.bar(features_per_year.index + 0.2, features_per_year.values, width=0.4, edgecolor='black', label='New Feature')
+    plt.xlabel('Year')
+    plt.ylabel('Number of Rows')
+    plt.title('Number of New Integrations and New Features by Year')
+    plt.xticks(sorted(set(integrations_per_year.index).union(set(features_per_year.index))))
+    plt.legend()
+    plt.grid(visible=True, linestyle='--', alpha=0.5)
+    return fig
+
+if __name__ == "__main__":
+    plot(load_prs(COLUMNS))
+    plt.show()
@@ -0,0 +1,143 @@
+"""
+Renders every figure of the plot scripts in plots/ to plot-images/, headless (Agg backend) and across a process
+pool, reading the columns they need from data/pull_requests_filtered.csv once (typed, with dataset.load_prs).
+
+Each figure is a plot script's plot() function, the parameters it's called with, and the dataset columns it
+reads (the script's COLUMNS, plus any column named in its parameters). Scripts that take the summary statistics
+get the ones from pr_stats, updated once for the whole render. A figure's hash covers those columns'
+values, its parameters, the script's source and any other files it reads (INPUT_FILES), and is kept in
+plot-images/manifest.json once the image is written; figures whose hash hasn't changed since are skipped, so
+after a data update only the figures whose inputs changed are redrawn. Changes to modules a script imports
+aren't tracked, so pass --force after editing those.
+
+Run from the repository root:
+    python -m plots.render [--force] [--workers N] [--only NAME ...]
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+import hashlib
+import importlib
+import inspect
+import json
+import os
+from typing import Dict, List, Optional
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+
+from dataset import load_prs
+from pr_stats import COLUMNS as STATS_COLUMNS, PRStats, update_stats
+
+DATA_PATH = "data/pull_requests_filtered.csv"
+IMAGES_DIR = "plot-images"
+MANIFEST_PATH = os.path.join(IMAGES_DIR, "manifest.json")
+
+
+@dataclass(frozen=True)
+class Figure:
+    name: str
+    module: str
+    params: Dict = field(default_factory=dict)
+
+    @property
+    def output(self) -> str:
+        return os.path.join(IMAGES_DIR, f"{self.name}.png")
+
+    def script(self):
+        return importlib.import_module(self.module)
+
+    def columns(self) -> List[str]:
+        columns = list(self.script().COLUMNS)
+        return columns + [value for value in self.params.values() if isinstance(value, str) and value not in columns]
+
+    def input_files(self) -> List[str]:
+        return [self.script().__file__] + list(getattr(self.script(), "INPUT_FILES", []))
+
+
+FIGURES = [
+    Figure("closed_vs_merged", "plots.closed_vs_merged"),
+    Figure("decision_time_with_files_changed", "plots.decision_time_feature_detailed", {"secondary": "Files Changed"}),
+    Figure("decision_time_with_loc_changed", "plots.decision_time_feature_detailed", {"secondary": "LOC Changed"}),
+    Figure("decision_time_with_total_comments", "plots.decision_time_feature_detailed", {"secondary": "Total Comments"}),
+    Figure("decision_time_with_codeowners", "plots.decision_time_feature_with_codeowners"),
+    Figure("integration_vs_feature_characteristics", "plots.integration_vs_feature_characteristics"),
+    Figure("integration_vs_feature_count", "plots.integration_vs_feature_count"),
+]
+
+
+def figure_hash(figure: Figure, data: pd.DataFrame) -> str:
+    digest = hashlib.sha256(json.dumps([figure.module, figure.params, data.columns.tolist()], sort_keys=True).encode())
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    for path in figure.input_files():
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def load_manifest(path: str = MANIFEST_PATH) -> Dict[str, str]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(manifest: Dict[str, str], path: str = MANIFEST_PATH) -> None:
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+# Runs in a worker process: draw one figure from its columns of the dataset (and the summary statistics, for the
+# scripts that take them) and save it
+def render_figure(figure: Figure, data: pd.DataFrame, stats: PRStats) -> str:
+    plot = figure.script().plot
+    params = {**figure.params, "stats": stats} if "stats" in inspect.signature(plot).parameters else figure.params
+    fig = plot(data, **params)
+    fig.savefig(figure.output)
+    plt.close("all")
+    return figure.output
+
+def render(figures: List[Figure] = FIGURES, data_path: str = DATA_PATH, workers: Optional[int] = None, force: bool = False) -> Dict[str, str]:
+    columns = list(dict.fromkeys(column for figure in figures for column in figure.columns()))
+    df = load_prs(columns + STATS_COLUMNS, data_path)
+
+    manifest = load_manifest()
+    stale = []
+    for figure in figures:
+        data = df[figure.columns()]
+        digest = figure_hash(figure, data)
+        if force or manifest.get(figure.name) != digest or not os.path.exists(figure.output):
+            stale.append((figure, digest, data))
+    print(f"Rendering {len(stale)} of {len(figures)} figures ({len(figures) - len(stale)} unchanged).")
+    if not stale:
+        return manifest
+
+    stats = update_stats(df)
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers, initializer=matplotlib.use, initargs=("Agg",)) as executor:
+        futures = {executor.submit(render_figure, figure, data, stats): (figure, digest) for figure, digest, data in stale}
+        for future in as_completed(futures):
+            figure, digest = futures[future]
+            try:
+                print(f"Saved {future.result()}")
+            except Exception as e:
+                print(f"Failed to render {figure.name}: {e!r}")
+                continue
+            manifest[figure.name] = digest    # only recorded once the image is on disk
+            save_manifest(manifest)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--force', action='store_true', help="render every figure, even if its inputs haven't changed")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--only', nargs='+', metavar='NAME', choices=[figure.name for figure in FIGURES], help="only render these figures")
+    parser.add_argument('--data', default=DATA_PATH, help="dataset CSV to render from")
+    args = parser.parse_args()
+
+    figures = [figure for figure in FIGURES if args.only is None or figure.name in args.only]
+    render(figures, args.data, args.workers, args.force)
@@ -0,0 +1,320 @@
+"""
+Summary statistics of the filtered PRs for the plots, kept up to date as PRs are appended instead of recomputed
+over the full frame by every figure.
+
+For each of Decision Time, Files Changed, Total Comments and LOC Changed, a QuantileSketch is kept over all PRs
+and per group of each grouping: State, Type of Change and Author is Codeowner. A sketch counts values in
+logarithmic buckets (DDSketch), so its quantiles are within RELATIVE_ACCURACY of a true value whatever the range
+of values. Alongside it, a Histogram counts each value (they're all whole numbers) to answer binning queries, and
+quantiles that are labelled on a figure, exactly. Both merge across groups by adding counts:
+
+    stats = update_stats(df)
+    stats.percentile('LOC Changed', 98, state=['merged', 'closed'])
+    stats.histogram('Decision Time', [0, 3, 7, 30, 90], state='merged')
+
+Groups of one grouping at a time can be queried (and merged by passing several); joint groups aren't kept.
+
+update_stats keeps the sketches in data/pr_stats.pkl with the PR numbers they count: PRs not seen before are
+added to the sketches, and they're only rebuilt from the whole frame when a PR already counted has gone, when
+the number or sum of a characteristic's values over the counted PRs has changed (e.g. LOC Changed filled in by
+scrape_pr_file_data), when the State, Type of Change, Integration or Author of a counted PR has changed (e.g.
+by the authors sidecar or a webhook), or when data/CODEOWNERS.txt has changed.
+"""
+
+import hashlib
+import math
+import os
+import pickle
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from codeowners import CODEOWNERS_PATH, INDEX_VERSION, author_is_codeowner, load_index
+from dataset import load_prs
+
+STATS_PATH = "data/pr_stats.pkl"
+RELATIVE_ACCURACY = 0.01
+HISTOGRAM_RESOLUTION = 1    # every characteristic is a whole number (days, files, comments, lines)
+CHARACTERISTICS = ['Decision Time', 'Files Changed', 'Total Comments', 'LOC Changed']
+GROUPINGS = {'state': 'State', 'change_type': 'Type of Change', 'codeowner': 'Author is Codeowner'}  # query keyword -> column
+GROUPING_COLUMNS = ['State', 'Type of Change', 'Integration', 'Author']   # what the groupings are worked out from
+COLUMNS = ['PR Number', 'State', 'Type of Change', 'Integration', 'Author'] + CHARACTERISTICS
+ALL = ('All', True)
+
+
+class QuantileSketch:
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.buckets: Dict[int, int] = {}   # bucket k counts values in (gamma^(k-1), gamma^k]
+        self.zero_count = 0                 # values <= 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._cumulative: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _key(self, values: np.ndarray) -> np.ndarray:
+        return np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64)
+
+    def add(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+
+        positive = values[values > 0]
+        keys, counts = np.unique(self._key(positive), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        self.zero_count += len(values) - len(positive)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._cumulative = None
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.gamma != self.gamma:
+            raise ValueError("can only merge sketches with the same relative accuracy")
+        merged = QuantileSketch(self.relative_accuracy)
+        merged.buckets = dict(self.buckets)
+        for key, count in other.buckets.items():
+            merged.buckets[key] = merged.buckets.get(key, 0) + count
+        merged.zero_count = self.zero_count + other.zero_count
+        merged.count = self.count + other.count
+        merged.min = min(self.min, other.min)
+        merged.max = max(self.max, other.max)
+        return merged
+
+    # Sorted bucket keys and the running count of values up to each, rebuilt after adds
+    def cumulative(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._cumulative is None:
+            keys = np.array(sorted(self.buckets), dtype=np.int64)
+            counts = np.array([self.buckets[key] for key in keys.tolist()], dtype=np.int64)
+            self._cumulative = (keys, self.zero_count + np.cumsum(counts))
+        return self._cumulative
+
+    # q in [0, 1]: the value at rank q * (count - 1), estimated from its bucket with at most the relative accuracy's error
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        keys, cumulative = self.cumulative()
+        key = keys[np.searchsorted(cumulative, rank, side='right')]
+        estimate = 2 * self.gamma ** key / (self.gamma + 1)
+        return float(min(max(estimate, self.min), self.max))
+
+    def percentile(self, p: float) -> float:
+        return self.quantile(p / 100)
+
+    def __getstate__(self) -> Dict:
+        return {**self.__dict__, "_cumulative": None}
+
+
+class Histogram:
+    def __init__(self, resolution: float = HISTOGRAM_RESOLUTION):
+        self.resolution = resolution
+        self.counts: Dict[int, int] = {}    # value / resolution, rounded -> count
+
+    def add(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=np.float64)
+        keys, counts = np.unique(np.rint(values[~np.isnan(values)] / self.resolution).astype(np.int64), return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.counts[key] = self.counts.get(key, 0) + count
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        if other.resolution != self.resolution:
+            raise ValueError("can only merge histograms with the same resolution")
+        merged = Histogram(self.resolution)
+        merged.counts = dict(self.counts)
+        for key, count in other.counts.items():
+            merged.counts[key] = merged.counts.get(key, 0) + count
+        return merged
+
+    def _values(self) -> Tuple[np.ndarray, np.ndarray]:
+        return np.array(list(self.counts), dtype=np.float64) * self.resolution, np.array(list(self.counts.values()), dtype=np.int64)
+
+    # Number of values <= x
+    def rank(self, x: float) -> int:
+        values, counts = self._values()
+        return int(counts[values <= x].sum())
+
+    # q in [0, 1] of the values <= upper, interpolated between neighbouring values as np.quantile does (so exact
+    # for whole numbers at a resolution of 1)
+    def quantile(self, q: float, upper: float = math.inf) -> float:
+        values, counts = self._values()
+        order = np.argsort(values)
+        values, counts = values[order], counts[order]
+        values, counts = values[values <= upper], counts[values <= upper]
+        if not len(counts):
+            return math.nan
+        cumulative = np.cumsum(counts)
+        rank = q * (cumulative[-1] - 1)
+        lower, higher = (values[np.searchsorted(cumulative, r, side='right')] for r in (math.floor(rank), math.ceil(rank)))
+        return float(lower + (rank - math.floor(rank)) * (higher - lower))
+
+    # Counts between consecutive edges, as np.histogram gives
+    def histogram(self, edges: Sequence[float]) -> np.ndarray:
+        values, counts = self._values()
+        return np.histogram(values, bins=edges, weights=counts)[0].astype(np.int64)
+
+
+# Per row: each characteristic's value, and a hash of the PR number with each grouping column's value
+def row_checksums(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    rows = {characteristic: df[characteristic].to_numpy(dtype=np.float64) for characteristic in CHARACTERISTICS if characteristic in df.columns}
+    pr_hashes = pd.util.hash_array(df['PR Number'].to_numpy(dtype=np.int64))
+    for column in GROUPING_COLUMNS:
+        if column in df.columns:
+            values = df[column].astype('category')    # each distinct value is only hashed once
+            value_hashes = np.append(pd.util.hash_array(values.cat.categories.to_numpy(dtype=object)), np.uint64(0))   # code -1 is missing
+            rows[column] = pd.util.hash_array(pr_hashes ^ value_hashes[values.cat.codes.to_numpy()])
+    return rows
+
+# Number and sum of the row checksums in mask (hashes summed, so the order of the rows doesn't matter), to tell
+# whether PRs already counted have changed
+def checksums(rows: Dict[str, np.ndarray], mask: np.ndarray) -> Dict[str, Tuple[int, float]]:
+    sums = {}
+    for column, values in rows.items():
+        values = values[mask]
+        if values.dtype == np.uint64:
+            sums[column] = (len(values), int(values.sum(dtype=np.uint64)))
+        else:
+            sums[column] = (int(np.count_nonzero(~np.isnan(values))), float(np.nansum(values)))
+    return sums
+
+def codeowners_digest(path: str = CODEOWNERS_PATH) -> Optional[str]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return f"{hashlib.sha256(f.read()).hexdigest()}-v{INDEX_VERSION}"   # owners change with the matching rules too
+
+
+class PRStats:
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        # keyed by (characteristic, grouping column, group)
+        self.sketches: Dict[Tuple[str, str, object], QuantileSketch] = {}
+        self.histograms: Dict[Tuple[str, str, object], Histogram] = {}
+        self.pr_numbers = np.empty(0, dtype=np.int64)     # PRs counted so far
+        self.checksums: Dict[str, Tuple[int, float]] = {}
+        self.codeowners_digest: Optional[str] = None
+
+    # Stats for df alone, without keeping track of its PRs for later updates
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, relative_accuracy: float = RELATIVE_ACCURACY) -> "PRStats":
+        stats = cls(relative_accuracy)
+        stats.codeowners_digest = codeowners_digest() if {'Integration', 'Author'} <= set(df.columns) else None
+        stats._add(df)
+        return stats
+
+    # Grouping columns for df's rows, for the groupings df has the data for
+    def _groups(self, df: pd.DataFrame) -> pd.DataFrame:
+        groups = df[[column for column in ('State', 'Type of Change') if column in df.columns]].copy()
+        if {'Integration', 'Author'} <= set(df.columns) and self.codeowners_digest:
+            groups['Author is Codeowner'] = author_is_codeowner(df, load_index())
+        return groups
+
+    def _add_values(self, key: Tuple[str, str, object], values: pd.Series) -> None:
+        self.sketches.setdefault(key, QuantileSketch(self.relative_accuracy)).add(values)
+        self.histograms.setdefault(key, Histogram()).add(values)
+
+    def _add(self, df: pd.DataFrame) -> None:
+        groups = self._groups(df)
+        for characteristic in CHARACTERISTICS:
+            if characteristic not in df.columns:
+                continue
+            values = df[characteristic]
+            self._add_values((characteristic, *ALL), values)
+            for grouping in groups.columns:
+                for group, group_values in values.groupby(groups[grouping], observed=True):
+                    self._add_values((characteristic, grouping, group), group_values)
+
+    # Add the PRs in df not counted yet, or rebuild from df when counted ones changed; returns the number of PRs added
+    def update(self, df: pd.DataFrame) -> int:
+        counted = df['PR Number'].isin(self.pr_numbers).to_numpy()
+        digest = codeowners_digest() if {'Integration', 'Author'} <= set(df.columns) else None
+        rows = row_checksums(df)
+        changed = digest != self.codeowners_digest or counted.sum() != len(self.pr_numbers) or checksums(rows, counted) != self.checksums
+
+        if changed:
+            self.sketches, self.histograms, self.codeowners_digest = {}, {}, digest
+            new_rows = df
+        else:
+            new_rows = df[~counted]
+        self._add(new_rows)
+        self.pr_numbers = df['PR Number'].to_numpy(dtype=np.int64)
+        self.checksums = checksums(rows, np.ones(len(df), dtype=bool))
+        return len(new_rows)
+
+    def _keys(self, characteristic: str, groups: Dict[str, Union[object, List[object]]]) -> List[Tuple[str, str, object]]:
+        if len(groups) > 1:
+            raise ValueError(f"only one grouping can be queried at a time, got {', '.join(groups)}")
+        if not groups:
+            return [(characteristic, *ALL)]
+        (keyword, values), = groups.items()
+        values = values if isinstance(values, list) else [values]
+        return [(characteristic, GROUPINGS[keyword], value) for value in values]
+
+    # Sketch of a characteristic over all PRs, or over the given groups of one grouping, e.g. state=['merged', 'closed']
+    def sketch(self, characteristic: str, **groups: Union[object, List[object]]) -> QuantileSketch:
+        sketch = QuantileSketch(self.relative_accuracy)
+        for key in self._keys(characteristic, groups):
+            if key in self.sketches:
+                sketch = sketch.merge(self.sketches[key])
+        return sketch
+
+    def value_counts(self, characteristic: str, **groups: Union[object, List[object]]) -> Histogram:
+        histogram = Histogram()
+        for key in self._keys(characteristic, groups):
+            if key in self.histograms:
+                histogram = histogram.merge(self.histograms[key])
+        return histogram
+
+    def count(self, characteristic: str = 'Decision Time', **groups) -> int:
+        return self.sketch(characteristic, **groups).count
+
+    def quantile(self, characteristic: str, q: float, **groups) -> float:
+        return self.sketch(characteristic, **groups).quantile(q)
+
+    def percentile(self, characteristic: str, p: float, **groups) -> float:
+        return self.sketch(characteristic, **groups).percentile(p)
+
+    # Quantile among the values no greater than upper, e.g. the median once outliers above a cutoff are dropped. It
+    # comes from the exact counts rather than the sketch, so it agrees with a boxplot drawn from the same rows
+    def quantile_below(self, characteristic: str, q: float, upper: float, **groups) -> float:
+        return self.value_counts(characteristic, **groups).quantile(q, upper)
+
+    def histogram(self, characteristic: str, edges: Sequence[float], **groups) -> np.ndarray:
+        return self.value_counts(characteristic, **groups).histogram(edges)
+
+    def save(self, path: str = STATS_PATH) -> None:
+        with open(f"{path}.tmp", "wb") as f:
+            pickle.dump(self, f)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str = STATS_PATH) -> "PRStats":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+# Stats for df from the ones on disk, adding the PRs appended since and saving them back
+def update_stats(df: pd.DataFrame, path: str = STATS_PATH) -> PRStats:
+    stats = PRStats.load(path)
+    added = stats.update(df)
+    if added:
+        print(f"Added {added} PRs to the summary statistics ({len(stats.pr_numbers)} in total).")
+        stats.save(path)
+    return stats
+
+
+if __name__ == "__main__":
+    df = load_prs(COLUMNS)
+    stats = update_stats(df)
+    for characteristic in CHARACTERISTICS:
+        percentiles = ", ".join(f"p{p}={stats.percentile(characteristic, p):.1f}" for p in (50, 90, 95, 98))
+        print(f"{characteristic}: {stats.count(characteristic)} PRs, {percentiles}")
@@ -0,0 +1,94 @@
+"""
+SQLite ledger of per-PR progress for each scraping stage ('metadata', 'checkbox', 'comments', 'loc').
+
+Each (stage, PR number) row records whether the PR is done or failed, how many attempts it took and
+the last error. Stages use it to resume without reading their output files back in, to avoid
+appending the same PR twice, and to retry only the PRs that failed (--retry-failed).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Set
+
+from pipeline_metrics import metrics
+
+LEDGER_PATH = "data/progress.sqlite"
+
+DONE = "done"
+FAILED = "failed"
+
+
+class ProgressLedger:
+    def __init__(self, path: str = LEDGER_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS progress (
+                stage TEXT NOT NULL,
+                pr_number INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (stage, pr_number)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS progress_status ON progress (stage, status, pr_number)")
+
+    def _record(self, stage: str, pr_numbers: Iterable[int], status: str, error: Optional[str] = None) -> None:
+        now = time.time()
+        rows = [(stage, int(pr_number), status, error, now) for pr_number in pr_numbers]
+        with self._lock:
+            self._conn.executemany("""
+                INSERT INTO progress (stage, pr_number, status, attempts, last_error, updated_at) VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT (stage, pr_number) DO UPDATE SET
+                    status = excluded.status, attempts = attempts + 1, last_error = excluded.last_error, updated_at = excluded.updated_at
+            """, rows)
+            self._conn.commit()
+        metrics.observe_progress(stage, status, len(rows))
+
+    # Only call once the PRs' results have been written out
+    def mark_done(self, stage: str, pr_numbers: Iterable[int]) -> None:
+        self._record(stage, pr_numbers, DONE)
+
+    def mark_failed(self, stage: str, pr_number: int, error: str) -> None:
+        self._record(stage, [pr_number], FAILED, str(error))
+
+    def _numbers(self, stage: str, status: str) -> List[int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT pr_number FROM progress WHERE stage = ? AND status = ? ORDER BY pr_number DESC", (stage, status)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    # Forget a stage's progress, e.g. when its output is rebuilt from scratch
+    def reset(self, stage: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM progress WHERE stage = ?", (stage,))
+            self._conn.commit()
+
+    # Forget some PRs' progress in a stage, e.g. when their input has changed and they need redoing
+    def forget(self, stage: str, pr_numbers: Iterable[int]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM progress WHERE stage = ? AND pr_number = ?", [(stage, int(pr_number)) for pr_number in pr_numbers])
+            self._conn.commit()
+
+    def done(self, stage: str) -> Set[int]:
+        return set(self._numbers(stage, DONE))
+
+    def failed(self, stage: str) -> List[int]:
+        return self._numbers(stage, FAILED)
+
+    # Lowest PR number already done, i.e. where a newest-first crawl left off (index lookup, no file scan)
+    def lowest_done(self, stage: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(pr_number) FROM progress WHERE stage = ? AND status = ?", (stage, DONE)).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
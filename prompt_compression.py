@@ -0,0 +1,210 @@
+"""
+Compresses a PR's formatted conversation (the 'Formatted Comments' string built by format_comment_data)
+before it goes into the categorization prompt, and keeps it under a per-PR token budget.
+
+The conversation is parsed back into threads and comments, then:
+  - diff hunks are trimmed to the last few lines, the ones the review comment is attached to
+  - quoted text ("> ...") is dropped from comment bodies, and long code blocks are cut short
+  - acknowledgement-only replies ("Done", "Thanks!", "👍") are dropped
+and if it's still over budget the hunks go entirely, followed by a hard cut at the budget.
+
+Tokens are counted with the model's tiktoken encoding. When it can't be loaded (e.g. offline) a rough 4 characters
+per token estimate is used instead, with a warning; results carry the name of the counter used, which
+categorize_issues_gpt keys its completion cache on, since the same conversation compresses differently. E.g.
+
+    result = compress_conversation(df['Formatted Comments'][0], model="gpt-4o-mini")
+    result.text, result.original_tokens, result.tokens
+
+Run as a script to report the tokens saved per PR over the formatted comments without calling the API.
+"""
+
+import argparse
+from dataclasses import dataclass
+from functools import lru_cache
+import re
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+from format_comment_data import FORMATTED_PATH
+
+TOKEN_BUDGET = 3000     # per PR conversation
+TRUNCATED = "\n[conversation truncated]"
+HUNK_CONTEXT_LINES = 4  # diff hunk lines kept above the commented line
+CODE_BLOCK_LINES = 8    # lines kept from each fenced code block
+
+THREAD = re.compile(r"---BEGIN THREAD---\nDiff Hunk:\n(.*?)\n\n(?=\(from (?:author|reviewer)\) \[)(.*?)\n---END THREAD---", re.DOTALL)
+COMMENT_HEADER = re.compile(r"^\(from (?:author|reviewer)\) \[[^\]]*\] ?", re.MULTILINE)
+QUOTED_LINE = re.compile(r"^[ \t]*>.*(?:\n|$)", re.MULTILINE)
+CODE_BLOCK = re.compile(r"^```[^\n]*\n(.*?)^```[ \t]*$", re.DOTALL | re.MULTILINE)
+ACKNOWLEDGEMENT = re.compile(
+    r"^[\W_]*(?:(?:thanks?(?: a lot| for the review| for (?:the|your) (?:feedback|help))?|thank you|thx|ty|done|fixed|addressed|updated|changed|"
+    r"ok(?:ay)?|sure|will do|good (?:catch|point|idea)|makes sense|agreed|yes|yep|lgtm|\+1)[\W_]*)*$",
+    re.IGNORECASE
+)
+
+
+@dataclass
+class Comment:
+    header: str
+    body: str
+
+@dataclass
+class Entry:
+    comments: List[Comment]
+    diff_hunk: Optional[str] = None     # None for issue comments
+
+
+@dataclass
+class CompressionResult:
+    text: str
+    original_tokens: int
+    tokens: int
+    dropped_comments: int = 0
+    truncated: bool = False
+    tokenizer: str = ""     # name of the Counter the tokens were counted with
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+@dataclass
+class Counter:
+    name: str
+    count: Callable[[str], int]
+    truncate: Callable[[str, int], str]
+
+# The model's tiktoken encoding, or a rough 4 characters per token estimate when it can't be loaded (e.g. offline)
+@lru_cache(maxsize=None)
+def token_counter(model: str) -> Counter:
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return Counter(
+            name=f"tiktoken/{encoding.name}",
+            count=lambda text: len(encoding.encode(text, disallowed_special=())),
+            truncate=lambda text, tokens: encoding.decode(encoding.encode(text, disallowed_special=())[:tokens]),
+        )
+    except Exception as e:
+        print(f"Warning: couldn't load the tokenizer for {model} ({e}), estimating 4 characters per token instead. "
+              f"Conversations are compressed differently, so completions cached with the tokenizer won't be reused.")
+        return Counter(name="estimate/4-characters", count=lambda text: (len(text) + 3) // 4, truncate=lambda text, tokens: text[:tokens * 4])
+
+
+def split_comments(text: str) -> List[Comment]:
+    headers = list(COMMENT_HEADER.finditer(text))
+    return [
+        Comment(header=header.group(0).rstrip(), body=text[header.end():headers[i + 1].start() if i + 1 < len(headers) else len(text)].strip())
+        for i, header in enumerate(headers)
+    ]
+
+# Parse the output of format_comment_data back into its review threads and issue comments
+def parse_conversation(comment_string: str) -> List[Entry]:
+    entries = []
+    position = 0
+    for thread in THREAD.finditer(comment_string):
+        entries.extend(Entry(comments=[comment]) for comment in split_comments(comment_string[position:thread.start()]))
+        entries.append(Entry(comments=split_comments(thread.group(2)), diff_hunk=thread.group(1)))
+        position = thread.end()
+    entries.extend(Entry(comments=[comment]) for comment in split_comments(comment_string[position:]))
+    return entries
+
+
+# The commented line is the last line of a review comment's diff hunk
+def trim_diff_hunk(diff_hunk: str, context_lines: int = HUNK_CONTEXT_LINES) -> str:
+    lines = diff_hunk.splitlines()
+    if len(lines) <= context_lines + 1:
+        return diff_hunk
+    return "\n".join(lines[-(context_lines + 1):])
+
+def shorten_code_block(block: re.Match) -> str:
+    lines = block.group(1).splitlines()
+    if len(lines) <= CODE_BLOCK_LINES:
+        return block.group(0)
+    return "```\n" + "\n".join(lines[:CODE_BLOCK_LINES]) + f"\n[... {len(lines) - CODE_BLOCK_LINES} more lines]\n```"
+
+def clean_body(body: str) -> str:
+    body = QUOTED_LINE.sub("", body)
+    body = CODE_BLOCK.sub(shorten_code_block, body)
+    return re.sub(r"\n{3,}", "\n\n", body).strip()
+
+def is_acknowledgement(body: str) -> bool:
+    return ACKNOWLEDGEMENT.match(body) is not None
+
+
+def render(entries: List[Entry], hunk_context: Optional[int]) -> str:
+    blocks = []
+    for entry in entries:
+        comments = "\n".join(f"{comment.header} {comment.body}" for comment in entry.comments)
+        if entry.diff_hunk is None:
+            blocks.append(comments)
+        elif hunk_context is None:
+            blocks.append(f"[thread]\n{comments}")
+        else:
+            blocks.append(f"[thread]\n```diff\n{trim_diff_hunk(entry.diff_hunk, hunk_context)}\n```\n{comments}")
+    return "\n\n".join(blocks)
+
+def compress_conversation(comment_string: str, model: str = "gpt-4o-mini", budget: int = TOKEN_BUDGET) -> CompressionResult:
+    counter = token_counter(model)
+    original_tokens = counter.count(comment_string)
+
+    parsed = parse_conversation(comment_string)
+    if not parsed:  # not in format_comment_data's format, so it can only be cut to the budget
+        return fit_to_budget(comment_string.strip(), original_tokens, counter, budget)
+
+    entries = []
+    dropped = 0
+    for entry in parsed:
+        comments = []
+        for position, comment in enumerate(entry.comments):
+            body = clean_body(comment.body)
+            # The first comment of a review thread says what the thread is about, so it always stays
+            if (position > 0 or entry.diff_hunk is None) and is_acknowledgement(body):
+                dropped += 1
+                continue
+            comments.append(Comment(comment.header, body))
+        if comments:
+            entries.append(Entry(comments=comments, diff_hunk=entry.diff_hunk))
+
+    # Loosen the context until it fits: trimmed hunks, then just the commented line, then no hunks
+    for hunk_context in (HUNK_CONTEXT_LINES, 0, None):
+        text = render(entries, hunk_context)
+        tokens = counter.count(text)
+        if tokens <= budget:
+            return CompressionResult(text, original_tokens, tokens, dropped, tokenizer=counter.name)
+
+    return fit_to_budget(text, original_tokens, counter, budget, dropped)
+
+def fit_to_budget(text: str, original_tokens: int, counter: Counter, budget: int, dropped: int = 0) -> CompressionResult:
+    tokens = counter.count(text)
+    if tokens <= budget:
+        return CompressionResult(text, original_tokens, tokens, dropped, tokenizer=counter.name)
+
+    text = counter.truncate(text, budget - counter.count(TRUNCATED)) + TRUNCATED
+    return CompressionResult(text, original_tokens, counter.count(text), dropped, truncated=True, tokenizer=counter.name)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default="gpt-4o-mini")
+    parser.add_argument('--budget', type=int, default=TOKEN_BUDGET, help="maximum tokens per PR conversation")
+    args = parser.parse_args()
+
+    df = pd.read_csv(FORMATTED_PATH, usecols=['PR Number', 'Formatted Comments']).drop_duplicates('PR Number', keep='last')
+    df['Formatted Comments'] = df['Formatted Comments'].fillna("")
+    results = [compress_conversation(comment_string, args.model, args.budget) for comment_string in df['Formatted Comments']]
+
+    report = pd.DataFrame({
+        'PR Number': df['PR Number'],
+        'Original Tokens': [result.original_tokens for result in results],
+        'Tokens': [result.tokens for result in results],
+        'Tokens Saved': [result.saved_tokens for result in results],
+        'Truncated': [result.truncated for result in results],
+    })
+    print(report.sort_values('Tokens Saved', ascending=False).head(20).to_string(index=False))
+    # The old prompt sent every conversation twice
+    print(f"\n{report['Original Tokens'].sum() * 2} -> {report['Tokens'].sum()} tokens over {len(report)} PRs, "
+          f"{report['Truncated'].sum()} PRs cut at the {args.budget} token budget.")
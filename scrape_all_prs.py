@@ -1,135 +1,403 @@
-
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import csv
-from dotenv import load_dotenv
-from github import Github
-import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 import os
+import queue
+import time
+
+from dotenv import load_dotenv
+from github import Github, RateLimitExceededException
+from urllib3.util.retry import Retry
+
+from github_api import API_URL, REPO
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from token_pool import TokenPool
+from type_of_change import extract_type_of_change
 
 load_dotenv()
 
-tokens = os.environ.get("GITHUB_PATS").split(",")
-current_token_index = 0
 buffer = []  # Buffer for batching PR data
 BATCH_SIZE = 100  # Save every x PRs
 
-# Initialize GitHub instance
+START_DATE = datetime(2021, 1, 1, tzinfo=timezone.utc)  # Set start date as timezone-aware in UTC
+END_DATE = datetime(2024, 10, 31, tzinfo=timezone.utc)  # Set end date as timezone-aware in UTC
+SHARD_DIR = "data/shards"
+SEARCH_RESULT_LIMIT = 1000  # GitHub search only returns the first 1000 results of a query
+PER_PAGE = 100
+CSV_HEADER = ["PR Number", "Title", "Author", "Integration", "Created At", "Updated At", "State",
+              "Files Changed", "Decision Time", "Closed Date", "URL", "Type of Change"]
+
+STAGE = "metadata"   # progress ledger stage name
+PULLS_URL = f"{API_URL}/repos/{REPO}/pulls"   # what PyGithub requests, for the metrics
+SEARCH_URL = f"{API_URL}/search/issues"
+
+# Retry server errors, but let rate limits raise RateLimitExceededException so the pool can switch tokens;
+# PyGithub's default GithubRetry would sleep until the token resets instead
+RETRY = Retry(total=5, backoff_factor=1, status_forcelist=(500, 502, 503, 504))
+
+pool = TokenPool.from_env(reserve=PER_PAGE + 1)  # only hand out a token that can finish a whole page of PRs
+current_token = None
+done_prs = set()
+ledger = ProgressLedger()
+metrics.watch_pool("rest", pool)
+
+# Initialize GitHub instance with the token that has the most headroom
 def get_github_instance():
-    global current_token_index
-    g = Github(tokens[current_token_index])
-    return g
+    global current_token
+    current_token = pool.acquire()  # only sleeps if every token is exhausted
+    return github_client(current_token)
 
-# Function to rotate token when rate limit is exceeded
-def rotate_token():
-    global current_token_index
-    current_token_index = (current_token_index + 1) % len(tokens)
-    print(f"Rotated to token {current_token_index + 1}")
-    save_buffered_data()  # Save buffer on token rotation
-    return get_github_instance()
+def github_client(token):
+    return Github(token, base_url=API_URL, per_page=PER_PAGE, retry=RETRY)
 
-# Function to handle rate limits by rotating tokens or waiting if all are exhausted
+# Function to handle rate limits by switching to the token with the most headroom once the current one runs low
 def handle_rate_limit(g):
-    rate_limit = g.get_rate_limit().core
-
-    if rate_limit.remaining == 0:
-        reset_time = rate_limit.reset
-        wait_time = (reset_time - datetime.now(timezone.utc)).total_seconds()
-        print(f"Token {current_token_index + 1} rate limit exceeded.")
-        
-        # Rotate to the next token or wait if all tokens are exhausted
-        if current_token_index == len(tokens) - 1:
-            print(f"All tokens exhausted. Waiting {wait_time:.2f} seconds for reset.")
-            time.sleep(wait_time)
-        
-        return rotate_token()
+    remaining, limit = g.rate_limiting     # read from the last response's headers, no extra API call
+    pool.update_counts(current_token, remaining, g.rate_limiting_resettime, limit)
+
+    if remaining <= pool.reserve:
+        print("Token close to its rate limit, switching to the token with the most headroom.")
+        save_buffered_data()  # Save buffer on token rotation
+        return get_github_instance()
     return g
 
-# Load last PR number from CSV if it exists, otherwise start from the beginning
-def load_last_pr():
-    if os.path.exists("data/pull_requests_all.csv"):
+# Load the PRs already saved from the progress ledger; output written before the ledger existed is read once to seed it
+def load_done_prs():
+    done = ledger.done(STAGE)
+    if not done and os.path.exists("data/pull_requests_all.csv"):
         with open("data/pull_requests_all.csv", "r", encoding="utf-8") as f:
-            last_row = list(csv.reader(f))[-1]
-            last_pr_number = int(last_row[0])
-            print(f"Resuming from PR #{last_pr_number - 1}")
-            return last_pr_number - 1
-    return None  # No file exists, start fresh
+            reader = csv.reader(f)
+            next(reader)    # skip header
+            ledger.mark_done(STAGE, (int(row[0]) for row in reader))
+        done = ledger.done(STAGE)
+    if done:
+        print(f"Resuming, {len(done)} PRs already collected")
+    return done
+
+# Files from before Type of Change was collected here can't be appended to
+def check_header(path):
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        if next(csv.reader(f), CSV_HEADER) != CSV_HEADER:
+            raise RuntimeError(f"{path} has different columns to {CSV_HEADER}, move it aside and rerun to rebuild it.")
 
 # Save buffered data to CSV
 def save_buffered_data():
     mode = ""
-    print("Checkpoint reached.")
+    print(f"Checkpoint reached. {metrics.progress(STAGE)}")
     if buffer:
         if os.path.exists("data/pull_requests_all.csv"):
             mode = "a" 
             print("Found existing file.")
+            check_header("data/pull_requests_all.csv")
         else: 
             mode = "w"
             print("Creating new file.")
         with open("data/pull_requests_all.csv", mode, newline="", encoding="utf-8") as file:
             writer = csv.writer(file)
             if mode == "w":
-                writer.writerow(["PR Number", "Title", "Author", "Integration", "Created At", "Updated At", "State", 
-                                 "Files Changed", "Decision Time", "Closed Date", "URL"])
+                writer.writerow(CSV_HEADER)
             writer.writerows(buffer)  # Write all buffered rows at once
+        ledger.mark_done(STAGE, [row[0] for row in buffer])  # only marked once they're on disk
+        done_prs.update(row[0] for row in buffer)   # so a page fetched again after a token switch isn't saved twice
         buffer.clear()  # Clear buffer after writing
 
+# Gather the CSV row for a single PR
+def pr_row(pr):
+    return [
+        pr.number,
+        pr.title,
+        pr.user.login,  # author
+        next((label.name.split(": ")[-1] for label in pr.labels if "integration:" in label.name), ""),  # integration name
+        pr.created_at, 
+        pr.updated_at, 
+        "merged" if pr.merged else "closed", 
+        pr.changed_files, 
+        (pr.closed_at - pr.created_at).days, 
+        pr.closed_at,
+        pr.html_url,
+        extract_type_of_change(pr.body)     # checked boxes from the PR template, no need to fetch the HTML page
+    ]
+
 # Main function to collect PR metadata
 def collect_pr_metadata():
-    global current_pr_number
-    start_date = datetime(2021, 1, 1, tzinfo=timezone.utc)  # Set start date as timezone-aware in UTC
-    end_date = datetime(2024, 10, 31, tzinfo=timezone.utc)  # Set end date as timezone-aware in UTC
+    global done_prs
+    start_date = START_DATE
+    end_date = END_DATE
     g = get_github_instance()
-    repo = g.get_repo("home-assistant/core")
+    pulls = g.get_repo("home-assistant/core").get_pulls(state='closed', sort='created', direction='desc')
+    page_number = 0
     
-    current_pr_number = load_last_pr() or 0
+    done_prs = load_done_prs()
+    metrics.start_stage(STAGE)  # the serial crawl can't know how many PRs are left
     
     try:
-        for pr in repo.get_pulls(state='closed', sort='created', direction='desc'):
-            
-            # Rotate token or wait if rate limit is exceeded
-            g = handle_rate_limit(g)
+        while True:
+            # Switch token or wait if rate limit is close, the listing has to be re-created on the new token
+            new_g = handle_rate_limit(g)
+            if new_g is not g:
+                g = new_g
+                pulls = g.get_repo("home-assistant/core").get_pulls(state='closed', sort='created', direction='desc')
 
-            # Skip already processed PRs
-            if (pr.number >= current_pr_number) and current_pr_number != 0:
-                continue
+            try:
+                started = time.perf_counter()
+                page = pulls.get_page(page_number)
+                metrics.observe_request(PULLS_URL, 200, time.perf_counter() - started)
+                if not page:
+                    break
 
-            # Skip PRs created after October 2024
-            if pr.created_at > end_date:
-                continue
-            
-            # Skip PRs created before 2021
-            if pr.created_at < start_date:
-                save_buffered_data()  # Save any remaining data in the buffer
-                return  # Exit function once we reach PRs created before 2021
-            
-            # Gather PR data
-            pr_data = [
-                pr.number,
-                pr.title,
-                pr.user.login,  # author
-                next((label.name.split(": ")[-1] for label in pr.labels if "integration:" in label.name), ""),  # integration name
-                pr.created_at, 
-                pr.updated_at, 
-                "merged" if pr.merged else "closed", 
-                pr.changed_files, 
-                (pr.closed_at - pr.created_at).days, 
-                pr.closed_at,
-                pr.html_url
-            ]
-            
-            buffer.append(pr_data)  # Add PR data to buffer                
-            # Save buffer if it reaches the BATCH_SIZE
-            if len(buffer) >= BATCH_SIZE:
+                for pr in page:
+                    if process_pr(pr, start_date, end_date) is False:
+                        save_buffered_data()  # Save any remaining data in the buffer
+                        return  # Exit function once we reach PRs created before 2021
+            except RateLimitExceededException as e:
+                # Take the token out of rotation and fetch the page again with another one
+                print("Token rate limit exceeded, switching to the token with the most headroom.")
+                metrics.observe_retry(PULLS_URL, "rate_limited")
+                pool.mark_exhausted(current_token, e.headers)
                 save_buffered_data()
+                g = get_github_instance()
+                pulls = g.get_repo("home-assistant/core").get_pulls(state='closed', sort='created', direction='desc')
+                continue
+            page_number += 1
 
-            current_pr_number = pr.number  # Update last processed PR
+        save_buffered_data()
 
     except Exception as e:
         print(f"An error occurred: {e}. Saving progress and exiting.")
         save_buffered_data()  # Save remaining buffer on exception
 
+# Buffer a single PR from the serial crawl, returns False once PRs are older than the collection window
+def process_pr(pr, start_date, end_date):
+    # Skip already processed PRs
+    if pr.number in done_prs:
+        return
+
+    # Skip PRs created after October 2024
+    if pr.created_at > end_date:
+        return
+    
+    # Skip PRs created before 2021
+    if pr.created_at < start_date:
+        return False  # Stop once we reach PRs created before 2021
+    
+    # Gather PR data
+    try:
+        pr_data = pr_row(pr)
+    except RateLimitExceededException:
+        raise
+    except Exception as e:
+        print(f"Error occurred on PR #{pr.number}: {e}")
+        ledger.mark_failed(STAGE, pr.number, e)
+        return
+    
+    buffer.append(pr_data)  # Add PR data to buffer                
+    # Save buffer if it reaches the BATCH_SIZE
+    if len(buffer) >= BATCH_SIZE:
+        save_buffered_data()
+
+# Re-fetch only the PRs recorded as failed in the progress ledger
+def retry_failed_prs(sharded=False):
+    failed = ledger.failed(STAGE)
+    print(f"Retrying {len(failed)} failed PRs...")
+    metrics.start_stage(STAGE, len(failed))
+    g = get_github_instance()
+    repo = g.get_repo("home-assistant/core")
+
+    for pr_number in failed:
+        while True:     # until the PR is fetched or fails for a reason other than the token's rate limit
+            new_g = handle_rate_limit(g)
+            if new_g is not g:
+                g = new_g
+                repo = g.get_repo("home-assistant/core")
+            try:
+                buffer.append(pr_row(repo.get_pull(pr_number)))
+            except RateLimitExceededException as e:
+                print("Token rate limit exceeded, switching to the token with the most headroom.")
+                pool.mark_exhausted(current_token, e.headers)
+                g = get_github_instance()
+                repo = g.get_repo("home-assistant/core")
+                continue
+            except Exception as e:
+                print(f"Error occurred on PR #{pr_number}: {e}")
+                ledger.mark_failed(STAGE, pr_number, e)
+            break
+        if len(buffer) >= BATCH_SIZE and not sharded:
+            save_buffered_data()
+
+    if sharded:     # pull_requests_all.csv is rebuilt from the shards, so retried rows have to go into them
+        add_to_shards(buffer)
+        buffer.clear()
+        merge_shards()
+    else:
+        save_buffered_data()
+
+# Split the collection window into calendar-month (first day, last day) shards
+def monthly_shards(start_date=START_DATE, end_date=END_DATE):
+    shards = []
+    shard_start = start_date.date()
+    while shard_start <= end_date.date():
+        next_month = (shard_start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        shards.append((shard_start, min(next_month - timedelta(days=1), end_date.date())))
+        shard_start = next_month
+    return shards
+
+def shard_path(shard_start):
+    return os.path.join(SHARD_DIR, f"pull_requests_{shard_start:%Y-%m}.csv")
+
+# The PRs of a shard collected before its crawl was interrupted, so retrying it doesn't fetch them again
+def partial_shard_path(shard_start):
+    return shard_path(shard_start) + ".partial"
+
+def search_closed_prs(g, shard_start, shard_end):
+    query = f"repo:home-assistant/core is:pr is:closed created:{shard_start:%Y-%m-%d}..{shard_end:%Y-%m-%d}"
+    return g.search_issues(query, sort="created", order="desc")
+
+# Crawl every PR created within a shard into rows; windows that exceed the search result limit are halved until
+# they fit. PRs already in rows (from an interrupted crawl of the shard) are skipped without fetching them again
+def crawl_shard(g, shard_start, shard_end, rows):
+    results = search_closed_prs(g, shard_start, shard_end)
+    if results.totalCount >= SEARCH_RESULT_LIMIT and shard_start < shard_end:
+        midpoint = shard_start + timedelta(days=(shard_end - shard_start).days // 2)
+        crawl_shard(g, shard_start, midpoint, rows)
+        crawl_shard(g, midpoint + timedelta(days=1), shard_end, rows)
+        return rows
+
+    collected = {row[0] for row in rows}
+    for issue in results:
+        if issue.number in collected:
+            continue
+        try:
+            pr = issue.as_pull_request()
+            if START_DATE <= pr.created_at <= END_DATE:     # same window as collect_pr_metadata
+                rows.append(pr_row(pr))
+        except RateLimitExceededException:
+            raise
+        except Exception as e:
+            print(f"Error occurred on PR #{issue.number}: {e}")
+            ledger.mark_failed(STAGE, issue.number, e)
+    return rows
+
+def write_rows(path, rows):
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    with open(path + ".tmp", "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        writer.writerows(rows)
+    os.replace(path + ".tmp", path)
+
+def read_rows(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", newline="", encoding="utf-8") as infile:
+        reader = csv.reader(infile)
+        next(reader)    # skip header
+        return [[int(row[0]), *row[1:4], datetime.fromisoformat(row[4]), *row[5:]] for row in reader]
+
+# Write a finished shard atomically, so a shard file only exists once it is complete
+def save_shard(shard_start, rows):
+    rows.sort(key=lambda row: (row[4], row[0]), reverse=True)   # newest first, like the serial crawl
+    write_rows(shard_path(shard_start), rows)
+    ledger.mark_done(STAGE, [row[0] for row in rows])
+    if os.path.exists(partial_shard_path(shard_start)):
+        os.remove(partial_shard_path(shard_start))
+
+# Add retried PRs to the shards of the months they were created in. A month whose crawl hasn't finished only
+# has a .partial file; the rows go in there, so the month stays pending and its crawl skips them when resumed
+def add_to_shards(rows):
+    by_month = {}
+    for row in rows:
+        by_month.setdefault(row[4].date().replace(day=1), []).append(row)
+
+    for shard_start, new_rows in by_month.items():
+        retried = {row[0] for row in new_rows}
+        if os.path.exists(shard_path(shard_start)):
+            save_shard(shard_start, [row for row in read_rows(shard_path(shard_start)) if row[0] not in retried] + new_rows)
+        else:
+            partial_rows = [row for row in read_rows(partial_shard_path(shard_start)) if row[0] not in retried]
+            write_rows(partial_shard_path(shard_start), partial_rows + new_rows)
+
+# Each worker crawls one shard at a time with whichever token has the most headroom
+def shard_worker(shards):
+    while True:
+        try:
+            shard_start, shard_end = shards.get_nowait()
+        except queue.Empty:
+            return
+
+        token = pool.acquire()  # only sleeps if every token is exhausted
+        g = github_client(token)
+        rows = read_rows(partial_shard_path(shard_start))   # resume an interrupted crawl of the shard
+        try:
+            crawl_shard(g, shard_start, shard_end, rows)
+            save_shard(shard_start, rows)
+            print(f"Shard {shard_start:%Y-%m} complete ({len(rows)} PRs). {metrics.progress(STAGE)}")
+        except RateLimitExceededException as e:
+            write_rows(partial_shard_path(shard_start), rows)
+            print(f"Token rate limit exceeded on shard {shard_start:%Y-%m}, resuming after its {len(rows)} PRs with another token.")
+            metrics.observe_retry(SEARCH_URL, "rate_limited")
+            pool.mark_exhausted(token, e.headers)
+            shards.put((shard_start, shard_end))
+            continue
+        except Exception as e:
+            write_rows(partial_shard_path(shard_start), rows)
+            print(f"An error occurred on shard {shard_start:%Y-%m}: {e}. It will be resumed on the next run.")
+
+        update_core_counts(g, token)
+
+# Record a token's core API headroom. g.rate_limiting is from the last response, which may have been a search,
+# whose limit (30 a minute) would be taken for the token's core limit and leave it below the reserve for good
+def update_core_counts(g, token):
+    try:
+        core = g.get_rate_limit().core     # /rate_limit doesn't count against the limit
+    except Exception as e:
+        print(f"Couldn't read the token's rate limit: {e}")
+        return
+    pool.update_counts(token, core.remaining, core.reset.timestamp(), core.limit)
+
+# Merge completed shards into pull_requests_all.csv, newest month first
+def merge_shards():
+    with open("data/pull_requests_all.csv", "w", newline="", encoding="utf-8") as outfile:
+        writer = csv.writer(outfile)
+        writer.writerow(CSV_HEADER)
+        for shard_start, _ in sorted(monthly_shards(), reverse=True):
+            if not os.path.exists(shard_path(shard_start)):
+                continue
+            check_header(shard_path(shard_start))
+            with open(shard_path(shard_start), "r", newline="", encoding="utf-8") as infile:
+                reader = csv.reader(infile)
+                next(reader)    # skip header
+                writer.writerows(reader)
+
+# Crawl the collection window as monthly shards in parallel, one worker per token
+def collect_pr_metadata_sharded():
+    shards = queue.Queue()
+    pending = [shard for shard in monthly_shards() if not os.path.exists(shard_path(shard[0]))]
+    print(f"{len(pending)} shards remaining.")
+    metrics.start_stage(STAGE)
+    for shard in pending:
+        shards.put(shard)
+
+    with ThreadPoolExecutor(max_workers=len(pool)) as executor:
+        workers = [executor.submit(shard_worker, shards) for _ in range(len(pool))]
+
+    merge_shards()
+    for worker in workers:
+        worker.result()     # re-raise whatever a worker died of, rather than report the collection complete
+
 # Run the script
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sharded', action='store_true', help="crawl monthly shards in parallel, one worker per token")
+    parser.add_argument('--retry-failed', action='store_true', help="only re-fetch PRs recorded as failed in the progress ledger")
+    args = parser.parse_args()
+
     print("Starting data collection...")
-    collect_pr_metadata()
+    if args.retry_failed:
+        retry_failed_prs(args.sharded)
+    elif args.sharded:
+        collect_pr_metadata_sharded()
+    else:
+        collect_pr_metadata()
     print("Data collection complete. Results saved to data/pull_requests_all.csv.")
@@ -1,32 +1,34 @@
+import argparse
 import csv
+import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 import os
+import time
+
+from github_api import HTML_URL
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from sidecars import append_sidecar, sidecar_exists, sidecar_path
 
 buffer = []  # Buffer for batching PR data
 BATCH_SIZE = 100  # Save every x PRs
+STAGE = "checkbox"   # progress ledger stage name
+LEGACY_OUTPUT_PATH = "data/pull_requests_all_with_checkbox_data.csv"   # full rows written before the sidecar
+
+ledger = ProgressLedger()
 
-# Save buffered data to CSV
+# Append buffered checkboxes to the stage's sidecar
 def save_buffered_data():
-    print("Checkpoint reached")
-    mode = ""
-    if buffer:
-        if os.path.exists("data/pull_requests_all_with_checkbox_data.csv"):
-            mode = "a"  
-            print("Found existing file.")
-        else:
-            mode = "w"
-        with open("data/pull_requests_all_with_checkbox_data.csv", mode, newline="", encoding="utf-8") as file:
-            writer = csv.writer(file)
-            if mode == "w":
-                writer.writerow(["PR Number", "Title", "Author", "Integration", "Created At", "Updated At", "State", 
-                                 "Files Changed", "Decision Time", "Closed Date", "URL", "Type of Change"])
-            writer.writerows(buffer)  # Write all buffered rows at once
-        buffer.clear()  # Clear buffer after writing
+    print(f"Checkpoint reached. {metrics.progress(STAGE)}")
+    append_sidecar(STAGE, pd.DataFrame(buffer, columns=["PR Number", "Type of Change"]), ledger)  # only marked once they're on disk
+    buffer.clear()  # Clear buffer after writing
 
 # Scrape type of change checkboxes from PR HTML
 def get_pr_checkbox_data(pr_html_url):
+    started = time.perf_counter()
     response = requests.get(pr_html_url)
+    metrics.observe_request(pr_html_url, response.status_code, time.perf_counter() - started, len(response.content))
     if response.status_code == 200:
         soup = BeautifulSoup(response.text, 'html.parser')
         type_of_change_section = soup.find('ul', class_='contains-task-list')
@@ -42,54 +44,37 @@ def get_pr_checkbox_data(pr_html_url):
 
         return ", ".join(checked_items) if checked_items else None
     else:
-        print(f"Failed to retrieve {pr_html_url}. Status code: {response.status_code}")
-        return None
+        raise RuntimeError(f"Failed to retrieve {pr_html_url}. Status code: {response.status_code}")
 
 
-# Load last PR number from output CSV if it exists, otherwise fallback to progress file
-def get_last_processed_pr():
-    last_pr = None
-    if os.path.exists("data/pull_requests_all_with_checkbox_data.csv"):
-        with open("data/pull_requests_all_with_checkbox_data.csv", mode="r", encoding="utf-8") as f:
-            last_row = list(csv.reader(f))[-1]
-            last_pr = int(last_row[0])
-    return last_pr
+# Load the PRs already saved from the progress ledger; output written before the sidecar existed is moved into it once
+def get_processed_prs():
+    if os.path.exists(LEGACY_OUTPUT_PATH) and not sidecar_exists(STAGE):
+        append_sidecar(STAGE, pd.read_csv(LEGACY_OUTPUT_PATH, usecols=["PR Number", "Type of Change"]), ledger)
+    return ledger.done(STAGE)
 
 
 # Process PRs and add checkbox data
-def add_checkbox_data():
-    last_processed_pr = get_last_processed_pr()
+def add_checkbox_data(retry_failed=False):
+    processed_prs = get_processed_prs()
+    failed_prs = set(ledger.failed(STAGE))
     
     # Read the CSV into a list and sort in descending order of PR numbers
     with open("data/pull_requests_all.csv", mode="r", encoding="utf-8") as infile:
         reader = list(csv.DictReader(infile))
         reader.sort(key=lambda row: int(row["PR Number"]), reverse=True)
 
-    for row in reader:
-        pr_number = int(row["PR Number"])
+    # Skip PRs we've already processed, or everything but the failed ones when retrying
+    rows = [row for row in reader if not (int(row["PR Number"]) in processed_prs or (retry_failed and int(row["PR Number"]) not in failed_prs))]
+    metrics.start_stage(STAGE, len(rows))
 
-        # Skip PRs we've already processed
-        if last_processed_pr and pr_number >= last_processed_pr:
-            continue
+    for row in rows:
+        pr_number = int(row["PR Number"])
 
         # Collect PR data and checkbox data
         try:
-            type_of_change = get_pr_checkbox_data(row["URL"])
-            pr_data = [
-                pr_number,
-                row["Title"],
-                row["Author"],
-                row["Integration"],
-                row["Created At"],
-                row["Updated At"],
-                row["State"],
-                row["Files Changed"],
-                row["Decision Time"],
-                row["Closed Date"],
-                row["URL"],
-                type_of_change,
-            ]
-            buffer.append(pr_data)  # Add PR data to buffer
+            type_of_change = get_pr_checkbox_data(row["URL"].replace("https://github.com", HTML_URL))
+            buffer.append([pr_number, type_of_change])  # Add PR data to buffer
 
             # Save buffer if it reaches the BATCH_SIZE
             if len(buffer) >= BATCH_SIZE:
@@ -98,6 +83,7 @@ def add_checkbox_data():
         
         except Exception as e:
             print(f"Error occurred: {e}")
+            ledger.mark_failed(STAGE, pr_number, e)
             save_buffered_data()
 
 
@@ -105,6 +91,10 @@ def add_checkbox_data():
     save_buffered_data()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retry-failed', action='store_true', help="only re-fetch PRs recorded as failed in the progress ledger")
+    args = parser.parse_args()
+
     print("Starting Part 2: Adding checkbox data to PR metadata...")
-    add_checkbox_data()
-    print("Checkbox data added. Results saved to data/pull_requests_all_with_checkbox_data.csv.")
+    add_checkbox_data(args.retry_failed)
+    print(f"Checkbox data added. Results saved to {sidecar_path(STAGE)}, filter_prs.py joins them into the PRs.")
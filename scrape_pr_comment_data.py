@@ -1,140 +1,131 @@
-from datetime import datetime, timezone
-import time
-from typing import TypedDict, Dict, List
-from dotenv import load_dotenv
-from os import environ
+import argparse
+import asyncio
+from typing import Dict, List
 import pandas as pd
-import requests
-from collections import defaultdict
-
-load_dotenv()
-tokens = environ.get("GITHUB_PATS").split(",")
-current_token_index = 0
-
-class Comment(TypedDict):
-    id: int
-    type: str
-    timestamp: str  
-    body: str
-    is_from_author: bool
-    diff_hunk: str
-
-def rotate_token():
-    global current_token_index
-    current_token_index = (current_token_index + 1) % len(tokens)
-    response = requests.get("https://api.github.com/rate_limit", headers={"Authorization": f"Bearer {tokens[current_token_index]}"})
-    data = response.json()
-    if (data['resources']['core']['remaining'] == 0):
-        reset_time = datetime.fromtimestamp(data['resources']['core']['reset'], tz=timezone.utc)
-        wait_time = (reset_time - datetime.now(timezone.utc)).total_seconds()
-        print('reset time', reset_time)
-        print('wait time', wait_time)
-        time.sleep(wait_time)
+import httpx
 
-def fetch_issue_comments(pr_number: int, author: str) -> list[Dict]:
-    response = requests.get(f"https://api.github.com/repos/home-assistant/core/issues/{pr_number}/comments", headers={"Authorization": f"Bearer {tokens[current_token_index]}"})
-
-    if response.status_code == 200:
-        # return [{'type': 'issue', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['user']['login'] == author} for comment in response.json() if comment['user']['type'] != 'Bot']
-        return [{**comment, 'is_from_author': comment['user']['login'] == author} for comment in response.json() if comment['user']['type'] != 'Bot']
-    if response.status_code in [403, 429]:  # rate limit reached
-        rotate_token()
-        return fetch_issue_comments(pr_number, author) # retry
-    
-    print(f"Failed to fetch issue comments for PR {pr_number}. Status code: {response.status_code}")
-    return []
+from comment_threads import Comment, build_reply_thread, order_comments, organize_issue_comments, organize_review_comments
+from comments_store import DATASET_PATH, append_comments_dataset
+from github_api import API_URL, REPO, get_all_pages, get_all_pages_async
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from sidecars import append_sidecar
 
-def fetch_review_comments(pr_number: int, author: str) -> list[Dict]:
-    response = requests.get(f"https://api.github.com/repos/home-assistant/core/pulls/{pr_number}/comments", headers={"Authorization": f"Bearer {tokens[current_token_index]}"})
-
-    if response.status_code == 200:
-        return [{**comment, 'is_from_author': comment['user']['login'] == author} for comment in response.json() if comment['user']['type'] != 'Bot']
-    
-    if response.status_code in [403, 429]:  # rate limit reached
-        rotate_token()
-        return fetch_review_comments(pr_number, author) # retry
-        
-    print(f"Failed to fetch review comments for PR {pr_number}. Status code: {response.status_code}")
-    return []
-
-def organize_review_comments(review_comments: List[Dict], reply_map: Dict[int, List[Comment]], top_level_comments: List[Dict]):
-    for comment in review_comments:
-        if 'in_reply_to_id' in comment:
-            parent_id = comment['in_reply_to_id']
-            reply_map[parent_id].append(
-                {'id': comment['id'], 'type': 'review', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author'], 'diff_hunk': comment['diff_hunk']}
-            )
-        else:
-            top_level_comments.append(
-                {'id': comment['id'], 'type': 'review', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author'], 'diff_hunk': comment['diff_hunk']}
-            )
-
-def organize_issue_comments(issue_comments: List[Dict], top_level_comments: List[Comment]):
-    for comment in issue_comments:
-        top_level_comments.append(
-            {'id': comment['id'], 'type': 'issue', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['is_from_author']}
-        )
+MAX_CONCURRENT_REQUESTS = 8
+BATCH_SIZE = 100  # Save every x PRs
+STAGE = "comments"   # progress ledger stage name
 
-def build_reply_thread(comment: Comment, reply_map: Dict[int, List[Comment]]) -> Dict:
-    thread = {
-        'type': 'review',
-        'diff_hunk': comment['diff_hunk'],
-        'comment': {k: v for k, v in comment.items() if k not in ['diff_hunk', 'type']},
-        'replies': []
-    }
-
-    if comment['id'] in reply_map:
-        replies = sorted(
-            reply_map[comment['id']],
-            key=lambda comment: comment['timestamp']
-        )
+# Number of comments in a PR's ordered threads, counting every reply (issue comments have none)
+def count_comments(threads) -> int:
+    return sum(1 + len(thread.get('replies', ())) for thread in threads)
 
-        for reply in replies:
-            thread['replies'].append({k: v for k, v in reply.items() if k not in ['diff_hunk', 'type']})
-            if reply['id'] in reply_map:
-                thread['replies'].extend(build_reply_thread(reply, reply_map)['replies'])
+def without_bots(comments: List[Dict], author: str) -> List[Dict]:
+    return [{**comment, 'is_from_author': comment['user']['login'] == author} for comment in comments if comment['user']['type'] != 'Bot']
 
-    return thread
+def fetch_issue_comments(pr_number: int, author: str) -> list[Dict]:
+    comments = get_all_pages(f"{API_URL}/repos/{REPO}/issues/{pr_number}/comments")
+    if comments is None:
+        raise RuntimeError(f"Failed to fetch issue comments for PR {pr_number}.")
+    # return [{'type': 'issue', 'timestamp': comment['created_at'], 'body': comment['body'], 'is_from_author': comment['user']['login'] == author} for comment in response.json() if comment['user']['type'] != 'Bot']
+    return without_bots(comments, author)
 
-def add_ordered_comments_to_df(df: pd.DataFrame):
+def fetch_review_comments(pr_number: int, author: str) -> list[Dict]:
+    comments = get_all_pages(f"{API_URL}/repos/{REPO}/pulls/{pr_number}/comments")
+    if comments is None:
+        raise RuntimeError(f"Failed to fetch review comments for PR {pr_number}.")
+    return without_bots(comments, author)
+
+async def fetch_pr_comments_async(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, pr_number: int, author: str):
+    issue_comments, review_comments = await asyncio.gather(
+        get_all_pages_async(client, semaphore, f"{API_URL}/repos/{REPO}/issues/{pr_number}/comments"),
+        get_all_pages_async(client, semaphore, f"{API_URL}/repos/{REPO}/pulls/{pr_number}/comments"),
+    )
+    if issue_comments is None:
+        raise RuntimeError(f"Failed to fetch issue comments for PR {pr_number}.")
+    if review_comments is None:
+        raise RuntimeError(f"Failed to fetch review comments for PR {pr_number}.")
+    return without_bots(issue_comments, author), without_bots(review_comments, author)
+
+# Adds a 'Comments' column (None for PRs that failed) and returns the failures as {PR number: error}
+def add_ordered_comments_to_df(df: pd.DataFrame) -> Dict[int, str]:
     comments = []
     comment_counts = []
+    failures = {}
 
     for pr_number, pr_author in zip(df['PR Number'], df['Author']):
-        reply_map: Dict[int, List[Comment]] = defaultdict(list)
-        top_level_comments: List[Comment] = []
-
         try:
             issue_comments = fetch_issue_comments(pr_number, pr_author)
             review_comments = fetch_review_comments(pr_number, pr_author)
 
-            organize_review_comments(review_comments, reply_map, top_level_comments)
-            organize_issue_comments(issue_comments, top_level_comments)
-
-            top_level_comments.sort(key=lambda comment: comment['timestamp'])
-
-            ordered_comments = []
-            for comment in top_level_comments:
-                if comment['type'] == 'review':
-                    ordered_comments.append(build_reply_thread(comment, reply_map))
-                else:
-                    ordered_comments.append({'type': 'issue', 'comment': comment})
-
             comment_counts.append(len(issue_comments) + len(review_comments))
-            comments.append(ordered_comments)
+            comments.append(order_comments(issue_comments, review_comments))
 
         except Exception as e:
             print(f"Error occurred: {e}")
+            comments.append(None)   # keep rows aligned with the dataframe
+            failures[pr_number] = str(e)
 
     # df['Total Comments'] = comment_counts
     df['Comments'] = comments
+    return failures
 
-if __name__ == "__main__":
-    df = pd.read_csv('data/pull_requests_filtered.csv')
-    add_ordered_comments_to_df(df)
-    df.to_csv('data/pull_requests_filtered_test.csv', index=False)
+# Same as add_ordered_comments_to_df, but fetches comments for many PRs at once
+async def add_ordered_comments_to_df_async(df: pd.DataFrame, concurrency: int = MAX_CONCURRENT_REQUESTS) -> Dict[int, str]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=30) as client:
+        results = await asyncio.gather(
+            *(fetch_pr_comments_async(client, semaphore, pr_number, pr_author) for pr_number, pr_author in zip(df['PR Number'], df['Author'])),
+            return_exceptions=True
+        )
 
-    
-    
+    comments = []
+    failures = {}
+    for pr_number, result in zip(df['PR Number'], results):
+        if isinstance(result, Exception):
+            print(f"Error occurred for PR {pr_number}: {result}")
+            comments.append(None)
+            failures[pr_number] = str(result)
+            continue
+        issue_comments, review_comments = result
+        comments.append(order_comments(issue_comments, review_comments))
 
-    
+    df['Comments'] = comments
+    return failures
+
+# Scrape in batches, appending each finished batch to the dataset so progress survives a crash
+def scrape_comments(df: pd.DataFrame, use_async: bool = False, concurrency: int = MAX_CONCURRENT_REQUESTS, retry_failed: bool = False):
+    ledger = ProgressLedger()
+    if retry_failed:
+        df = df[df['PR Number'].isin(ledger.failed(STAGE))]
+    else:
+        df = df[~df['PR Number'].isin(ledger.done(STAGE))]
+    print(f"{len(df)} PRs to scrape.")
+    metrics.start_stage(STAGE, len(df))
+
+    for start in range(0, len(df), BATCH_SIZE):
+        batch = df.iloc[start:start + BATCH_SIZE].copy()
+        if use_async:
+            failures = asyncio.run(add_ordered_comments_to_df_async(batch, concurrency))
+        else:
+            failures = add_ordered_comments_to_df(batch)
+
+        scraped = batch[~batch['PR Number'].isin(failures)]
+        if len(scraped):
+            append_comments_dataset(scraped)
+            counts = pd.DataFrame({'PR Number': scraped['PR Number'], 'Total Comments': scraped['Comments'].map(count_comments)})
+            append_sidecar(STAGE, counts, ledger)     # only marked once both are on disk
+        for pr_number, error in failures.items():
+            ledger.mark_failed(STAGE, pr_number, error)
+        print(f"Checkpoint reached. {metrics.progress(STAGE)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--async', dest='use_async', action='store_true', help="fetch comments for many PRs concurrently")
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENT_REQUESTS, help="max requests in flight in --async mode")
+    parser.add_argument('--retry-failed', action='store_true', help="only re-fetch PRs recorded as failed in the progress ledger")
+    args = parser.parse_args()
+
+    df = pd.read_csv('data/pull_requests_filtered.csv')
+    scrape_comments(df, args.use_async, args.concurrency, args.retry_failed)
+    print(f"Comments saved to {DATASET_PATH}/")
@@ -1,59 +1,63 @@
+import argparse
+from typing import List, Tuple
 
-from datetime import datetime, timezone
-import time
-from dotenv import load_dotenv
-from os import environ
 import pandas as pd
-import requests
 
-load_dotenv()
-tokens = environ.get("GITHUB_PATS").split(",")
-current_token_index = 0
+from github_api import API_URL, REPO, get_all_pages
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from sidecars import append_sidecar, sidecar_path
 
-def rotate_token():
-    global current_token_index
-    current_token_index = (current_token_index + 1) % len(tokens)
-    response = requests.get("https://api.github.com/rate_limit", headers={"Authorization": f"Bearer {tokens[current_token_index]}"})
-    data = response.json()
-    if (data.resources.core.remaining == 0):
-        wait_time = (data.resources.core.reset - datetime.now(timezone.utc)).total_seconds()
-        time.sleep(wait_time)
+STAGE = "loc"   # progress ledger stage name
+BATCH_SIZE = 100  # Save every x PRs
 
 def fetch_loc_changed(pr_number: int) -> int:
-    response = requests.get(f"https://api.github.com/repos/home-assistant/core/pulls/{pr_number}/files")
-    if response.status_code == 200:
-        return sum([file.changes for file in response.json()])
-    if response.status_code in [403, 429]:  # rate limit reached
-        rotate_token()
-        return fetch_loc_changed(pr_number) # retry
-    
-    print(f"Failed to fetch LOC changed for PR {pr_number}. Status code: {response.status_code}")
+    files = get_all_pages(f"{API_URL}/repos/{REPO}/pulls/{pr_number}/files")
+    if files is not None:
+        return sum([file['changes'] for file in files])
+
+    print(f"Failed to fetch LOC changed for PR {pr_number}.")
     return -1
 
 
-def add_loc_to_df(df: pd.DataFrame) -> None:
-    batch_count = 0
+# Append the batch's LOC to the stage's sidecar; failed PRs are saved as -1 until a retry replaces them
+def save_checkpoint(rows: List[Tuple[int, int]], ledger: ProgressLedger) -> None:
+    append_sidecar(STAGE, pd.DataFrame(rows, columns=['PR Number', 'LOC Changed']))
+    ledger.mark_done(STAGE, [pr_number for pr_number, changes in rows if changes != -1])     # only marked once they're on disk
+    rows.clear()
+    print(metrics.progress(STAGE))
+
+def scrape_loc_changed(df: pd.DataFrame, retry_failed: bool = False) -> None:
+    ledger = ProgressLedger()
+    done = ledger.done(STAGE)
+    failed = set(ledger.failed(STAGE))
+    # Skip PRs we've already processed, or everything but the failed ones when retrying
+    pr_numbers = [pr_number for pr_number in df['PR Number'] if not (pr_number in done or (retry_failed and pr_number not in failed))]
+    metrics.start_stage(STAGE, len(pr_numbers))
+
+    batch = []
+    for pr_number in pr_numbers:
 
-    loc_changed = []
-    for pr_number in df['PR Number']:
         try:
             changes = fetch_loc_changed(pr_number)
-            loc_changed.append(changes)
+            batch.append((pr_number, changes))
+            if changes == -1:
+                ledger.mark_failed(STAGE, pr_number, "Failed to fetch files")
 
-            batch_count += 1
-            if batch_count >= 100:
-                df['LOC Changed'] = loc_changed
-                df.to_csv('data/pull_requests_filtered.csv', index=False)
-                batch_count = 0
+            if len(batch) >= BATCH_SIZE:
+                save_checkpoint(batch, ledger)
 
         except Exception as e:
             print(f"Error occurred: {e}")
-            df['LOC Changed'] = loc_changed
-            df.to_csv('data/pull_requests_filtered.csv', index=False)
-    
-    df['LOC Changed'] = loc_changed
+            ledger.mark_failed(STAGE, pr_number, e)
+
+    save_checkpoint(batch, ledger)   # final save for remaining records that didn't reach batch_count limit
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retry-failed', action='store_true', help="only re-fetch PRs recorded as failed in the progress ledger")
+    args = parser.parse_args()
+
     df = pd.read_csv('data/pull_requests_filtered.csv')
-    add_loc_to_df(df)
-    df.to_csv('data/pull_requests_filtered.csv', index=False)   # final save for remaining records that didn't reach batch_count limit
+    scrape_loc_changed(df, args.retry_failed)
+    print(f"LOC changed saved to {sidecar_path(STAGE)}, run `python sidecars.py` to join it into data/pull_requests_filtered.csv")
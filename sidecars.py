@@ -0,0 +1,73 @@
+"""
+Append-only sidecar files for the stages that enrich the PRs with extra columns, keyed by PR number.
+
+Each stage (LOC changed, type of change checkboxes, comment counts, the author and integration refresh, and
+webhook_receiver's rows for PRs changed since the crawl) appends the rows it has finished to
+data/sidecars/<stage>.csv at every checkpoint, instead of rewriting the table it enriches, so a checkpoint
+costs time in proportion to its new rows and the stages can run independently of each other. A PR that's fetched again (e.g. with --retry-failed) is appended again, and its
+last row wins.
+
+join_sidecars builds the analysis table from them: the PRs with each stage's columns merged in, a sidecar's
+value replacing the one already in the table. filter_prs joins them when it writes
+data/pull_requests_filtered.csv; run this as a script to rebuild that file after the enrichment stages:
+
+    python sidecars.py
+"""
+
+import os
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+from progress_ledger import ProgressLedger
+
+SIDECAR_DIR = "data/sidecars"
+FILTERED_PATH = "data/pull_requests_filtered.csv"
+SIDECAR_STAGES = ["checkbox", "authors", "loc", "comments", "webhook"]    # joined in this order, so webhook events win
+
+
+def sidecar_path(stage: str, path: str = SIDECAR_DIR) -> str:
+    return os.path.join(path, f"{stage}.csv")
+
+def sidecar_exists(stage: str, path: str = SIDECAR_DIR) -> bool:
+    return os.path.exists(sidecar_path(stage, path))
+
+# Append a stage's finished rows ('PR Number' and the stage's columns), marking them done once they're on disk
+def append_sidecar(stage: str, rows: pd.DataFrame, ledger: Optional[ProgressLedger] = None, path: str = SIDECAR_DIR) -> None:
+    if rows.empty:
+        return
+    os.makedirs(path, exist_ok=True)
+    output_path = sidecar_path(stage, path)
+    rows.to_csv(output_path, mode='a', header=not os.path.exists(output_path), index=False)
+    if ledger is not None:
+        ledger.mark_done(stage, rows['PR Number'])
+
+# A stage's latest row for each PR
+def read_sidecar(stage: str, path: str = SIDECAR_DIR) -> pd.DataFrame:
+    return pd.read_csv(sidecar_path(stage, path)).drop_duplicates('PR Number', keep='last')
+
+def join_sidecars(df: pd.DataFrame, stages: Sequence[str] = SIDECAR_STAGES, path: str = SIDECAR_DIR) -> pd.DataFrame:
+    df = df.copy()
+    for stage in stages:
+        if not sidecar_exists(stage, path):
+            continue
+        sidecar = read_sidecar(stage, path).set_index('PR Number')
+        joined = df[['PR Number']].join(sidecar, on='PR Number')
+        for column in sidecar.columns:
+            df[column] = joined[column].combine_first(df[column]) if column in df.columns else joined[column]
+    return df
+
+def joined_stages(path: str = SIDECAR_DIR) -> List[str]:
+    return [stage for stage in SIDECAR_STAGES if sidecar_exists(stage, path)]
+
+# Rewrite the filtered PRs with every sidecar joined in; the only step that rewrites the whole table
+def build_analysis_table(table_path: str = FILTERED_PATH, path: str = SIDECAR_DIR) -> pd.DataFrame:
+    df = join_sidecars(pd.read_csv(table_path), path=path)
+    df.to_csv(f"{table_path}.tmp", index=False)
+    os.replace(f"{table_path}.tmp", table_path)
+    return df
+
+
+if __name__ == "__main__":
+    df = build_analysis_table()
+    print(f"Joined {', '.join(joined_stages()) or 'no sidecars'} into {len(df)} PRs, saved to {FILTERED_PATH}")
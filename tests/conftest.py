@@ -0,0 +1,11 @@
+import pytest
+
+import github_api
+from pipeline_metrics import metrics
+
+
+# Keep the metrics snapshots and the response cache of test runs out of the repository's data/
+@pytest.fixture(autouse=True, scope="session")
+def scratch_outputs(tmp_path_factory):
+    metrics.path = str(tmp_path_factory.mktemp("metrics"))
+    github_api.set_cache(None)
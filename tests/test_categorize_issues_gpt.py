@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import httpx
+from openai import AsyncOpenAI
+import pandas as pd
+
+from categorize_issues_gpt import PROMPT_VERSION, categorize_df, gpt_categorize_challenges_async
+from completion_cache import CompletionCache
+from progress_ledger import ProgressLedger
+
+CONVERSATION = "(from reviewer) [2024-03-01T00:00:00Z] Please add a test for the config flow."
+
+
+def completion(categories):
+    content = json.dumps({"categories": categories})
+    return {"id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]}
+
+def openai_client(handler):
+    return AsyncOpenAI(api_key="test", base_url="http://openai.test/v1", max_retries=0, http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_completions_are_cached_by_conversation_model_and_prompt(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content)["model"])
+        return httpx.Response(200, json=completion(["Testing Issues"]))
+
+    async def run():
+        async_client = openai_client(handler)
+        cache = CompletionCache(str(tmp_path / "completions.sqlite"))
+        semaphore = asyncio.Semaphore(1)
+        first = await gpt_categorize_challenges_async(async_client, semaphore, cache, CONVERSATION, "gpt-4o-mini")
+        again = await gpt_categorize_challenges_async(async_client, semaphore, cache, CONVERSATION, "gpt-4o-mini")
+        other_model = await gpt_categorize_challenges_async(async_client, semaphore, cache, CONVERSATION, "gpt-4o")
+        return first, again, other_model, cache.get(CONVERSATION, "gpt-4o-mini", PROMPT_VERSION + 1)
+
+    first, again, other_model, other_prompt = asyncio.run(run())
+    assert first == again == other_model == ["Testing Issues"]
+    assert requests == ["gpt-4o-mini", "gpt-4o"]
+    assert other_prompt is None
+
+def test_completions_are_cached_per_tokenizer(tmp_path):
+    cache = CompletionCache(str(tmp_path / "completions.sqlite"))
+    cache.put(CONVERSATION, "gpt-4o-mini", PROMPT_VERSION, ["Testing Issues"], tokenizer="estimate/4-characters")
+    assert cache.get(CONVERSATION, "gpt-4o-mini", PROMPT_VERSION, tokenizer="estimate/4-characters") == ["Testing Issues"]
+    assert cache.get(CONVERSATION, "gpt-4o-mini", PROMPT_VERSION, tokenizer="tiktoken/o200k_base") is None
+
+def test_categorize_df_keeps_to_the_concurrency_limit(tmp_path):
+    in_flight, peak = 0, 0
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return httpx.Response(200, json=completion(["Other"]))
+
+    df = pd.DataFrame({"PR Number": range(1, 13), "Formatted Comments": [f"{CONVERSATION} ({i})" for i in range(12)]})
+    output_path = tmp_path / "categorized.csv"
+    failures = asyncio.run(categorize_df(df, concurrency=3, output_path=str(output_path), async_client=openai_client(handler),
+                                         cache=CompletionCache(str(tmp_path / "completions.sqlite")),
+                                         ledger=ProgressLedger(str(tmp_path / "progress.sqlite"))))
+
+    assert failures == {}
+    assert peak == 3
+    assert sorted(pd.read_csv(output_path)["PR Number"]) == list(range(1, 13))
@@ -0,0 +1,20 @@
+from codeowners import CodeownersIndex, parse_codeowners, pattern_to_regex
+
+
+def test_directory_star_matches_only_files_directly_inside():
+    regex = pattern_to_regex("docs/*")
+    assert regex.match("docs/getting-started.md")
+    assert not regex.match("docs/build/app.js")
+
+def test_directory_matches_everything_beneath():
+    for pattern in ("/homeassistant/components/hue/", "homeassistant/components/hue", "docs/**"):
+        regex = pattern_to_regex(pattern)
+        assert regex.match(pattern.strip("/").replace("**", "a") + "/sub/file.py"), pattern
+
+def test_unanchored_extension_matches_at_any_depth():
+    assert pattern_to_regex("*.js").match("homeassistant/components/frontend/app.js")
+
+def test_last_matching_rule_wins():
+    index = CodeownersIndex(parse_codeowners("docs/ @docs-team\ndocs/* @writer\n"))
+    assert index.owners("docs/index.md") == {"writer"}
+    assert index.owners("docs/api/index.md") == {"docs-team"}
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from comments_store import REMOVED, append_revisions, compact_comments_dataset, read_comments_dataset, write_comments_dataset
+
+THREADS = [{"type": "issue", "comment": {"id": 1, "timestamp": "2024-03-01T00:00:00Z", "body": "looks good", "is_from_author": False}}]
+
+
+def prs(numbers, title="scraped", created_at="2024-03-01 10:00:00+00:00"):
+    return pd.DataFrame([{"PR Number": number, "Title": title, "Created At": created_at, "comments": THREADS} for number in numbers])
+
+def test_latest_revision_of_a_pr_wins(tmp_path):
+    path = str(tmp_path / "comments")
+    write_comments_dataset(prs([1, 2, 3]), path)
+    append_revisions(prs([2], title="first revision"), path)
+    append_revisions(prs([2], title="second revision"), path)
+    append_revisions(pd.DataFrame({"PR Number": [3], "Created At": ["2024-03-01 10:00:00+00:00"], "comments": [[]], REMOVED: [True]}), path)
+
+    df = read_comments_dataset(path).set_index("PR Number")
+    assert sorted(df.index) == [1, 2]
+    assert df.at[2, "Title"] == "second revision"
+    assert REMOVED not in df.columns
+
+def test_compaction_folds_revisions_into_the_partitions(tmp_path):
+    path = str(tmp_path / "comments")
+    write_comments_dataset(pd.concat([prs([1, 2]), prs([3], created_at="2023-05-01 10:00:00+00:00")]), path)
+    append_revisions(prs([2], title="revised"), path)
+    append_revisions(pd.DataFrame({"PR Number": [3], "Created At": ["2023-05-01 10:00:00+00:00"], "comments": [[]], REMOVED: [True]}), path)
+    before = read_comments_dataset(path)
+
+    assert not compact_comments_dataset(path, min_revisions=3)
+    assert compact_comments_dataset(path)
+    assert not list((tmp_path / "comments").rglob("revision-*"))
+    pd.testing.assert_frame_equal(read_comments_dataset(path).sort_values("PR Number", ignore_index=True),
+                                  before.sort_values("PR Number", ignore_index=True))
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+import github_api
+from github_replay import ReplayServer, synthetic_cassette
+from http_cache import ResponseCache
+from token_pool import TokenPool
+
+NUMBER = 100000     # the newest PR of a synthetic cassette
+
+
+@pytest.fixture
+def server():
+    server = ReplayServer(synthetic_cassette(3), port=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def pool():
+    pool = TokenPool(["a", "b"], reserve=0)
+    github_api.set_pool(pool)
+    return pool
+
+def pr_url(server):
+    return f"{server.base_url}/repos/{github_api.REPO}/pulls/{NUMBER}"
+
+
+def test_rate_limited_request_is_retried_with_another_token(server, pool):
+    server.rate_limit = 2
+    for _ in range(2):
+        server.take("Bearer a")     # "a" has used up its window, without the pool knowing
+    pool.update_counts("b", 100)
+
+    response = github_api.get(pr_url(server))
+    assert response.status_code == 200 and response.json()["number"] == NUMBER
+    assert server.statuses == {403: 1, 200: 1}
+    assert pool.headroom()["a"] == 0
+
+def test_secondary_rate_limit_waits_for_retry_after(server, pool):
+    server.throttle_every = 2
+    server.retry_after = 1
+    pool.update_counts("b", 0, time.time() + 3600)     # only "a" can be used
+
+    github_api.get(pr_url(server))
+    started = time.time()
+    response = github_api.get(pr_url(server))
+    assert response.status_code == 200
+    assert server.statuses[429] == 1
+    assert time.time() - started >= 0.9
+
+def test_unchanged_pages_are_replayed_from_the_cache(server, tmp_path):
+    github_api.set_pool(TokenPool(["a"], reserve=0))    # cached responses are kept per token
+    github_api.set_cache(ResponseCache(str(tmp_path / "cache.sqlite")))
+    try:
+        url = f"{server.base_url}/repos/{github_api.REPO}/pulls"
+        params = {"state": "closed", "sort": "created", "direction": "desc", "per_page": 2}
+        first = github_api.get_all_pages(url, params)
+        server.reset_counters()
+        second = github_api.get_all_pages(url, params)
+    finally:
+        github_api.set_cache(None)
+
+    assert second == first and len(first) == 4
+    assert server.statuses == {304: 2}  # both pages, the second found through the cached Link header
+
+def test_cached_responses_are_only_shared_across_tokens_when_asked(tmp_path):
+    cache = ResponseCache(str(tmp_path / "cache.sqlite"))
+    cache.store("https://api.github.com/repos/x/y", "token-a", '"etag"', b"{}")
+    assert cache.lookup("https://api.github.com/repos/x/y", "token-a").etag == '"etag"'
+    assert cache.lookup("https://api.github.com/repos/x/y", "token-b") is None
+    cache.close()
+
+    shared = ResponseCache(str(tmp_path / "cache.sqlite"), share_across_tokens=True)
+    assert shared.lookup("https://api.github.com/repos/x/y", "token-b").etag == '"etag"'
+    shared.close()
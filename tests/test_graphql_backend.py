@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from github_api import REPO
+from github_replay import Cassette, ReplayServer, request_key, synthetic_cassette
+from graphql_backend import GraphQLClient
+from token_pool import TokenPool
+
+
+@pytest.fixture
+def cassette():
+    return synthetic_cassette(12)
+
+@pytest.fixture
+def serve(cassette):
+    servers = []
+
+    def start(**options):
+        server = ReplayServer(cassette, port=0, **options)
+        server.start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def client(server, tokens=("a",)):
+    return GraphQLClient(f"{server.base_url}/graphql", TokenPool(list(tokens), reserve=0))
+
+def pr_numbers(cassette):
+    return [pr["number"] for pr in cassette.pull_requests() if pr["created_at"] >= "2021"]
+
+def set_pull_request(cassette, number, **fields):
+    pr = {**cassette.pull_request(number), **fields}
+    cassette.add(request_key("GET", f"/repos/{REPO}/pulls/{number}", ""), 200, json.dumps(pr))
+
+def hydrate(graphql, numbers, batch_size):
+    rows, failures = [], {}
+    for batch_rows, batch_failures in graphql.hydrate(numbers, batch_size):
+        rows.extend(batch_rows.to_dict("records"))
+        failures.update(batch_failures)
+    return {row["PR Number"]: row for row in rows}, failures
+
+
+def test_batches_are_one_aliased_query_each(cassette, serve):
+    server = serve()
+    numbers = pr_numbers(cassette)
+    rows, failures = hydrate(client(server), numbers, batch_size=5)
+
+    assert server.requests == 3
+    assert sorted(rows) == sorted(numbers) and not failures
+    pr = cassette.pull_request(numbers[0])
+    assert rows[numbers[0]]["Files Changed"] == pr["changed_files"]
+    assert rows[numbers[0]]["Integration"] == pr["labels"][0]["name"].split(": ")[-1]
+
+def test_labels_are_followed_past_the_first_page(cassette, serve):
+    number = pr_numbers(cassette)[0]
+    set_pull_request(cassette, number, labels=[{"name": f"label {i}"} for i in range(145)] + [{"name": "integration: tado"}])
+    server = serve()
+
+    rows, _ = hydrate(client(server), [number], batch_size=1)
+    assert rows[number]["Integration"] == "tado"
+    assert server.requests == 3     # the batch with 20 labels, then pages of 100
+
+def test_too_expensive_batch_is_halved(cassette, serve):
+    server = serve(max_graphql_batch=3)
+    numbers = pr_numbers(cassette)
+
+    rows, failures = hydrate(client(server), numbers, batch_size=12)
+    assert sorted(rows) == sorted(numbers) and not failures
+
+def test_rate_limited_token_is_swapped_for_another(cassette, serve):
+    server = serve(rate_limit=2)
+    for _ in range(2):
+        server.take("Bearer a")     # "a" has used up its window, without the pool knowing
+    graphql = client(server, tokens=("a", "b"))
+    graphql.pool.update_counts("b", 100)
+
+    rows, failures = hydrate(graphql, pr_numbers(cassette)[:4], batch_size=4)
+    assert len(rows) == 4 and not failures
+    assert graphql.pool.headroom()["a"] == 0
+
+def test_bot_and_deleted_authors_match_the_rest_api(cassette, serve):
+    bot, deleted = pr_numbers(cassette)[:2]
+    set_pull_request(cassette, bot, user={"login": "renovate[bot]", "type": "Bot"})
+    set_pull_request(cassette, deleted, user=None)
+    server = serve()
+
+    rows, _ = hydrate(client(server), [bot, deleted], batch_size=2)
+    assert rows[bot]["Author"] == "renovate[bot]"
+    assert rows[deleted]["Author"] == "ghost"
@@ -0,0 +1,91 @@
+from datetime import date, datetime, timedelta, timezone
+import os
+import queue
+from types import SimpleNamespace
+
+from github import RateLimitExceededException
+import pytest
+
+from progress_ledger import ProgressLedger
+from token_pool import TokenPool
+
+MONTH = (date(2024, 3, 1), date(2024, 3, 31))
+
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)    # the shards and pull_requests_all.csv are written under data/
+    import scrape_all_prs
+    monkeypatch.setattr(scrape_all_prs, "ledger", ProgressLedger(str(tmp_path / "progress.sqlite")))
+    return scrape_all_prs
+
+def pull_request(number):
+    created_at = datetime(2024, 3, 1, tzinfo=timezone.utc) + timedelta(hours=number)
+    return SimpleNamespace(number=number, title=f"PR {number}", user=SimpleNamespace(login="alice"), labels=[], created_at=created_at,
+                           updated_at=created_at, merged=True, changed_files=1, closed_at=created_at + timedelta(days=1),
+                           html_url=f"https://github.com/home-assistant/core/pull/{number}", body="")
+
+# A Github client whose token runs out after budget PR fetches
+class FakeGithub:
+    def __init__(self, numbers, budget):
+        self.numbers = numbers
+        self.budget = budget
+        self.fetched = []
+
+    def search_issues(self, query, sort, order):
+        return FakeResults(self, self.numbers)
+
+    def fetch(self, number):
+        if len(self.fetched) >= self.budget:
+            raise RateLimitExceededException(403, {"message": "API rate limit exceeded"}, {"X-RateLimit-Reset": "9999999999"})
+        self.fetched.append(number)
+        return pull_request(number)
+
+    def get_rate_limit(self):
+        reset = datetime.now(timezone.utc) + timedelta(hours=1)
+        return SimpleNamespace(core=SimpleNamespace(remaining=4000, limit=5000, reset=reset))
+
+class FakeResults(list):
+    def __init__(self, g, numbers):
+        super().__init__(SimpleNamespace(number=number, as_pull_request=lambda number=number: g.fetch(number)) for number in numbers)
+        self.totalCount = len(numbers)
+
+
+def test_rate_limited_shard_is_resumed_with_another_token(scraper, monkeypatch):
+    numbers = list(range(1, 31))
+    clients = {"a": FakeGithub(numbers, budget=10), "b": FakeGithub(numbers, budget=100)}
+    monkeypatch.setattr(scraper, "pool", TokenPool(["a", "b"], reserve=0))
+    scraper.pool.update_counts("b", 100)    # "a" is handed out first
+    monkeypatch.setattr(scraper, "github_client", lambda token: clients[token])
+
+    shards = queue.Queue()
+    shards.put(MONTH)
+    scraper.shard_worker(shards)
+
+    assert len(clients["a"].fetched) == 10
+    assert len(clients["b"].fetched) == 20     # only the PRs the first token didn't get to
+    assert sorted(row[0] for row in scraper.read_rows(scraper.shard_path(MONTH[0]))) == numbers
+    assert not os.path.exists(scraper.partial_shard_path(MONTH[0]))
+    assert scraper.pool.headroom()["a"] == 0
+    assert scraper.pool.headroom()["b"] == 4000    # core count from /rate_limit, not the search limit
+
+def test_retried_rows_join_an_unfinished_month_without_completing_it(scraper):
+    crawled = [scraper.pr_row(pull_request(number)) for number in (1, 2, 3)]
+    scraper.write_rows(scraper.partial_shard_path(MONTH[0]), crawled)
+
+    scraper.add_to_shards([scraper.pr_row(pull_request(2)), scraper.pr_row(pull_request(7))])
+
+    assert not os.path.exists(scraper.shard_path(MONTH[0]))
+    assert sorted(row[0] for row in scraper.read_rows(scraper.partial_shard_path(MONTH[0]))) == [1, 2, 3, 7]
+
+def test_worker_errors_are_raised(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "pool", TokenPool(["a"]))
+    monkeypatch.setattr(scraper, "monthly_shards", lambda: [MONTH])
+
+    def shard_worker(shards):
+        raise ValueError("worker died")
+    monkeypatch.setattr(scraper, "shard_worker", shard_worker)
+
+    with pytest.raises(ValueError, match="worker died"):
+        scraper.collect_pr_metadata_sharded()
@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+from token_pool import EXHAUSTED_WAIT, TokenPool
+
+
+def test_waits_for_the_earliest_known_reset():
+    pool = TokenPool(["a", "b"], reserve=0)
+    pool.update_counts("a", 0, time.time() + 120)
+    pool.update_counts("b", 0)      # no reset time known for this one
+    token, wait_time = pool.try_acquire()
+    assert token is None and 118 < wait_time <= 120
+
+def test_backs_off_exponentially_when_no_reset_is_known():
+    pool = TokenPool(["a"], reserve=10)
+    pool.update_counts("a", 5)
+    waits = [pool.try_acquire()[1] for _ in range(8)]
+    assert waits == [1, 2, 4, 8, 16, 32, EXHAUSTED_WAIT, EXHAUSTED_WAIT]
+
+    pool.update_counts("a", 100)
+    assert pool.try_acquire() == ("a", 0.0)
+    pool.update_counts("a", 5)
+    assert pool.try_acquire()[1] == 1   # a successful acquire starts the backoff over
+
+def test_a_cost_no_token_can_cover_raises():
+    pool = TokenPool(["a"], reserve=20)
+    with pytest.raises(ValueError):
+        pool.try_acquire(cost=4990)
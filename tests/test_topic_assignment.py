@@ -0,0 +1,16 @@
+import pandas as pd
+
+from progress_ledger import ProgressLedger
+from topic_assignment import save_assignments
+
+
+def test_relabelled_pr_replaces_its_rows(tmp_path):
+    ledger = ProgressLedger(str(tmp_path / "progress.sqlite"))
+    output_path = str(tmp_path / "topics.csv")
+    save_assignments(pd.DataFrame({"PR Number": [1, 1, 2, 3]}), [4, 5, 4, 6], ledger, output_path)
+
+    # PR 1's threads changed and PR 3 no longer has any review threads
+    save_assignments(pd.DataFrame({"PR Number": [1]}), [7], ledger, output_path, pr_numbers=[1, 3])
+
+    rows = pd.read_csv(output_path).sort_values(["PR Number", "Topic"]).values.tolist()
+    assert rows == [[1, 7], [2, 4]]
@@ -0,0 +1,116 @@
+import pandas as pd
+
+from comments_store import read_comments_dataset, write_comments_dataset
+from progress_ledger import ProgressLedger
+from sidecars import read_sidecar
+from webhook_receiver import PullRequestStore, WebhookProcessor
+
+INTEGRATION_BODY = "## Type of change\n- [ ] Bugfix (non-breaking change which fixes an issue)\n- [x] New integration (thank you!)\n"
+
+
+def pull_request(number, body=INTEGRATION_BODY, updated_at="2024-03-10T00:00:00Z"):
+    return {"number": number, "title": f"PR {number}", "user": {"login": "alice", "type": "User"}, "labels": [{"name": "integration: hue"}],
+            "body": body, "state": "closed", "merged_at": "2024-03-08T10:00:00Z", "created_at": "2024-03-01T10:00:00Z",
+            "updated_at": updated_at, "closed_at": "2024-03-08T10:00:00Z", "html_url": f"https://github.com/home-assistant/core/pull/{number}"}
+
+def comment(comment_id, login, created_at, **fields):
+    return {"id": comment_id, "body": f"comment {comment_id}", "user": {"login": login, "type": "User"},
+            "created_at": created_at, "updated_at": created_at, **fields}
+
+# PR 500's comments on GitHub before the late one: three issue comments and a review thread of two
+SCRAPED_ISSUE = [comment(i, "bob", f"2024-03-0{i}T00:00:00Z") for i in (1, 2, 3)]
+SCRAPED_REVIEW = [comment(10, "bob", "2024-03-01T12:00:00Z", diff_hunk="@@ -1 +1 @@"),
+                  comment(11, "alice", "2024-03-01T13:00:00Z", diff_hunk="@@ -1 +1 @@", in_reply_to_id=10)]
+
+
+def processor(tmp_path, listings):
+    ledger = ProgressLedger(str(tmp_path / "progress.sqlite"))
+    return WebhookProcessor(PullRequestStore(str(tmp_path / "webhooks")), ledger, str(tmp_path / "comments"), str(tmp_path / "sidecars"),
+                            str(tmp_path / "all.csv"), fetch_comments=lambda pr_number: listings.get(pr_number, ([], [])))
+
+def scraped_dataset(tmp_path, rows):
+    df = pd.DataFrame([{"PR Number": number, "Title": "scraped", "Author": "alice", "Created At": "2024-03-01 10:00:00+00:00",
+                        "State": "merged", "Type of Change": type_of_change, "Total Comments": len(comments), "Comments": comments}
+                       for number, type_of_change, comments in rows])
+    write_comments_dataset(df, str(tmp_path / "comments"))
+
+def scraped_threads(count):
+    return [{"type": "issue", "comment": {"id": i, "timestamp": f"2024-03-0{i}T00:00:00Z", "body": f"comment {i}", "is_from_author": False}}
+            for i in range(1, count + 1)]
+
+
+def test_late_comment_adds_to_scraped_history(tmp_path):
+    scraped_dataset(tmp_path, [(500, "New integration (thank you!)", scraped_threads(5))])
+    receiver = processor(tmp_path, {500: (SCRAPED_ISSUE, SCRAPED_REVIEW)})
+    receiver.ledger.mark_done("format", [500])
+
+    late = comment(4, "carol", "2024-03-09T00:00:00Z")
+    receiver.handle("issue_comment", {"action": "created", "issue": {**pull_request(500), "pull_request": {}}, "comment": late})
+    assert receiver.flush() == 1
+
+    row = read_comments_dataset(str(tmp_path / "comments")).set_index("PR Number").loc[500]
+    assert row["Total Comments"] == 6
+    assert [thread["comment"]["id"] for thread in row["comments"]] == [1, 10, 2, 3, 4]
+    assert [reply["id"] for reply in row["comments"][1]["replies"]] == [11]
+    assert read_sidecar("webhook", str(tmp_path / "sidecars")).set_index("PR Number").at[500, "Total Comments"] == 6
+    assert 500 not in receiver.ledger.done("format")
+
+def test_unfetchable_comments_never_replace_scraped_ones(tmp_path):
+    scraped_dataset(tmp_path, [(500, "New integration (thank you!)", scraped_threads(5))])
+    receiver = processor(tmp_path, {})
+    receiver.fetch_comments = lambda pr_number: None
+
+    receiver.handle("issue_comment", {"action": "created", "issue": {**pull_request(500), "pull_request": {}}, "comment": comment(4, "carol", "2024-03-09T00:00:00Z")})
+    assert receiver.flush() == 0
+    assert pd.isna(read_sidecar("webhook", str(tmp_path / "sidecars")).set_index("PR Number").at[500, "Total Comments"])
+    assert read_comments_dataset(str(tmp_path / "comments")).set_index("PR Number").at[500, "Total Comments"] == 5
+    assert receiver.store.pending() == {500}
+
+def test_description_without_type_of_change_keeps_stored_one(tmp_path):
+    scraped_dataset(tmp_path, [(500, "New integration (thank you!)", scraped_threads(2)), (501, "New feature (which adds functionality to an existing integration)", [])])
+    receiver = processor(tmp_path, {})
+
+    receiver.handle("pull_request", {"action": "edited", "pull_request": pull_request(500, body="Adds the hue integration.")})
+    receiver.handle("pull_request", {"action": "edited", "pull_request": pull_request(501, body="## Type of change\n- [x] Bugfix (non-breaking change which fixes an issue)\n")})
+    receiver.flush()
+
+    df = read_comments_dataset(str(tmp_path / "comments")).set_index("PR Number")
+    assert list(df.index) == [500]
+    assert df.at[500, "Type of Change"] == "New integration (thank you!)"
+
+def test_deliveries_only_record_and_flush_fetches_listings(tmp_path):
+    scraped_dataset(tmp_path, [(500, "New integration (thank you!)", scraped_threads(5))])
+    fetched = []
+    receiver = processor(tmp_path, {})
+    receiver.fetch_comments = lambda pr_number: fetched.append(pr_number) or (SCRAPED_ISSUE, SCRAPED_REVIEW)
+
+    receiver.handle("pull_request", {"action": "opened", "pull_request": {**pull_request(501), "state": "open"}})
+    receiver.handle("issue_comment", {"action": "created", "issue": {**pull_request(500), "pull_request": {}}, "comment": comment(4, "carol", "2024-03-09T00:00:00Z")})
+    assert fetched == []
+
+    receiver.flush()
+    assert fetched == [500]     # the open PR isn't fetched until it's closed
+
+def test_flush_adds_a_revision_instead_of_rewriting_the_partition(tmp_path):
+    scraped_dataset(tmp_path, [(500, "New integration (thank you!)", scraped_threads(5)), (501, "New integration (thank you!)", scraped_threads(1))])
+    scraped_files = {path: path.stat().st_mtime_ns for path in (tmp_path / "comments").rglob("*.parquet")}
+    receiver = processor(tmp_path, {500: (SCRAPED_ISSUE, SCRAPED_REVIEW)})
+
+    for comment_id in (4, 5):
+        late = comment(comment_id, "carol", f"2024-03-0{comment_id + 5}T00:00:00Z")
+        receiver.handle("issue_comment", {"action": "created", "issue": {**pull_request(500), "pull_request": {}}, "comment": late})
+        receiver.flush()
+
+    assert {path: path.stat().st_mtime_ns for path in scraped_files} == scraped_files
+    df = read_comments_dataset(str(tmp_path / "comments")).set_index("PR Number")
+    assert sorted(df.index) == [500, 501]
+    assert df.at[500, "Total Comments"] == 7
+    assert df.at[501, "Total Comments"] == 1
+
+def test_prs_created_before_the_window_are_left_out(tmp_path):
+    receiver = processor(tmp_path, {})
+    old = {**pull_request(100), "created_at": "2020-12-30T10:00:00Z"}
+
+    receiver.handle("pull_request", {"action": "closed", "pull_request": old})
+    assert receiver.flush() == 0
+    assert not (tmp_path / "all.csv").exists()
@@ -0,0 +1,61 @@
+"""
+Text cleaning shared by the clustering notebooks: drops quoted lines, code blocks and links, keeps only
+alphanumerics and basic punctuation, and collapses whitespace, e.g.
+
+    clean_text("> quoted\\nSee ```x = 1``` and https://example.com :)")  ->  "See and :)"
+
+Patterns are compiled once, the character filter and whitespace collapse are a single pass (runs of
+unwanted characters become one space), and results are memoized since many comments are identical
+("Done", "Same here"). clean_texts cleans a whole batch, each distinct text once, across a process pool.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import os
+import re
+from typing import List, Optional, Sequence
+
+QUOTE = re.compile(r"(?m)^\s*>.*(?:\r?\n|$)")
+# should we consider using LLM to generate short summary of the code snippets so we don't lose any context it could provide
+# or could use regex to detect patterns in the code and classify them e.g. detecting import statements, function definitions, or added/removed lines.
+CODE_OR_LINK = re.compile(r"```.*?```|http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+", re.DOTALL)
+# everything but alphanumeric characters and punctuation; whitespace is in here too, so each run becomes one space
+NOT_ALLOWED = re.compile(r"[^a-zA-Z0-9.,!?;:'\"(){}\[\]\-]+")
+
+CACHE_SIZE = 1 << 16
+MIN_PARALLEL = 5000  # below this many distinct texts a process pool costs more than it saves
+CHUNK_SIZE = 1000
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def clean_text(text: str) -> str:
+    text = QUOTE.sub("", text)
+    text = CODE_OR_LINK.sub("", text)
+    return NOT_ALLOWED.sub(" ", text).strip()
+
+# The original four-pass version, kept for comparison in benchmarks/bench_text_cleaning.py
+def clean_text_uncompiled(text: str) -> str:
+    text = re.sub(r"(?m)^\s*>.*(?:\r?\n|$)", "", text)
+    pattern = r"```.*?```|http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
+    cleaned_text = re.sub(pattern, "", text, flags=re.DOTALL)
+    cleaned_text = re.sub(r"[^a-zA-Z0-9.,!?;:'\"(){}\[\]\-]", " ", cleaned_text)
+    return re.sub(r"\s+", " ", cleaned_text).strip()
+
+
+def clean_chunk(texts: Sequence[str]) -> List[str]:
+    return [clean_text(text) for text in texts]
+
+# Clean a batch of texts, in input order. Duplicates are cleaned once, and large batches are split across worker processes
+def clean_texts(texts: Sequence[str], workers: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> List[str]:
+    unique_texts = list(dict.fromkeys(texts))
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or len(unique_texts) < MIN_PARALLEL:
+        cleaned = clean_chunk(unique_texts)
+    else:
+        chunks = [unique_texts[i:i + chunk_size] for i in range(0, len(unique_texts), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            cleaned = [text for chunk in executor.map(clean_chunk, chunks) for text in chunk]
+
+    lookup = dict(zip(unique_texts, cleaned))
+    return [lookup[text] for text in texts]
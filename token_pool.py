@@ -0,0 +1,129 @@
+"""
+Shared pool of GitHub personal access tokens for all the scrapers.
+
+Every response's X-RateLimit-Remaining / X-RateLimit-Reset headers are fed back into the pool, and
+acquire() always hands out the token with the most headroom left. Tokens are held back once they
+get within RESERVE requests of zero, and the pool only sleeps when every token is exhausted, so
+multiple tokens add up to their full combined hourly quota.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from os import environ
+import threading
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+DEFAULT_LIMIT = 5000    # core REST limit for an authenticated token
+RESERVE = 20    # stop handing out a token this close to zero, so concurrent requests don't overrun it
+EXHAUSTED_WAIT = 60     # fallback wait (seconds) when a rate limited response gives no reset time
+FIRST_BACKOFF = 1   # first wait (seconds) when no token's reset time is known, doubling up to EXHAUSTED_WAIT
+
+
+@dataclass
+class TokenState:
+    token: str
+    remaining: int = DEFAULT_LIMIT  # optimistic until the first response tells us otherwise
+    limit: int = DEFAULT_LIMIT
+    reset: float = 0.0  # epoch seconds
+
+
+class TokenPool:
+    def __init__(self, tokens: List[str], reserve: int = RESERVE):
+        self.reserve = reserve
+        self._states: Dict[str, TokenState] = {token: TokenState(token) for token in tokens}
+        self._lock = threading.Lock()
+        self._backoff = FIRST_BACKOFF
+
+    @classmethod
+    def from_env(cls, key: str = "GITHUB_PATS", reserve: int = RESERVE) -> "TokenPool":
+        tokens = [token.strip() for token in environ.get(key, "").split(",") if token.strip()]
+        return cls(tokens, reserve)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    # Hand out the token with the most remaining requests, or say how long until one resets. cost is what the
+    # request is expected to use up, e.g. the points of a GraphQL query. When no exhausted token has told us its
+    # reset time, back off exponentially instead; a cost no token could ever cover raises ValueError
+    def try_acquire(self, cost: int = 1) -> Tuple[Optional[str], float]:
+        if not self._states:
+            raise RuntimeError("No GitHub tokens configured, set GITHUB_PATS in .env")
+
+        with self._lock:
+            now = time.time()
+            for state in self._states.values():
+                if state.reset and now >= state.reset:  # window has rolled over
+                    state.remaining = state.limit
+                    state.reset = 0.0
+
+            best = max(self._states.values(), key=lambda state: state.remaining)
+            if best.remaining - cost >= self.reserve:
+                best.remaining -= cost     # count the request we're about to make before its headers come back
+                self._backoff = FIRST_BACKOFF
+                return best.token, 0.0
+
+            if all(state.limit - cost < self.reserve for state in self._states.values()):
+                raise ValueError(f"A request costing {cost} can never fit in any token's limit with a reserve of {self.reserve}")
+
+            resets = [state.reset for state in self._states.values() if state.reset]
+            if resets:
+                return None, max(min(resets) - now, 1)
+
+            wait_time, self._backoff = self._backoff, min(self._backoff * 2, EXHAUSTED_WAIT)
+            return None, wait_time
+
+    # Wait only if every token is exhausted
+    def acquire(self, cost: int = 1) -> str:
+        while True:
+            token, wait_time = self.try_acquire(cost)
+            if token:
+                return token
+            print(f"All tokens exhausted. Waiting {wait_time:.2f} seconds for reset.")
+            time.sleep(wait_time)
+
+    async def acquire_async(self, cost: int = 1) -> str:
+        while True:
+            token, wait_time = self.try_acquire(cost)
+            if token:
+                return token
+            print(f"All tokens exhausted. Waiting {wait_time:.2f} seconds for reset.")
+            await asyncio.sleep(wait_time)
+
+    # Record the rate limit headers of a response made with token
+    def update(self, token: str, headers: Mapping[str, str]) -> None:
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        limit = headers.get("X-RateLimit-Limit")
+        if remaining is None:
+            return
+        self.update_counts(token, int(remaining), float(reset) if reset else None, int(limit) if limit else None)
+
+    def update_counts(self, token: str, remaining: int, reset: Optional[float] = None, limit: Optional[int] = None) -> None:
+        with self._lock:
+            state = self._states[token]
+            state.remaining = remaining
+            if reset is not None:
+                state.reset = reset
+            if limit is not None:
+                state.limit = limit
+
+    # Take a token out of rotation after a 403/429, until its reset time (or Retry-After) has passed
+    def mark_exhausted(self, token: str, headers: Optional[Mapping[str, str]] = None) -> None:
+        headers = headers or {}
+        if headers.get("Retry-After"):
+            reset = time.time() + int(headers["Retry-After"])
+        elif headers.get("X-RateLimit-Reset"):
+            reset = float(headers["X-RateLimit-Reset"])
+        else:
+            reset = time.time() + EXHAUSTED_WAIT
+
+        with self._lock:
+            state = self._states[token]
+            state.remaining = 0
+            state.reset = reset
+
+    # Remaining requests per token, for logging
+    def headroom(self) -> Dict[str, int]:
+        with self._lock:
+            return {state.token: state.remaining for state in self._states.values()}
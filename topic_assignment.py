@@ -0,0 +1,174 @@
+"""
+Labels the review threads of newly scraped PRs with the topics of an existing BERTopic fit, without refitting
+(which is slow and renumbers every topic the merged clusters in clustering_review.ipynb are keyed on).
+
+clustering_review.ipynb freezes its fit as a TopicAssigner: the centroid of each (merged) topic's thread
+embeddings, plus a per-topic similarity threshold below which a thread counts as an outlier (-1), taken from
+how close the fitted threads were to their own centroid. New threads are embedded through the
+EmbeddingStore and assigned to the most similar centroid in batches, so topic ids stay stable and a refresh
+costs time in proportion to the new PRs. When the share of new threads falling into outliers is well above
+the share of the fitted threads the same thresholds make outliers, it's flagged as drift: the topics no longer
+describe the new threads and it's time to refit.
+
+Run as a script to label every PR in the comments dataset not labelled yet, appending to
+data/review_thread_topics.csv. A PR labelled again, e.g. after the webhook receiver changed its threads,
+replaces its earlier rows.
+"""
+
+from dataclasses import dataclass
+import json
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from comments_store import read_comments_dataset
+from embedding_store import EmbeddingStore
+from progress_ledger import ProgressLedger
+from text_cleaning import clean_texts
+
+OUTLIER = -1
+ASSIGNER_DIR = "data/topic_assigner"
+OUTPUT_PATH = "data/review_thread_topics.csv"
+STAGE = "topics"   # progress ledger stage name
+THRESHOLD_PERCENTILE = 5    # a thread less similar to a centroid than 95% of the topic's fitted threads is an outlier
+DRIFT_MARGIN = 0.10         # flag drift when the outlier share is this much above the fitted one
+BATCH_SIZE = 10000
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def thread_text(comment_thread) -> str:
+    main_comment = comment_thread['comment']['body']
+    replies = [reply['body'] for reply in comment_thread['replies']]
+    return main_comment + "\n" + "\n".join(replies)
+
+# Cleaned review threads of each PR as (PR number, thread) pairs, the same documents clustering_review.ipynb fits on
+def review_threads(df: pd.DataFrame) -> pd.DataFrame:
+    pr_numbers, raw_threads = [], []
+    for pr_number, comments in zip(df['PR Number'], df['comments']):
+        for comment_thread in (comments if comments is not None else []):
+            if comment_thread['type'] == 'review':
+                pr_numbers.append(pr_number)
+                raw_threads.append(thread_text(comment_thread))
+
+    threads = pd.DataFrame({'PR Number': pr_numbers, 'Thread': clean_texts(raw_threads)})
+    return threads[threads['Thread'] != ""]
+
+
+@dataclass
+class DriftReport:
+    threads: int
+    outlier_ratio: float
+    fitted_outlier_ratio: float
+
+    @property
+    def drifted(self) -> bool:
+        return self.outlier_ratio > self.fitted_outlier_ratio + DRIFT_MARGIN
+
+    def __str__(self) -> str:
+        status = "DRIFT: consider refitting the topic model" if self.drifted else "no drift"
+        return f"{self.threads} threads, {self.outlier_ratio:.1%} outliers (fitted: {self.fitted_outlier_ratio:.1%}), {status}"
+
+
+class TopicAssigner:
+    def __init__(self, topic_ids: np.ndarray, centroids: np.ndarray, thresholds: np.ndarray, model_id: str, fitted_outlier_ratio: float):
+        self.topic_ids = np.asarray(topic_ids)
+        self.centroids = normalize(centroids)
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        self.model_id = model_id
+        self.fitted_outlier_ratio = fitted_outlier_ratio
+
+    # Freeze a fit: embeddings and topics of the fitted documents, in the same order. The drift baseline is the share
+    # of the fitted documents assign() itself makes outliers, not HDBSCAN's, so new threads are judged by the same rule
+    @classmethod
+    def fit(cls, embeddings: np.ndarray, topics: Sequence[int], model_id: str, percentile: float = THRESHOLD_PERCENTILE) -> "TopicAssigner":
+        embeddings = normalize(embeddings)
+        topics = np.asarray(topics)
+        topic_ids = np.unique(topics[topics != OUTLIER])
+
+        centroids = normalize(np.stack([embeddings[topics == topic].mean(axis=0) for topic in topic_ids]))
+        thresholds = np.array([
+            np.percentile(embeddings[topics == topic] @ centroid, percentile) for topic, centroid in zip(topic_ids, centroids)
+        ])
+        assigner = cls(topic_ids, centroids, thresholds, model_id, 0.0)
+        assigner.fitted_outlier_ratio = assigner.drift(assigner.assign(embeddings)).outlier_ratio
+        return assigner
+
+    def assign(self, embeddings: np.ndarray, batch_size: int = BATCH_SIZE) -> np.ndarray:
+        topics = np.empty(len(embeddings), dtype=np.int64)
+        for start in range(0, len(embeddings), batch_size):
+            similarities = normalize(embeddings[start:start + batch_size]) @ self.centroids.T
+            best = similarities.argmax(axis=1)
+            best_similarity = similarities[np.arange(len(best)), best]
+            topics[start:start + batch_size] = np.where(best_similarity >= self.thresholds[best], self.topic_ids[best], OUTLIER)
+        return topics
+
+    def drift(self, topics: Sequence[int]) -> DriftReport:
+        topics = np.asarray(topics)
+        return DriftReport(len(topics), float(np.mean(topics == OUTLIER)) if len(topics) else 0.0, self.fitted_outlier_ratio)
+
+    def save(self, path: str = ASSIGNER_DIR) -> None:
+        os.makedirs(path, exist_ok=True)
+        np.savez(os.path.join(path, "centroids.npz"), topic_ids=self.topic_ids, centroids=self.centroids, thresholds=self.thresholds)
+        with open(os.path.join(path, "assigner.json"), "w") as f:
+            json.dump({"model_id": self.model_id, "fitted_outlier_ratio": self.fitted_outlier_ratio}, f, indent=2)
+
+    @classmethod
+    def load(cls, path: str = ASSIGNER_DIR) -> "TopicAssigner":
+        arrays = np.load(os.path.join(path, "centroids.npz"))
+        with open(os.path.join(path, "assigner.json")) as f:
+            meta = json.load(f)
+        return cls(arrays["topic_ids"], arrays["centroids"], arrays["thresholds"], meta["model_id"], meta["fitted_outlier_ratio"])
+
+
+# Append the threads' topics. Rows already there for pr_numbers (by default the threads' PRs) are dropped first,
+# so a relabelled PR's topics aren't counted twice; the file is only rewritten when there are any
+def save_assignments(threads: pd.DataFrame, topics: Sequence[int], ledger: ProgressLedger, output_path: str = OUTPUT_PATH,
+                     pr_numbers: Optional[Sequence[int]] = None) -> None:
+    rows = pd.DataFrame({'PR Number': threads['PR Number'].to_numpy(), 'Topic': topics})
+    pr_numbers = threads['PR Number'].unique() if pr_numbers is None else pr_numbers
+    exists = os.path.exists(output_path)
+    if exists and pd.read_csv(output_path, usecols=['PR Number'])['PR Number'].isin(pr_numbers).any():
+        labelled = pd.read_csv(output_path)
+        pd.concat([labelled[~labelled['PR Number'].isin(pr_numbers)], rows]).to_csv(f"{output_path}.tmp", index=False)
+        os.replace(f"{output_path}.tmp", output_path)
+    else:
+        rows.to_csv(output_path, mode='a', header=not exists, index=False)
+    ledger.mark_done(STAGE, threads['PR Number'].unique())     # only marked once they're on disk
+
+# Start the labelled output over from a fit: save the assigner, and the fitted threads' topics as the first labels
+def freeze_fit(assigner: TopicAssigner, threads: pd.DataFrame, topics: Sequence[int], output_path: str = OUTPUT_PATH, path: str = ASSIGNER_DIR) -> None:
+    assigner.save(path)
+    ledger = ProgressLedger()
+    ledger.reset(STAGE)
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    save_assignments(threads, topics, ledger, output_path)
+
+# Label the review threads of every PR in the comments dataset that isn't labelled yet
+def assign_new_prs(embedder, assigner: TopicAssigner, output_path: str = OUTPUT_PATH) -> DriftReport:
+    ledger = ProgressLedger()
+    df = read_comments_dataset(columns=['PR Number', 'comments'])
+    df = df[~df['PR Number'].isin(ledger.done(STAGE))]
+    threads = review_threads(df)
+    print(f"Labelling {len(threads)} review threads from {df['PR Number'].nunique()} new PRs.")
+
+    embeddings = EmbeddingStore(assigner.model_id).embed(threads['Thread'].tolist(), embedder)
+    topics = assigner.assign(embeddings)
+    save_assignments(threads, topics, ledger, output_path, df['PR Number'])     # PRs left without review threads lose their rows too
+    ledger.mark_done(STAGE, df['PR Number'])    # including PRs without any review threads
+
+    return assigner.drift(topics)
+
+
+if __name__ == "__main__":
+    from sentence_transformers import SentenceTransformer
+
+    assigner = TopicAssigner.load()
+    report = assign_new_prs(SentenceTransformer(assigner.model_id), assigner)
+    print(report)
@@ -0,0 +1,89 @@
+"""
+Applies the manual topic merges in clustering_review.ipynb (config_entries_cluster, testing_cluster, ...) as a
+label remap of the existing topic assignments, instead of merge_topics followed by transform, which embeds and
+reduces the whole corpus again.
+
+build_taxonomy turns the cluster lists into a mapping table following BERTopic's merge_topics rule (groups
+taken in sorted order, every topic mapped to its group's first topic, then renumbered by size with the
+outliers kept at -1), and relabel applies it to an array of assignments with one numpy lookup:
+
+    taxonomy = build_taxonomy(topics, topics_to_merge)
+    merged_topics = relabel(topics, taxonomy)
+
+BERTopic breaks ties in topic size with an unstable sort; here they go to the lower topic id.
+cached_hierarchical_topics keeps hierarchical_topics results on disk, keyed by the documents and assignments.
+"""
+
+import hashlib
+import os
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+OUTLIER = -1
+HIERARCHY_DIR = "data/topic_hierarchies"
+
+
+def merge_mapping(topics_to_merge: Sequence[Sequence[int]]) -> Dict[int, int]:
+    mapping = {}
+    for group in sorted(topics_to_merge):
+        for topic in group:
+            mapping[topic] = group[0]
+    return mapping
+
+# Mapping table with one row per topic in the assignments: 'Old Topic', the topic it was merged into, and its new 'Topic' id
+def build_taxonomy(topics: Sequence[int], topics_to_merge: Sequence[Sequence[int]]) -> pd.DataFrame:
+    old_topics, counts = np.unique(np.asarray(topics), return_counts=True)
+    mapping = merge_mapping(topics_to_merge)
+    taxonomy = pd.DataFrame({'Old Topic': old_topics, 'Merged Into': [mapping.get(topic, topic) for topic in old_topics], 'Count': counts})
+
+    sizes = taxonomy.groupby('Merged Into')['Count'].sum().drop(OUTLIER, errors='ignore')
+    order = sorted(sizes.index, key=lambda topic: (-sizes[topic], topic))
+    new_ids = {OUTLIER: OUTLIER, **{topic: new_id for new_id, topic in enumerate(order)}}
+    taxonomy['Topic'] = taxonomy['Merged Into'].map(new_ids)
+    return taxonomy
+
+# Vectorized relabel of topic assignments; topics missing from the taxonomy become outliers
+def relabel(topics: Sequence[int], taxonomy: pd.DataFrame) -> np.ndarray:
+    topics = np.asarray(topics)
+    size = max(taxonomy['Old Topic'].max(), topics.max(initial=OUTLIER)) + 2
+    table = np.full(size, OUTLIER)
+    table[taxonomy['Old Topic'].to_numpy() + 1] = taxonomy['Topic'].to_numpy()   # shifted by one so -1 has a slot
+    return table[topics + 1]
+
+
+# get_topic_info() for the merged topics, built from the fitted model's info: counts are summed, the name and
+# representation come from the largest topic merged in, and 'Merged Topics' lists all of them
+def merged_topic_info(topic_info: pd.DataFrame, taxonomy: pd.DataFrame) -> pd.DataFrame:
+    info = topic_info.drop(columns='Count').merge(taxonomy[['Old Topic', 'Topic', 'Count']].rename(columns={'Topic': 'New Topic'}), left_on='Topic', right_on='Old Topic')
+    info = info.sort_values(['New Topic', 'Count'], ascending=[True, False])
+    merged = info.groupby('New Topic', sort=True).agg(
+        Count=('Count', 'sum'),
+        **{column: (column, 'first') for column in ('Name', 'Representation') if column in info.columns},
+        **{'Merged Topics': ('Old Topic', list)}
+    )
+    return merged.rename_axis('Topic').reset_index()
+
+def merged_representative_docs(topic_model, taxonomy: pd.DataFrame, topic: int) -> List[str]:
+    old_topics = taxonomy.loc[taxonomy['Topic'] == topic].sort_values('Count', ascending=False)['Old Topic']
+    return [doc for old_topic in old_topics for doc in (topic_model.get_representative_docs(old_topic) or [])]
+
+
+def hierarchy_key(docs: Sequence[str], topics: Sequence[int]) -> str:
+    digest = hashlib.sha256(np.asarray(topics, dtype=np.int64).tobytes())
+    for doc in docs:
+        digest.update(doc.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+# topic_model.hierarchical_topics(docs), computed once per set of documents and assignments
+def cached_hierarchical_topics(topic_model, docs: Sequence[str], path: str = HIERARCHY_DIR) -> pd.DataFrame:
+    cache_path = os.path.join(path, f"{hierarchy_key(docs, topic_model.topics_)}.pkl")
+    if os.path.exists(cache_path):
+        return pd.read_pickle(cache_path)
+
+    hierarchical_topics = topic_model.hierarchical_topics(docs)
+    os.makedirs(path, exist_ok=True)
+    hierarchical_topics.to_pickle(cache_path)
+    return hierarchical_topics
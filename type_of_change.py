@@ -0,0 +1,42 @@
+"""
+Extracts the checked "Type of change" boxes straight from a PR's markdown body, e.g.
+
+    ## Type of change
+    - [ ] Bugfix (non-breaking change which fixes an issue)
+    - [x] New integration (thank you!)
+
+gives "New integration (thank you!)". This matches what scrape_pr_checkbox_data reads from the first
+task list of the rendered HTML page, without downloading or parsing the page.
+"""
+
+import re
+from typing import Optional
+
+HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)     # the PR template's instructions live in comments
+HEADING = re.compile(r"^#+\s*type of change\s*$", re.IGNORECASE | re.MULTILINE)
+TASK_ITEM = re.compile(r"[-*+]\s+\[([ xX])\]\s+(.*)")
+
+
+def extract_type_of_change(body: Optional[str]) -> Optional[str]:
+    if not body:
+        return None
+
+    body = HTML_COMMENT.sub("", body)
+    heading = HEADING.search(body)
+    if heading:
+        body = body[heading.end():]
+
+    # Take the first task list, the same one the HTML scraper finds with ul.contains-task-list
+    checked_items = []
+    in_list = False
+    for line in body.splitlines():
+        line = line.strip()
+        item = TASK_ITEM.match(line)
+        if item:
+            in_list = True
+            if item.group(1) != " ":
+                checked_items.append(item.group(2).strip())
+        elif in_list and line:
+            break
+
+    return ", ".join(checked_items) if checked_items else None
@@ -1,41 +1,59 @@
+import argparse
+from typing import Tuple
 import pandas as pd
-import requests
 
-df = pd.read_csv("data/pull_requests_filtered.csv")
+from github_api import API_URL, REPO, get
+from pipeline_metrics import metrics
+from progress_ledger import ProgressLedger
+from sidecars import append_sidecar, sidecar_path
 
-GITHUB_TOKENS = []
-token_index = 0
+STAGE = "authors"   # progress ledger stage name
+BATCH_SIZE = 100  # Save every x PRs
 
-def get_next_token():
-    global token_index
-    token = GITHUB_TOKENS[token_index]
-    token_index = (token_index + 1) % len(GITHUB_TOKENS)
-    return token
+def fetch_data_with_token_cycle(pr_number) -> Tuple[str, str]:
+    api_url = f"{API_URL}/repos/{REPO}/pulls/{pr_number}"
 
-def fetch_data_with_token_cycle(pr_number):
-    try:
+    response = get(api_url)     # token with the most headroom is picked by the shared pool
 
-        api_url = f"https://api.github.com/repos/home-assistant/core/pulls/{pr_number}"
+    if response.status_code != 200:
+        raise RuntimeError(f"Failed to fetch PR {pr_number}. Status code: {response.status_code}")
 
-        headers = {"Authorization": f"token {get_next_token()}"}
+    pr_data = response.json()
+    author = pr_data["user"]["login"]
+    integration_name = next((label["name"].split(": ")[-1] for label in pr_data["labels"] if "integration:" in label["name"]), "")
 
-        response = requests.get(api_url, headers=headers)
+    return integration_name, author
 
-        if response.status_code == 200:
-            pr_data = response.json()
-            author = pr_data["user"]["login"]
-            integration_name = next((label["name"].split(": ")[-1] for label in pr_data["labels"] if "integration:" in label["name"]), "")
+# Refresh each PR's integration and author, appending them to the stage's sidecar every BATCH_SIZE PRs
+def refresh_integrations_and_authors(df: pd.DataFrame, retry_failed: bool = False) -> None:
+    ledger = ProgressLedger()
+    done = ledger.done(STAGE)
+    failed = set(ledger.failed(STAGE))
+    # Skip PRs we've already processed, or everything but the failed ones when retrying
+    pr_numbers = [pr_number for pr_number in df["PR Number"] if not (pr_number in done or (retry_failed and pr_number not in failed))]
+    metrics.start_stage(STAGE, len(pr_numbers))
 
-            return integration_name, author
-        else:
-            return "", ""
-    except Exception as e:
-        print(e)
-        return "", ""
+    rows = []
+    for pr_number in pr_numbers:
+        try:
+            rows.append((pr_number, *fetch_data_with_token_cycle(pr_number)))
+        except Exception as e:
+            print(e)
+            ledger.mark_failed(STAGE, pr_number, e)
 
+        if len(rows) >= BATCH_SIZE:
+            append_sidecar(STAGE, pd.DataFrame(rows, columns=["PR Number", "Integration", "Author"]), ledger)
+            rows.clear()
+            print(metrics.progress(STAGE))
 
-df[["Integration", "Author"]] = pd.DataFrame(
-    df["PR Number"].apply(fetch_data_with_token_cycle).tolist(), index=df.index
-)
+    append_sidecar(STAGE, pd.DataFrame(rows, columns=["PR Number", "Integration", "Author"]), ledger)
 
-df.to_csv("pull_requests_filtered_1.csv", index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--retry-failed', action='store_true', help="only re-fetch PRs recorded as failed in the progress ledger")
+    args = parser.parse_args()
+
+    df = pd.read_csv("data/pull_requests_filtered.csv")
+    refresh_integrations_and_authors(df, args.retry_failed)
+    print(f"Integrations and authors saved to {sidecar_path(STAGE)}, run `python sidecars.py` to join them into data/pull_requests_filtered.csv")
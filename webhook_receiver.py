@@ -0,0 +1,445 @@
+"""
+Keeps the dataset current from GitHub webhooks, one PR at a time, instead of re-crawling the whole history.
+
+Point a repository webhook (content type application/json) for the pull_request, issue_comment and
+pull_request_review_comment events at the receiver. Set GITHUB_WEBHOOK_SECRET to the webhook's secret and
+deliveries without a matching X-Hub-Signature-256 are refused:
+
+    python webhook_receiver.py serve --port 8900 --record data/webhooks/deliveries
+
+Each event only touches its own PR. The latest PR object and its issue and review comments (keyed by id, so
+edits and deletions apply, and a redelivered or out of order event can't undo a newer one) are kept in
+data/webhooks/prs/<number>.json; a delivery only updates that file. Every --flush-interval seconds, the closed
+PRs changed since the last flush (created within scrape_all_prs' window) are written out. The first time a PR
+is flushed, its full comment listings are fetched with the tokens in GITHUB_PATS (two requests, as the comment
+scraper makes), so its events add to the comments it already had. From those, the PR's row, with its Type of
+Change read from the description, LOC changed and comment count, is appended to the webhook sidecar that
+filter_prs and sidecars.py join in last. Its ordered comment threads are rebuilt with organize_review_comments
+and build_reply_thread and added to the comments dataset as a revision file, which readers take over the PR's
+older row. Their progress in the stages that read the dataset (formatting, topics, categorizing) is forgotten,
+so rerunning those redoes just them. Closed PRs that the metadata crawl never saw are added to
+data/pull_requests_all.csv then too, so rerun filter_prs.py to pick up new integrations and features.
+
+Deliveries saved with --record, or payloads copied from the webhook's Recent Deliveries page, can be applied
+without a server, or posted to a running one to try it locally:
+
+    python webhook_receiver.py replay data/webhooks/deliveries
+    python webhook_receiver.py post data/webhooks/deliveries --url http://127.0.0.1:8900
+"""
+
+import argparse
+import glob
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+import pyarrow.dataset as ds
+import requests
+from dotenv import load_dotenv
+
+from comment_threads import order_comments_from_reply_map
+from comments_store import DATASET_PATH, REMOVED, append_revisions, compact_comments_dataset, read_comments_dataset
+from dataset import ChangeType
+from github_api import API_URL, REPO, get_all_pages
+from progress_ledger import ProgressLedger
+from scrape_pr_comment_data import without_bots
+from sidecars import SIDECAR_DIR, append_sidecar
+from type_of_change import extract_type_of_change
+
+load_dotenv()
+
+WEBHOOK_DIR = "data/webhooks"
+ALL_PRS_PATH = "data/pull_requests_all.csv"
+PORT = 8900
+FLUSH_INTERVAL = 60
+COMPACT_AFTER = 500     # revision files in the comments dataset before a flush folds them back into its partitions
+START_DATE = datetime(2021, 1, 1, tzinfo=timezone.utc)    # the collection window of scrape_all_prs
+END_DATE = datetime(2024, 10, 31, tzinfo=timezone.utc)
+EVENTS = ["pull_request", "issue_comment", "pull_request_review_comment"]
+STAGE = "webhook"   # sidecar and progress ledger stage name
+METADATA_STAGE = "metadata"
+CSV_HEADER = ["PR Number", "Title", "Author", "Integration", "Created At", "Updated At", "State",
+              "Files Changed", "Decision Time", "Closed Date", "URL", "Type of Change"]   # as scrape_all_prs writes them
+COLUMNS = CSV_HEADER + ["LOC Changed", "Total Comments"]
+FILTERED_CHANGE_TYPES = [ChangeType.NEW_INTEGRATION, ChangeType.NEW_FEATURE]   # the PRs filter_prs keeps
+DOWNSTREAM_STAGES = ["format", "topics", "categorize"]   # read the comments dataset, so redo the PRs it rewrote
+
+
+def parse_time(timestamp: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")) if timestamp else None
+
+# The event of a payload saved without its X-GitHub-Event header, from the objects it carries
+def infer_event(payload: Dict) -> Optional[str]:
+    if "comment" in payload:
+        return "issue_comment" if "issue" in payload else "pull_request_review_comment"
+    return "pull_request" if "pull_request" in payload else None
+
+# Every issue and review comment on a PR, as the comment scrapers list them, or None if either listing failed
+def fetch_comments(pr_number: int) -> Optional[Tuple[List[Dict], List[Dict]]]:
+    issue_comments = get_all_pages(f"{API_URL}/repos/{REPO}/issues/{pr_number}/comments")
+    review_comments = get_all_pages(f"{API_URL}/repos/{REPO}/pulls/{pr_number}/comments")
+    if issue_comments is None or review_comments is None:
+        return None
+    return issue_comments, review_comments
+
+# PRs created outside scrape_all_prs' window aren't part of the dataset
+def in_window(pr: Dict) -> bool:
+    return START_DATE <= parse_time(pr["created_at"]) <= END_DATE
+
+# A closed PR in the window whose comment listings haven't been fetched yet
+def needs_listings(state: Dict) -> bool:
+    pr = state["pull_request"]
+    return bool(pr) and pr["state"] == "closed" and in_window(pr) and not state.get("seeded")
+
+def signature(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+# Newer of two versions of a PR or comment by updated_at, keeping fields only the other has (e.g. changed_files,
+# which is in the pull_request event's PR but not in the one a review comment event carries)
+def newer(stored: Optional[Dict], incoming: Dict) -> Dict:
+    if stored is None:
+        return incoming
+    if (incoming.get("updated_at") or "") >= (stored.get("updated_at") or ""):
+        return {**stored, **incoming}
+    return {**incoming, **stored}
+
+# One row of COLUMNS for a PR, from the PR (or, for a comment event on it, issue) object of a payload; fields the
+# payload doesn't have are left empty, so joining the sidecar doesn't replace what the other stages found
+def pr_row(pr: Dict, issue_comments: List[Dict], review_comments: List[Dict]) -> Dict:
+    created_at, closed_at = parse_time(pr["created_at"]), parse_time(pr.get("closed_at"))
+    merged = pr.get("merged") or pr.get("merged_at") or (pr.get("pull_request") or {}).get("merged_at")
+    has_loc = pr.get("additions") is not None and pr.get("deletions") is not None
+    return {
+        "PR Number": pr["number"], "Title": pr["title"], "Author": (pr.get("user") or {}).get("login", "ghost"),
+        "Integration": next((label["name"].split(": ")[-1] for label in pr.get("labels", []) if "integration:" in label["name"]), ""),
+        "Created At": str(created_at), "Updated At": str(parse_time(pr["updated_at"])), "State": "merged" if merged else "closed",
+        "Files Changed": pr.get("changed_files"), "Decision Time": (closed_at - created_at).days, "Closed Date": str(closed_at),
+        "URL": pr["html_url"], "Type of Change": extract_type_of_change(pr.get("body")),
+        "LOC Changed": pr["additions"] + pr["deletions"] if has_loc else None,   # same as the GraphQL backend, no per-file request
+        "Total Comments": len(issue_comments) + len(review_comments),
+    }
+
+
+class PullRequestStore:
+    def __init__(self, path: str = WEBHOOK_DIR):
+        self.path = path
+        self.pending_path = os.path.join(path, "pending.txt")
+        os.makedirs(os.path.join(path, "prs"), exist_ok=True)
+
+    def state_path(self, pr_number: int) -> str:
+        return os.path.join(self.path, "prs", f"{pr_number}.json")
+
+    def load(self, pr_number: int) -> Dict:
+        if not os.path.exists(self.state_path(pr_number)):
+            return {"pull_request": None, "issue_comments": {}, "review_comments": {}, "deleted": [], "seeded": False}
+        with open(self.state_path(pr_number), encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, pr_number: int, state: Dict) -> None:
+        path = self.state_path(pr_number)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(f"{path}.tmp", path)
+
+    # PRs changed since the last flush, one line per event so none are lost if the receiver stops in between
+    def mark_pending(self, pr_number: int) -> None:
+        with open(self.pending_path, "a", encoding="utf-8") as f:
+            f.write(f"{pr_number}\n")
+
+    def pending(self) -> Set[int]:
+        if not os.path.exists(self.pending_path):
+            return set()
+        with open(self.pending_path, encoding="utf-8") as f:
+            return {int(line) for line in f if line.strip()}
+
+    def clear_pending(self, pr_numbers: Set[int]) -> None:
+        remaining = sorted(self.pending() - pr_numbers)
+        with open(f"{self.pending_path}.tmp", "w", encoding="utf-8") as f:
+            f.writelines(f"{pr_number}\n" for pr_number in remaining)
+        os.replace(f"{self.pending_path}.tmp", self.pending_path)
+
+
+# Applies events to the stored PRs and publishes the changed ones to the sidecar, metadata and comments dataset
+class WebhookProcessor:
+    def __init__(self, store: Optional[PullRequestStore] = None, ledger: Optional[ProgressLedger] = None,
+                 dataset_path: str = DATASET_PATH, sidecar_path: str = SIDECAR_DIR, all_prs_path: str = ALL_PRS_PATH,
+                 fetch_comments: Callable[[int], Optional[Tuple[List[Dict], List[Dict]]]] = fetch_comments):
+        self.store = store or PullRequestStore()
+        self.ledger = ledger or ProgressLedger()
+        self.fetch_comments = fetch_comments
+        self.dataset_path, self.sidecar_path, self.all_prs_path = dataset_path, sidecar_path, all_prs_path
+        self._lock = threading.Lock()
+        self.events = 0
+
+    # Apply one delivery; returns the PR it changed, or None for events that aren't about a PR
+    def handle(self, event: str, payload: Dict) -> Optional[int]:
+        if event == "pull_request":
+            pr = payload["pull_request"]
+        elif event == "issue_comment":
+            if "pull_request" not in payload["issue"]:
+                return None     # a comment on an issue rather than a PR
+            pr = payload["issue"]
+        elif event == "pull_request_review_comment":
+            pr = payload["pull_request"]
+        else:
+            return None
+
+        # Only the PR's own state is touched here; fetching and writing out happen in flush, so a delivery is
+        # answered well within GitHub's timeout
+        with self._lock:
+            state = self.store.load(pr["number"])
+            state["pull_request"] = newer(state["pull_request"], pr)
+            if event != "pull_request":
+                self.apply_comment(state, "issue_comments" if event == "issue_comment" else "review_comments", payload["action"], payload["comment"])
+            self.store.save(pr["number"], state)
+            self.store.mark_pending(pr["number"])
+            self.events += 1
+        return pr["number"]
+
+    @staticmethod
+    def apply_comment(state: Dict, kind: str, action: str, comment: Dict) -> None:
+        comment_id = str(comment["id"])
+        if action == "deleted":
+            state[kind].pop(comment_id, None)
+            state["deleted"].append(comment["id"])
+        elif comment["id"] not in state["deleted"]:    # a late redelivery of a deleted comment
+            state[kind][comment_id] = newer(state[kind].get(comment_id), comment)
+
+    # Start a PR's comments from its full listings, so its events add to the comments the scrapers found
+    # instead of replacing them
+    @staticmethod
+    def seed(state: Dict, fetched: Tuple[List[Dict], List[Dict]]) -> None:
+        for kind, comments in zip(("issue_comments", "review_comments"), fetched):
+            for comment in comments:
+                if comment["id"] not in state["deleted"]:
+                    state[kind][str(comment["id"])] = newer(state[kind].get(str(comment["id"])), comment)
+        state["seeded"] = True
+
+    # The PR's row; its comment count is left empty until the PR is seeded, so a partial count never replaces the scraped one
+    def row(self, state: Dict) -> Dict:
+        row = pr_row(state["pull_request"], *self.comments(state))
+        if not state.get("seeded"):
+            row["Total Comments"] = None
+        return row
+
+    # The PR's issue and review comments without bots, as the comment scrapers fetch them
+    @staticmethod
+    def comments(state: Dict) -> Tuple[List[Dict], List[Dict]]:
+        author = (state["pull_request"].get("user") or {}).get("login", "ghost")
+        return (without_bots(list(state["issue_comments"].values()), author),
+                without_bots(list(state["review_comments"].values()), author))
+
+    # Write the closed PRs changed since the last flush to the sidecar, metadata and comments dataset, and have the
+    # stages that read the dataset redo them. A PR's comment listings are fetched the first time it's flushed
+    # closed, without holding up deliveries; PRs whose listings can't be fetched stay pending for the next flush
+    def flush(self) -> int:
+        with self._lock:
+            pending = self.store.pending()
+        listings = {pr_number: self.fetch_comments(pr_number) for pr_number in sorted(pending) if needs_listings(self.store.load(pr_number))}
+
+        with self._lock:
+            states = [self.store.load(pr_number) for pr_number in sorted(pending)]
+            closed = [state for state in states if state["pull_request"] and state["pull_request"]["state"] == "closed" and in_window(state["pull_request"])]
+            unseeded = set()
+            for state in closed:
+                if not state.get("seeded"):
+                    fetched = listings.get(state["pull_request"]["number"])     # None if it closed after the listings were fetched
+                    if fetched is None:
+                        unseeded.add(state["pull_request"]["number"])
+                        continue
+                    self.seed(state, fetched)
+                    self.store.save(state["pull_request"]["number"], state)
+            if closed:
+                append_sidecar(STAGE, pd.DataFrame([self.row(state) for state in closed], columns=COLUMNS), self.ledger, self.sidecar_path)
+            closed = [state for state in closed if state["pull_request"]["number"] not in unseeded]
+            if closed:
+                self.add_new_prs(closed)
+                self.write_threads(closed)
+                for stage in DOWNSTREAM_STAGES:
+                    self.ledger.forget(stage, [state["pull_request"]["number"] for state in closed])
+            self.store.clear_pending(pending - unseeded)
+        if closed:
+            compact_comments_dataset(self.dataset_path, COMPACT_AFTER)
+        return len(closed)
+
+    # Closed PRs the metadata crawl hasn't collected, appended to pull_requests_all.csv the way scrape_all_prs does
+    def add_new_prs(self, states: List[Dict]) -> None:
+        done = self.ledger.done(METADATA_STAGE)
+        new = [pr_row(state["pull_request"], [], []) for state in states if state["pull_request"]["number"] not in done]
+        if not new:
+            return
+        rows = pd.DataFrame(new, columns=CSV_HEADER)
+        rows.to_csv(self.all_prs_path, mode="a", header=not os.path.exists(self.all_prs_path), index=False)
+        self.ledger.mark_done(METADATA_STAGE, rows["PR Number"])
+
+    # Add the changed PRs' rows to the comments dataset as a revision, which replaces their stored rows for readers;
+    # only those PRs' stored rows are read. A PR keeps the columns the scrapers gave it, with the values from its
+    # events on top; one whose description has no Type of Change boxes keeps its stored Type of Change, and only
+    # one now checked as something else is removed
+    def write_threads(self, states: List[Dict]) -> None:
+        rows = []
+        for state in states:
+            issue_comments, review_comments = self.comments(state)
+            row = pr_row(state["pull_request"], issue_comments, review_comments)
+            row["comments"] = order_comments_from_reply_map(issue_comments, review_comments)
+            rows.append(row)
+        changed = pd.DataFrame(rows).set_index("PR Number")
+
+        if os.path.exists(self.dataset_path) and any(os.scandir(self.dataset_path)):
+            years = sorted(pd.to_datetime(changed["Created At"], utc=True).dt.year.unique().tolist())
+            stored = read_comments_dataset(self.dataset_path, filter=ds.field("Year").isin(years) & ds.field("PR Number").isin(changed.index.tolist()))
+            stored = stored.drop(columns=["Year"]).set_index("PR Number")
+        else:
+            stored = pd.DataFrame(columns=["PR Number"]).set_index("PR Number")
+        updated = changed.combine_first(stored)
+        keep = updated["Type of Change"].map(ChangeType.of).isin(FILTERED_CHANGE_TYPES)
+        removed = updated[~keep & updated.index.isin(stored.index)]
+
+        revision = updated[keep][list(dict.fromkeys([*stored.columns, *changed.columns]))].reset_index()
+        if not removed.empty:
+            revision = pd.concat([revision, pd.DataFrame({"PR Number": removed.index, "Created At": removed["Created At"].to_numpy(),
+                                                          "comments": [[] for _ in range(len(removed))], REMOVED: True})], ignore_index=True)
+        if not revision.empty:
+            append_revisions(revision, self.dataset_path)
+
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, processor: WebhookProcessor, host: str = "127.0.0.1", port: int = PORT,
+                 secret: Optional[str] = None, record_dir: Optional[str] = None):
+        super().__init__((host, port), WebhookHandler)
+        self.processor, self.secret, self.record_dir = processor, secret, record_dir
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # Save a delivery in the format replay and post read, named so they sort in the order they arrived
+    def record(self, event: str, delivery: str, payload: Dict) -> None:
+        path = os.path.join(self.record_dir, f"{time.time_ns()}-{event}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"event": event, "delivery": delivery, "payload": payload}, f)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    server: WebhookServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.server.secret and not hmac.compare_digest(signature(self.server.secret, body), self.headers.get("X-Hub-Signature-256", "")):
+            return self.respond(401, {"error": "signature doesn't match"})
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return self.respond(400, {"error": "body isn't JSON"})
+
+        event = self.headers.get("X-GitHub-Event") or infer_event(payload)
+        if event == "ping":
+            return self.respond(200, {"ok": True})
+        if event not in EVENTS:
+            return self.respond(202, {"ignored": event})
+        if self.server.record_dir:
+            self.server.record(event, self.headers.get("X-GitHub-Delivery", ""), payload)
+        try:
+            pr_number = self.server.processor.handle(event, payload)
+        except (KeyError, TypeError) as e:
+            return self.respond(400, {"error": f"unexpected {event} payload: {e!r}"})
+        self.respond(200, {"event": event, "pr": pr_number})
+
+    def respond(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# Saved deliveries in the order they arrived, as (event, delivery id, payload). Files are either what --record
+# writes or a bare payload, whose event is worked out from its contents
+def read_deliveries(path: str) -> Iterable[Tuple[str, str, Dict]]:
+    for file in sorted(glob.glob(os.path.join(path, "*.json"))):
+        with open(file, encoding="utf-8") as f:
+            delivery = json.load(f)
+        if "payload" in delivery and "event" in delivery:
+            yield delivery["event"], delivery.get("delivery") or os.path.basename(file), delivery["payload"]
+        else:
+            yield infer_event(delivery), os.path.basename(file), delivery
+
+def replay(path: str, processor: WebhookProcessor) -> None:
+    changed = set()
+    for event, _, payload in read_deliveries(path):
+        if event in EVENTS:
+            changed.add(processor.handle(event, payload))
+    changed.discard(None)
+    print(f"Applied {processor.events} events to {len(changed)} PRs, {processor.flush()} closed PRs written to {processor.dataset_path}")
+
+# Send saved deliveries to a receiver with the headers GitHub sends, signed when a secret is given
+def post(path: str, url: str, secret: Optional[str] = None) -> None:
+    statuses: Dict[int, int] = {}
+    for event, delivery, payload in read_deliveries(path):
+        body = json.dumps(payload).encode()
+        headers = {"Content-Type": "application/json", "X-GitHub-Event": event or "", "X-GitHub-Delivery": delivery or str(uuid.uuid4())}
+        if secret:
+            headers["X-Hub-Signature-256"] = signature(secret, body)
+        response = requests.post(url, data=body, headers=headers, timeout=30)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code >= 400:
+            print(f"{delivery}: {response.status_code} {response.text}")
+    print(f"Posted {sum(statuses.values())} deliveries, responses: {statuses}")
+
+def serve(server: WebhookServer, flush_interval: float) -> None:
+    print(f"Receiving webhooks on {server.base_url}, stop with Ctrl-C.")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while True:
+            time.sleep(flush_interval)
+            if server.processor.flush():
+                print(f"{server.processor.events} events so far, flushed the changed PRs to {server.processor.dataset_path}")
+    except KeyboardInterrupt:
+        pass
+    server.shutdown()
+    server.processor.flush()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_command = commands.add_parser("serve", help="receive webhook deliveries over HTTP")
+    serve_command.add_argument("--host", default="127.0.0.1")
+    serve_command.add_argument("--port", type=int, default=PORT)
+    serve_command.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL, help="seconds between writes to the comments dataset")
+    serve_command.add_argument("--record", help="also save every delivery to this directory, for replay or post")
+
+    replay_command = commands.add_parser("replay", help="apply saved deliveries without a server")
+    replay_command.add_argument("path")
+
+    post_command = commands.add_parser("post", help="post saved deliveries to a running receiver")
+    post_command.add_argument("path")
+    post_command.add_argument("--url", default=f"http://127.0.0.1:{PORT}")
+    args = parser.parse_args()
+
+    secret = os.environ.get("GITHUB_WEBHOOK_SECRET")
+    if args.command == "serve":
+        serve(WebhookServer(WebhookProcessor(), args.host, args.port, secret, args.record), args.flush_interval)
+    elif args.command == "replay":
+        replay(args.path, WebhookProcessor())
+    else:
+        post(args.path, args.url, secret)